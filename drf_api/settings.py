@@ -17,21 +17,126 @@ import dj_database_url
 if os.path.exists("env.py"):
     import env
 
-# Cloudinary Storage
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Media storage: Cloudinary when CLOUDINARY_URL is set, files under
+# MEDIA_ROOT otherwise (development and tests).
 CLOUDINARY_STORAGE = {
     'CLOUDINARY_URL': os.environ.get('CLOUDINARY_URL')
 }
 MEDIA_URL = '/media/'
-DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
+MEDIA_ROOT = BASE_DIR / 'media'
+STORAGES = {
+    'default': {
+        'BACKEND': (
+            'cloudinary_storage.storage.MediaCloudinaryStorage' if os.environ.get('CLOUDINARY_URL')
+            else 'django.core.files.storage.FileSystemStorage'
+        ),
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
 
-# Build paths inside the project like this: BASE_DIR / 'subdir'.
-BASE_DIR = Path(__file__).resolve().parent.parent
+# Recipe images (recipes/images.py): uploads up to RECIPE_IMAGE_MAX_BYTES
+# are resized to these widths (WebP, plus AVIF where Pillow supports it)
+# by RECIPE_IMAGE_WORKERS threads per process; 0 resizes during the request.
+RECIPE_IMAGE_MAX_BYTES = int(os.environ.get('RECIPE_IMAGE_MAX_BYTES', 10 * 1024 * 1024))
+RECIPE_IMAGE_WIDTHS = [320, 640, 1280]
+RECIPE_IMAGE_WORKERS = int(os.environ.get('RECIPE_IMAGE_WORKERS', 2))
 
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    ]
+        # simplejwt's JWTAuthentication, with the user cached per token
+        'recipes.authentication.CachedJWTAuthentication',
+    ],
+    # orjson-backed, byte-identical to JSONRenderer (see recipes/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'recipes.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'recipes.serializers.TokenObtainPairSerializer',
+}
+
+# JWT authentication (recipes/authentication.py): verified tokens and the
+# user behind them are kept in a per-process LRU of JWT_AUTH_CACHE_SIZE
+# entries for up to JWT_AUTH_CACHE_SECONDS. The user is only cached when
+# CACHES is shared between workers (Redis), which carries invalidations;
+# JWT_AUTH_SHARED_CACHE overrides that check. With JWT_AUTH_MODE 'claims',
+# reads trust the user claims in the token instead and skip the lookup
+# entirely; logout and deactivation then reach them only once the access
+# token expires.
+JWT_AUTH_MODE = os.environ.get('JWT_AUTH_MODE', 'cached')
+JWT_AUTH_CACHE_SIZE = int(os.environ.get('JWT_AUTH_CACHE_SIZE', 10000))
+JWT_AUTH_CACHE_SECONDS = int(os.environ.get('JWT_AUTH_CACHE_SECONDS', 300))
+# Unset: decided from the cache backend
+JWT_AUTH_SHARED_CACHE = {'1': True, '0': False}.get(os.environ.get('JWT_AUTH_SHARED_CACHE', ''))
+
+# Caching: Redis when REDIS_URL is set, otherwise per-process local memory.
+# Local memory is not shared between gunicorn workers, so cached responses
+# are kept briefly to bound how long another worker can serve stale data.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+    RESPONSE_CACHE_TIMEOUT = 300
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'recipe-hub',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+    RESPONSE_CACHE_TIMEOUT = 30
+
+# Feed: authors with more followers than this are not fanned out on write;
+# their recipes are merged into feeds at read time instead.
+FEED_FANOUT_MAX_FOLLOWERS = int(os.environ.get('FEED_FANOUT_MAX_FOLLOWERS', 5000))
+
+# Background jobs (recipes/jobs.py): feed fan-out and the ingredient index
+# are updated by `manage.py run_worker`, which claims JOBS_BATCH_SIZE jobs
+# at a time; a failing job is retried after JOBS_RETRY_SECONDS, doubling
+# up to JOBS_RETRY_MAX_SECONDS, JOBS_MAX_ATTEMPTS times in all. Jobs held
+# by a worker for JOBS_CLAIM_TIMEOUT seconds are assumed lost and rerun.
+# JOBS_INLINE (the default with DEV) runs them in the request instead.
+JOBS_INLINE = os.environ.get('JOBS_INLINE', '1' if 'DEV' in os.environ else '0') == '1'
+JOBS_BATCH_SIZE = int(os.environ.get('JOBS_BATCH_SIZE', 20))
+JOBS_MAX_ATTEMPTS = int(os.environ.get('JOBS_MAX_ATTEMPTS', 5))
+JOBS_RETRY_SECONDS = int(os.environ.get('JOBS_RETRY_SECONDS', 10))
+JOBS_RETRY_MAX_SECONDS = int(os.environ.get('JOBS_RETRY_MAX_SECONDS', 3600))
+JOBS_CLAIM_TIMEOUT = int(os.environ.get('JOBS_CLAIM_TIMEOUT', 300))
+
+# Engagement: views/saves are buffered per process and written in batches
+# once this many (recipe, hour) keys are pending or the oldest is this old.
+ENGAGEMENT_BUFFER_SIZE = int(os.environ.get('ENGAGEMENT_BUFFER_SIZE', 1000))
+ENGAGEMENT_FLUSH_SECONDS = int(os.environ.get('ENGAGEMENT_FLUSH_SECONDS', 10))
+# Trending: engagement counts half as much every TRENDING_HALF_LIFE_HOURS
+# and is ignored after TRENDING_WINDOW_HOURS.
+TRENDING_HALF_LIFE_HOURS = int(os.environ.get('TRENDING_HALF_LIFE_HOURS', 24))
+TRENDING_WINDOW_HOURS = int(os.environ.get('TRENDING_WINDOW_HOURS', 7 * 24))
+
+# Queries slower than this are logged (with their endpoint) to the
+# "recipes.performance" logger.
+SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 200))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'recipes': {'handlers': ['console'], 'level': os.environ.get('RECIPES_LOG_LEVEL', 'INFO')},
+    },
 }
 
 
@@ -56,6 +161,9 @@ DEBUG = 'DEV' in os.environ
 ALLOWED_HOSTS = [
     'recipe-hub-backend-project-3024dae0e274.herokuapp.com',
 ]
+if DEBUG:
+    # Local runserver/gunicorn, e.g. for `bench_api --base-url`
+    ALLOWED_HOSTS += ['localhost', '127.0.0.1']
 
 # Installed Apps
 INSTALLED_APPS = [
@@ -84,8 +192,11 @@ SITE_ID = 1
 # Middleware Configuration (Order Matters)
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    # Server-Timing header, slow query log and /api/_metrics
+    'recipes.middleware.PerformanceMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoise, async-capable for ASGI workers
+    'recipes.middleware.StaticFilesMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework_simplejwt.views import (
@@ -13,3 +15,5 @@ urlpatterns = [
     path('auth/token/refresh/',
          TokenRefreshView.as_view(), name='token_refresh'),
 ]
+# Uploaded images from MEDIA_ROOT, in development only (DEBUG)
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
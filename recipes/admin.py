@@ -1,6 +1,10 @@
 from django.contrib import admin
-from .models import Recipe, Category, Following
+from .models import Recipe, Category, Following, FollowSuggestion, Job, RecipeEngagement, UserStats
 
 admin.site.register(Recipe)
 admin.site.register(Category)
 admin.site.register(Following)
+admin.site.register(UserStats)
+admin.site.register(RecipeEngagement)
+admin.site.register(FollowSuggestion)
+admin.site.register(Job)
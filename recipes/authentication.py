@@ -0,0 +1,236 @@
+"""
+JWT authentication without a user query on every request.
+
+simplejwt's `JWTAuthentication` verifies the token and then loads the
+User row for each authenticated request. `CachedJWTAuthentication`
+keeps up to two bounded LRU caches per process, whose entries expire
+after `JWT_AUTH_CACHE_SECONDS` or with the token, whichever comes first:
+
+- verified tokens by their raw value, so a repeat request skips
+  signature verification and decoding;
+- a projection of the user (id, username, is_active, is_staff,
+  is_superuser) by the token's `jti`.
+
+`request.user` is then a User with only those fields loaded, as from
+`User.objects.only(...)`: reading another field loads it, and `save()`
+writes only loaded fields.
+
+Every save or delete of a User (password change, deactivation) bumps
+the "auth:<id>" version in `recipes.cache`, which each cache hit
+compares, and logging out marks the token's `jti` revoked there until
+the token expires. Only a cache shared by all workers (Redis, memcached,
+the database) carries those to the other workers, so the user cache is
+used only with one (see `shared_cache`). With a per-process cache, such
+as the default LocMemCache when REDIS_URL is unset, the user is loaded
+on every request as simplejwt does, and logout is enforced only by the
+worker that served it. Bulk `update()`s send no signals; call
+`forget_user` after them.
+
+With `JWT_AUTH_MODE = 'claims'`, read requests (GET, HEAD, OPTIONS)
+trust the username and staff flags embedded in the access token (see
+`serializers.TokenObtainPairSerializer`) and touch neither the database
+nor the cache, so logout and deactivation reach them only when the
+access token expires (`SIMPLE_JWT['ACCESS_TOKEN_LIFETIME']`). Tokens
+issued without those claims are handled as in 'cached' mode.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from . import cache
+
+PROJECTED_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+# Claims added to issued tokens for 'claims' mode
+USER_CLAIMS = ('username', 'is_staff', 'is_superuser')
+# Cache backends private to one process
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def mode():
+    return getattr(settings, 'JWT_AUTH_MODE', 'cached')
+
+
+def cache_size():
+    return getattr(settings, 'JWT_AUTH_CACHE_SIZE', 10000)
+
+
+def cache_seconds():
+    return getattr(settings, 'JWT_AUTH_CACHE_SECONDS', 300)
+
+
+def shared_cache():
+    """
+    Whether invalidations written to `recipes.cache` reach every worker:
+    `JWT_AUTH_SHARED_CACHE` if set, otherwise whether the backend lives
+    outside the process.
+    """
+    shared = getattr(settings, 'JWT_AUTH_SHARED_CACHE', None)
+    if shared is None:
+        shared = not isinstance(cache.backend(), PROCESS_LOCAL_CACHES)
+    return shared
+
+
+class ExpiringLRU:
+    """
+    Thread-safe mapping of at most `cache_size()` entries, each with a
+    deadline (a `time.time()` timestamp) after which it is not returned.
+    """
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            deadline, value = entry
+            if deadline <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, deadline):
+        with self.lock:
+            self.entries[key] = (deadline, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > cache_size():
+                self.entries.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+_tokens = ExpiringLRU()
+_users = ExpiringLRU()
+
+
+def _auth_scope(user_id):
+    return f'auth:{user_id}'
+
+
+def _revoked_key(jti):
+    return f'jwt-revoked:{jti}'
+
+
+def _deadline(token):
+    return min(time.time() + cache_seconds(), token['exp'])
+
+
+def projected_user(values):
+    """
+    A User with only `PROJECTED_FIELDS` loaded, from a {field: value} dict.
+    """
+    fields = [f.attname for f in User._meta.concrete_fields if f.attname in PROJECTED_FIELDS]
+    return User.from_db(DEFAULT_DB_ALIAS, fields, [values[name] for name in fields])
+
+
+def add_user_claims(token, user):
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+def forget_user(user_id):
+    """
+    Make every worker reload `user_id` from the database on its next request.
+    """
+    cache.bump(_auth_scope(user_id))
+
+
+def revoke(token):
+    """
+    Refuse `token` from now until it expires (best effort: the marker
+    lives in `recipes.cache`, which can evict it before then, and only
+    reaches other workers if that cache is shared).
+    """
+    jti = token.get(api_settings.JTI_CLAIM)
+    remaining = token['exp'] - time.time()
+    if jti is None or remaining <= 0:
+        return
+    cache.backend().set(_revoked_key(jti), True, int(remaining) + 1)
+    _users.pop(jti)
+    forget_user(token[api_settings.USER_ID_CLAIM])
+
+
+def clear():
+    _tokens.clear()
+    _users.clear()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    `JWTAuthentication` that caches verified tokens and user projections
+    (see the module docstring).
+    """
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        if mode() == 'claims' and request.method in SAFE_METHODS and 'username' in validated_token:
+            return self.get_claims_user(validated_token), validated_token
+        return self.get_user(validated_token), validated_token
+
+    def get_validated_token(self, raw_token):
+        token = _tokens.get(raw_token)
+        if token is None:
+            token = super().get_validated_token(raw_token)
+            _tokens.set(raw_token, token, _deadline(token))
+        return token
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+        if user_id is None or jti is None:
+            return super().get_user(validated_token)
+        if not shared_cache():
+            # Other workers would miss invalidations; look the user up every time.
+            self.check_revoked(jti)
+            return super().get_user(validated_token)
+        # Read before loading the user, so a change made meanwhile still
+        # invalidates what is cached below.
+        version, = cache.versions([_auth_scope(user_id)])
+        cached = _users.get(jti)
+        if cached is not None and cached[0] == version:
+            return projected_user(cached[1])
+        self.check_revoked(jti)
+        user = super().get_user(validated_token)
+        _users.set(jti, (version, {name: getattr(user, name) for name in PROJECTED_FIELDS}), _deadline(validated_token))
+        return user
+
+    def check_revoked(self, jti):
+        if cache.backend().get(_revoked_key(jti)):
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+
+    def get_claims_user(self, validated_token):
+        return projected_user({
+            'id': validated_token[api_settings.USER_ID_CLAIM],
+            'username': validated_token['username'],
+            'is_active': True,
+            'is_staff': validated_token.get('is_staff', False),
+            'is_superuser': validated_token.get('is_superuser', False),
+        })
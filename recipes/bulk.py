@@ -0,0 +1,156 @@
+"""
+Bulk recipe import and export as JSON Lines (one recipe object per line).
+
+Imports are read from the request stream line by line, validated with
+`RecipeSerializer` and inserted with `bulk_create`, one transaction per
+chunk, so a partner upload never sits in memory whole. `bulk_create`
+sends no post_save, so the work of `recipes/signals.py` is done
+explicitly for each chunk: user stats in its transaction, then cache
+versions, and feed fan-out and the ingredient index enqueued as one job
+each (see `recipes/jobs.py`) once it commits.
+"""
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from rest_framework import serializers
+
+from . import cache, feed, ingredients, jobs, stats
+from .models import Recipe, Category
+from .serializers import RecipeSerializer
+
+CHUNK_SIZE = 500
+EXPORT_CHUNK_SIZE = 2000
+MAX_REPORTED_ERRORS = 100
+
+# Output key -> values_list() lookup; matches RecipeSerializer plus the
+# category id, so an export can be imported again.
+EXPORT_COLUMNS = {
+    'id': 'id',
+    'author': 'author__username',
+    'title': 'title',
+    'description': 'description',
+    'ingredients': 'ingredients',
+    'instructions': 'instructions',
+    'category': 'category_id',
+    'category_name': 'category__name',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+
+
+class ChunkCategoryField(serializers.PrimaryKeyRelatedField):
+    """
+    Resolve category ids from the chunk's preloaded `categories` instead
+    of one query per row. Unknown ids take the normal path, so the error
+    messages are the usual ones.
+    """
+    def to_internal_value(self, data):
+        category = self.context['categories'].get(str(data))
+        return category if category is not None else super().to_internal_value(data)
+
+
+class BulkRecipeSerializer(RecipeSerializer):
+    category = ChunkCategoryField(queryset=Category.objects.all(), write_only=True)
+
+
+def read_rows(lines):
+    """
+    Yield (line number, object, error) for every non-blank line.
+    """
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, None, f'Invalid JSON: {e}'
+            continue
+        if isinstance(row, dict):
+            yield number, row, None
+        else:
+            yield number, None, 'Expected a JSON object.'
+
+
+def _categories(chunk):
+    ids = {str(row.get('category')) for _, row, _ in chunk if row}
+    categories = Category.objects.filter(pk__in=[pk for pk in ids if pk.isdigit()])
+    return {str(category.pk): category for category in categories}
+
+
+def _insert(recipes, author):
+    with transaction.atomic():
+        Recipe.objects.bulk_create(recipes)
+        stats.adjust(author.pk, recipes_count=len(recipes))
+    cache.bump('recipes', cache.author_scope(author.pk))
+    recipe_ids = [recipe.pk for recipe in recipes]
+    jobs.enqueue(feed.fan_out_new_recipes, recipe_ids=recipe_ids)
+    jobs.enqueue(ingredients.index_recipe_ids, recipe_ids=recipe_ids)
+
+
+def import_recipes(lines, author, context=None, chunk_size=CHUNK_SIZE):
+    """
+    Create recipes by `author` from JSON Lines. Valid rows are saved even
+    when others fail; the report lists the first failures by line number.
+    """
+    rows = read_rows(lines)
+    report = {'created': 0, 'failed': 0, 'errors': []}
+
+    def fail(number, errors):
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'line': number, 'errors': errors})
+
+    while chunk := list(islice(rows, chunk_size)):
+        serializer = BulkRecipeSerializer(context={**(context or {}), 'categories': _categories(chunk)})
+        recipes = []
+        for number, row, error in chunk:
+            if error:
+                fail(number, {'non_field_errors': [error]})
+                continue
+            try:
+                data = serializer.run_validation(row)
+            except serializers.ValidationError as e:
+                fail(number, e.detail)
+                continue
+            recipes.append(Recipe(author=author, **data))
+        if recipes:
+            _insert(recipes, author)
+            report['created'] += len(recipes)
+    return report
+
+
+def _export_rows(queryset):
+    return queryset.order_by('id').values_list(*EXPORT_COLUMNS.values())
+
+
+def _encode_lines(chunk):
+    names = list(EXPORT_COLUMNS)
+    encoder = DjangoJSONEncoder()
+    return ''.join(encoder.encode(dict(zip(names, row))) + '\n' for row in chunk)
+
+
+def export_lines(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Stream `queryset` as JSON Lines from a server-side cursor, one string
+    per chunk of rows, without building model instances.
+    """
+    rows = _export_rows(queryset).iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        yield _encode_lines(chunk)
+
+
+async def aexport_lines(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    `export_lines` for ASGI: Django serves a sync iterator there by
+    reading it whole into a list first, so each chunk is fetched in a
+    thread and sent as soon as it is read. (`values_list().aiterator()`
+    runs its query on the event loop, which Django refuses.)
+    """
+    rows = _export_rows(queryset).iterator(chunk_size=chunk_size)
+    next_chunk = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    while chunk := await next_chunk():
+        yield _encode_lines(chunk)
@@ -0,0 +1,115 @@
+"""
+Versioned response cache for the shared (non per-user) read endpoints.
+
+Cached responses are keyed by view, path, query string and the current
+value of every version counter the response depends on ("recipes",
+"recipe:<id>", "author:<user id>", "categories"). Writes bump the
+relevant counters in signal handlers, so stale entries are simply never
+looked up again and expire on their own. Author scopes are keyed by id,
+which a saved recipe already holds, so bumping them costs no query.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def backend():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def timeout():
+    return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60)
+
+
+def _version_key(scope):
+    return f'version:{scope}'
+
+
+def versions(scopes):
+    """
+    Current value of each version counter, creating missing ones.
+
+    New counters start at the current time in ms rather than 1, so a
+    counter that was evicted never repeats a value used before.
+    """
+    keys = [_version_key(scope) for scope in scopes]
+    found = backend().get_many(keys)
+    for key in keys:
+        if key not in found:
+            backend().add(key, int(time.time() * 1000), None)
+            found[key] = backend().get(key)
+    return [found[key] for key in keys]
+
+
+def bump(*scopes):
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            backend().incr(key)
+        except ValueError:
+            backend().set(key, int(time.time() * 1000), None)
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def _author_id_key(username):
+    return f'author-id:{username}'
+
+
+def author_id(username):
+    """
+    The id of the user named `username`, or None, for readers that filter
+    by username; kept for `timeout()` seconds.
+    """
+    key = _author_id_key(username)
+    pk = backend().get(key)
+    if pk is None:
+        pk = User.objects.filter(username=username).values_list('pk', flat=True).first()
+        if pk is not None:
+            backend().set(key, pk, timeout())
+    return pk
+
+
+def forget_author_id(username):
+    backend().delete(_author_id_key(username))
+
+
+def response_key(view_name, request, scopes):
+    query = '&'.join(sorted(f'{k}={v}' for k, values in request.query_params.lists() for v in values))
+    scoped = list(zip(scopes, versions(scopes)))
+    raw = f'{view_name}|{request.get_host()}|{request.path}|{query}|{scoped}'
+    return 'response:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def lookup(key, view_name):
+    data = backend().get(key)
+    record(view_name, hit=data is not None)
+    return data
+
+
+def store(key, data):
+    backend().set(key, data, timeout())
+
+
+def record(view_name, hit):
+    with _stats_lock:
+        _stats['hits' if hit else 'misses'] += 1
+        _stats[f'{view_name}.{"hits" if hit else "misses"}'] += 1
+
+
+def stats():
+    """
+    Hit/miss counters of this process, overall and per view.
+    """
+    with _stats_lock:
+        return dict(_stats)
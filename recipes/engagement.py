@@ -0,0 +1,240 @@
+"""
+Recipe engagement (views and saves) and the trending score built from it.
+
+Increments are added up in a per-process buffer keyed by (recipe, hour)
+and written as one `INSERT ... ON CONFLICT DO UPDATE` per chunk once the
+buffer holds `ENGAGEMENT_BUFFER_SIZE` keys or its oldest increment is
+`ENGAGEMENT_FLUSH_SECONDS` old, so a popular recipe costs one write per
+flush instead of one per view. A timer thread flushes a buffer that is
+still pending that long after its first increment, so a worker that
+goes quiet writes its counts too, and the buffer is flushed when the
+process exits. Counts are lost only if a process is killed outright,
+which is acceptable for a popularity signal.
+
+`recompute_trending` (run periodically with
+`python manage.py recompute_trending`) folds the hour buckets of the last
+`TRENDING_WINDOW_HOURS` into `Recipe.trending_score`, halving each
+bucket's weight every `TRENDING_HALF_LIFE_HOURS`, so trending lists are
+a range read over an index instead of an aggregation per request. It
+sees what the web processes have flushed, so counts up to
+`ENGAGEMENT_FLUSH_SECONDS` old wait for the next run.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import cache
+from .models import Recipe, RecipeEngagement
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+# A save says more about a recipe than a view.
+SAVE_WEIGHT = 5
+
+
+def buffer_size():
+    return getattr(settings, 'ENGAGEMENT_BUFFER_SIZE', 1000)
+
+
+def flush_seconds():
+    return getattr(settings, 'ENGAGEMENT_FLUSH_SECONDS', 10)
+
+
+def half_life_hours():
+    return getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 24)
+
+
+def window_hours():
+    return getattr(settings, 'TRENDING_WINDOW_HOURS', 7 * 24)
+
+
+def current_hour(now=None):
+    return (now or timezone.now()).replace(minute=0, second=0, microsecond=0)
+
+
+class EngagementBuffer:
+    """
+    Thread-safe `{(recipe_id, hour): [views, saves]}` counters.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = defaultdict(lambda: [0, 0])
+        self.oldest = None
+
+    def add(self, recipe_id, views=0, saves=0):
+        """
+        Buffer the increments; returns True when the buffer is due a flush.
+        """
+        with self.lock:
+            counts = self.counts[(recipe_id, current_hour())]
+            counts[0] += views
+            counts[1] += saves
+            if self.oldest is None:
+                self.oldest = time.monotonic()
+            return (
+                len(self.counts) >= buffer_size()
+                or time.monotonic() - self.oldest >= flush_seconds()
+            )
+
+    def drain(self):
+        with self.lock:
+            counts, self.counts, self.oldest = self.counts, defaultdict(lambda: [0, 0]), None
+        return counts
+
+
+buffer = EngagementBuffer()
+
+_timer = None
+_timer_lock = threading.Lock()
+
+
+def _schedule_flush():
+    """
+    Flush `flush_seconds()` from now on a timer thread, unless one is
+    already pending, in case no later increment comes to trigger it.
+    """
+    global _timer
+    with _timer_lock:
+        if _timer is None:
+            _timer = threading.Timer(flush_seconds(), _timed_flush)
+            _timer.daemon = True
+            _timer.start()
+
+
+def _cancel_timer():
+    global _timer
+    with _timer_lock:
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+
+
+def _timed_flush():
+    global _timer
+    with _timer_lock:
+        _timer = None
+    try:
+        flush()
+    except Exception:
+        logger.exception("Could not write buffered engagement")
+    finally:
+        # The timer thread's own connection
+        connection.close()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        logger.exception("Could not write buffered engagement")
+
+
+def record(recipe_id, views=0, saves=0):
+    if buffer.add(recipe_id, views, saves):
+        flush()
+    else:
+        _schedule_flush()
+
+
+async def arecord(recipe_id, views=0, saves=0):
+    if buffer.add(recipe_id, views, saves):
+        await sync_to_async(flush)()
+    else:
+        _schedule_flush()
+
+
+def flush():
+    """
+    Write the buffered counts; returns the number of (recipe, hour) rows
+    written. Counts for recipes deleted in the meantime are dropped.
+    """
+    # Before draining, so an increment buffered after the drain starts a new timer
+    _cancel_timer()
+    counts = buffer.drain()
+    if not counts:
+        return 0
+    keys = list(counts)
+    written = 0
+    with transaction.atomic():
+        for start in range(0, len(keys), CHUNK_SIZE):
+            chunk = keys[start:start + CHUNK_SIZE]
+            existing = set(
+                Recipe.objects.filter(pk__in={recipe_id for recipe_id, _ in chunk}).values_list('pk', flat=True)
+            )
+            rows = [(*key, *counts[key]) for key in chunk if key[0] in existing]
+            if rows:
+                _upsert(rows)
+                written += len(rows)
+    return written
+
+
+def _upsert(rows):
+    quote = connection.ops.quote_name
+    meta = RecipeEngagement._meta
+    recipe, hour, views, saves = (
+        quote(meta.get_field(name).column) for name in ('recipe', 'hour', 'views', 'saves')
+    )
+    sql = (
+        f'INSERT INTO {quote(meta.db_table)} ({recipe}, {hour}, {views}, {saves}) '
+        f'VALUES {", ".join(["(%s, %s, %s, %s)"] * len(rows))} '
+        f'ON CONFLICT ({recipe}, {hour}) DO UPDATE SET '
+        f'{views} = {quote(meta.db_table)}.{views} + excluded.{views}, '
+        f'{saves} = {quote(meta.db_table)}.{saves} + excluded.{saves}'
+    )
+    hour_field = meta.get_field('hour')
+    params = []
+    for recipe_id, bucket, view_count, save_count in rows:
+        params += [recipe_id, hour_field.get_db_prep_value(bucket, connection), view_count, save_count]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def decayed_scores(now=None):
+    """
+    `{recipe_id: score}` over the engagement window, each hour bucket
+    weighted by `0.5 ** (age / half life)`.
+    """
+    now = now or timezone.now()
+    half_life = half_life_hours() * 3600
+    buckets = RecipeEngagement.objects.filter(hour__gte=now - timedelta(hours=window_hours()))
+    scores = defaultdict(float)
+    rows = buckets.values_list('recipe_id', 'hour', 'views', 'saves').iterator(chunk_size=CHUNK_SIZE)
+    for recipe_id, hour, views, saves in rows:
+        age = max((now - hour).total_seconds(), 0)
+        scores[recipe_id] += (views + SAVE_WEIGHT * saves) * 0.5 ** (age / half_life)
+    return {recipe_id: round(score, 4) for recipe_id, score in scores.items()}
+
+
+def recompute_trending(now=None, batch_size=CHUNK_SIZE):
+    """
+    Store fresh decayed scores on `Recipe.trending_score`, reset recipes
+    that dropped out of the window to 0 and delete expired buckets.
+    Only changed rows are written. Returns (scored, updated).
+    """
+    now = now or timezone.now()
+    scores = decayed_scores(now)
+    current = dict(Recipe.objects.filter(trending_score__gt=0).values_list('id', 'trending_score'))
+    changed = {
+        recipe_id: scores.get(recipe_id, 0)
+        for recipe_id in set(scores) | set(current)
+        if scores.get(recipe_id, 0) != current.get(recipe_id, 0)
+    }
+    with transaction.atomic():
+        Recipe.objects.bulk_update(
+            [Recipe(pk=recipe_id, trending_score=score) for recipe_id, score in changed.items()],
+            ['trending_score'], batch_size=batch_size,
+        )
+        RecipeEngagement.objects.filter(hour__lt=now - timedelta(hours=window_hours())).delete()
+    if changed:
+        cache.bump('trending')
+    return len(scores), len(changed)
@@ -0,0 +1,95 @@
+"""
+Fast read path for recipe lists.
+
+Builds the same dicts as `RecipeSerializer` straight from `values()` rows,
+with one converter per selected field picked up front, instead of DRF's
+per-object field dispatch (get_attribute, to_representation,
+SerializerMethodField). `FastPathTests` checks that the rendered bytes
+match the serializer's.
+"""
+from rest_framework import fields as drf_fields
+from rest_framework.settings import api_settings
+
+from . import images, metrics
+
+
+def datetime_converter(field):
+    """
+    `DateTimeField.to_representation` specialised for ISO 8601 output in
+    a fixed timezone; other configurations use the field itself.
+    """
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if output_format is None or output_format.lower() != drf_fields.ISO_8601 or timezone is None:
+        return field.to_representation
+
+    def convert(value):
+        if not value:
+            return None
+        text = value.astimezone(timezone).isoformat()
+        return text[:-6] + 'Z' if text.endswith('+00:00') else text
+    return convert
+
+
+class RecipeRows:
+    """
+    Serialize recipe `values()` rows for `serializer_class`'s selected
+    fields (`?fields=` / `?omit=` apply as usual).
+    """
+    # Output field -> values() key; plain model fields map to themselves.
+    keys = {
+        'author': 'author__username',
+        'category_name': 'category__name',
+        'is_author': 'author_id',
+        'image': 'image_variants',
+    }
+    # A ReadOnlyField across a null relation is left out, not null.
+    skip_null = {'category_name'}
+    # Keys the keyset paginator reads from every row.
+    required_keys = ('id', 'created_at')
+
+    def __init__(self, serializer_class, request):
+        self.names = serializer_class.selected_fields(request)
+        fields = serializer_class(context={'request': request}).fields
+        user_id = request.user.pk if request is not None else None
+        self.columns = [
+            (name, self.keys.get(name, name), self.converter(name, fields[name], user_id),
+             name in self.skip_null)
+            for name in self.names
+        ]
+
+    def converter(self, name, field, user_id):
+        if name == 'is_author':
+            return lambda author_id: author_id == user_id
+        if name == 'image':
+            return images.image_data
+        if isinstance(field, drf_fields.DateTimeField):
+            return datetime_converter(field)
+        # ids and text come back from the database as int / str already.
+        return None
+
+    def values(self, queryset, *extra_keys):
+        """
+        `queryset.values()` with every key the columns read, plus any
+        `extra_keys` (e.g. another paginator's ordering).
+        """
+        keys = dict.fromkeys([column[1] for column in self.columns] + list(self.required_keys))
+        return queryset.values(*keys, *extra_keys)
+
+    def serialize(self, rows):
+        columns = self.columns
+        rows = list(rows)  # fetch outside the timed block
+        data = []
+        with metrics.phase('serialize'):
+            for row in rows:
+                item = {}
+                for name, key, convert, skip_null in columns:
+                    value = row[key]
+                    if value is None:
+                        if skip_null:
+                            continue
+                    elif convert is not None:
+                        value = convert(value)
+                    item[name] = value
+                data.append(item)
+        return data
@@ -0,0 +1,306 @@
+"""
+Materialized (fan-out-on-write) feed.
+
+When a recipe is created it is copied into a `FeedEntry` row for each
+follower of its author, so reading a feed is one range scan over
+`(owner, created_at)`. Authors with more followers than
+`FEED_FANOUT_MAX_FOLLOWERS` are treated as "celebrities": their recipes
+keep `fanned_out=False` and are pulled in at read time instead.
+"""
+import base64
+import binascii
+import heapq
+import json
+from collections import defaultdict
+from datetime import datetime
+from itertools import islice
+from operator import attrgetter
+from typing import Callable, NamedTuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+
+from . import jobs
+from .models import Recipe, Following, FeedEntry, UserStats
+
+BATCH_SIZE = 1000
+
+
+def fanout_max_followers():
+    return getattr(settings, 'FEED_FANOUT_MAX_FOLLOWERS', 5000)
+
+
+def bulk_insert_entries(entries, batch_size=BATCH_SIZE):
+    """
+    Insert feed entries in batches, skipping ones that already exist.
+    Returns the number of entries offered.
+    """
+    entries = iter(entries)
+    total = 0
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            return total
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        total += len(batch)
+
+
+def fan_out_recipe(recipe):
+    """
+    Push a newly created recipe into its author's followers' feeds,
+    unless the author has too many followers to write to.
+    """
+    return fan_out_recipes([recipe]) > 0
+
+
+def fan_out_recipes(recipes):
+    """
+    Fan out a batch of new recipes with one follower lookup per author;
+    used directly after `bulk_create`, which sends no post_save.
+    Returns the number of recipes that were fanned out.
+
+    Followers are read under a lock on the author's stats row, which
+    `sync_followed_author` and the follow counter update also take. A
+    follow committed before the lock is seen here. One committed after it
+    is backfilled once this commits, because its sync then finds the
+    recipes fanned out.
+    """
+    by_author = defaultdict(list)
+    for recipe in recipes:
+        by_author[recipe.author_id].append(recipe)
+
+    fanned_out = 0
+    for author_id, batch in by_author.items():
+        with transaction.atomic():
+            lock_stats(author_id)
+            followers = Following.objects.filter(following_id=author_id)
+            if followers.count() > fanout_max_followers():
+                continue
+            follower_ids = list(followers.values_list('follower_id', flat=True))
+            Recipe.objects.filter(pk__in=[recipe.pk for recipe in batch]).update(fanned_out=True)
+            bulk_insert_entries(
+                FeedEntry(owner_id=follower_id, recipe_id=recipe.pk,
+                          author_id=author_id, created_at=recipe.created_at)
+                for recipe in batch
+                for follower_id in follower_ids
+            )
+        for recipe in batch:
+            recipe.fanned_out = True
+        fanned_out += len(batch)
+    return fanned_out
+
+
+def lock_stats(*user_ids):
+    """
+    Lock the users' stats rows until the transaction ends, in id order so
+    two lockers can't deadlock.
+    """
+    list(UserStats.objects.select_for_update().filter(user_id__in=user_ids).order_by('user_id').values_list('pk'))
+
+
+def add_author_to_feed(owner_id, author_id):
+    """
+    Backfill a new follow: copy the author's fanned-out recipes into the feed.
+    """
+    recipes = Recipe.objects.filter(author_id=author_id, fanned_out=True)
+    bulk_insert_entries(
+        FeedEntry(owner_id=owner_id, recipe_id=recipe_id,
+                  author_id=author_id, created_at=created_at)
+        for recipe_id, created_at in recipes.values_list('id', 'created_at').iterator()
+    )
+
+
+def remove_author_from_feed(owner_id, author_id):
+    FeedEntry.objects.filter(owner_id=owner_id, author_id=author_id).delete()
+
+
+@jobs.task
+def fan_out_new_recipe(recipe_id):
+    """
+    Task: fan out a new recipe, unless it was deleted or fanned out meanwhile.
+    """
+    fan_out_new_recipes([recipe_id])
+
+
+@jobs.task
+def fan_out_new_recipes(recipe_ids):
+    """
+    Task: fan out a batch of new recipes (a bulk import chunk), skipping
+    those deleted or fanned out meanwhile.
+    """
+    fan_out_recipes(Recipe.objects.filter(pk__in=recipe_ids, fanned_out=False).only('id', 'author_id', 'created_at'))
+
+
+@jobs.task
+def sync_followed_author(owner_id, author_id):
+    """
+    Task: add the author's recipes to the owner's feed or remove them,
+    by whether the owner follows the author now, so a follow and unfollow
+    in quick succession end right in whichever order their jobs run.
+    Jobs for one owner are serialized on the owner's stats row, and the
+    author's is locked against a concurrent `fan_out_recipes`.
+    """
+    lock_stats(owner_id, author_id)
+    if Following.objects.filter(follower_id=owner_id, following_id=author_id).exists():
+        add_author_to_feed(owner_id, author_id)
+    else:
+        remove_author_from_feed(owner_id, author_id)
+
+
+def materialized_entries(user):
+    """
+    Feed entries fanned out to the user, newest first.
+    """
+    return (
+        FeedEntry.objects
+        .filter(owner=user)
+        .select_related('recipe__author', 'recipe__category')
+        .order_by('-created_at', '-recipe_id')
+    )
+
+
+def pulled_recipes(user):
+    """
+    Recipes by followed "celebrity" authors, read on demand, newest first.
+    """
+    followed = Following.objects.filter(follower=user).values('following_id')
+    return (
+        Recipe.objects
+        .filter(fanned_out=False, author_id__in=followed)
+        .select_related('author', 'category')
+        .order_by('-created_at', '-id')
+    )
+
+
+def on_read_recipes(user):
+    """
+    The original fan-out-on-read query, kept as the reference result.
+    """
+    followed = Following.objects.filter(follower=user).values('following_id')
+    return Recipe.objects.filter(author_id__in=followed).order_by('-created_at', '-id')
+
+
+# Feed items are totally ordered on (created_at, type, id). Each stream
+# below is a single index-ordered query; pages are built by k-way merging
+# the streams instead of materializing and sorting them in Python.
+FOLLOW = 'follow'
+RECIPE = 'recipe'
+
+
+class FeedItem(NamedTuple):
+    created_at: datetime
+    type: str
+    id: int
+    obj: object
+
+    @property
+    def position(self):
+        return (self.created_at, self.type, self.id)
+
+
+class FeedStream(NamedTuple):
+    queryset: QuerySet
+    type: str
+    id_field: str
+    get_obj: Callable
+
+    def filter_from(self, position, newer):
+        """
+        Restrict the stream to items strictly after (`newer`) or before
+        `position` in (created_at, type, id) order.
+        """
+        created_at, item_type, item_id = position
+        op = 'gt' if newer else 'lt'
+        if self.type == item_type:
+            return self.queryset.filter(
+                Q(**{f'created_at__{op}e': created_at})
+                & (Q(**{f'created_at__{op}': created_at}) | Q(**{f'{self.id_field}__{op}': item_id}))
+            )
+        # Same timestamp: a later type sorts after, an earlier one before.
+        inclusive = (self.type > item_type) == newer
+        lookup = f'created_at__{op}e' if inclusive else f'created_at__{op}'
+        return self.queryset.filter(**{lookup: created_at})
+
+    def page(self, position, newer, limit):
+        queryset = self.queryset if position is None else self.filter_from(position, newer)
+        prefix = '' if newer else '-'
+        return queryset.order_by(f'{prefix}created_at', f'{prefix}{self.id_field}')[:limit]
+
+    def item(self, row):
+        return FeedItem(row.created_at, self.type, getattr(row, self.id_field), self.get_obj(row))
+
+    def items(self, position, newer, limit):
+        for row in self.page(position, newer, limit):
+            yield self.item(row)
+
+    async def aitems(self, position, newer, limit):
+        return [self.item(row) async for row in self.page(position, newer, limit)]
+
+
+def recipe_streams(user):
+    return [
+        FeedStream(materialized_entries(user), RECIPE, 'recipe_id', attrgetter('recipe')),
+        FeedStream(pulled_recipes(user), RECIPE, 'id', lambda recipe: recipe),
+    ]
+
+
+def feed_streams(user):
+    follows = Following.objects.filter(follower=user).select_related('follower', 'following')
+    return recipe_streams(user) + [
+        FeedStream(follows, FOLLOW, 'id', lambda follow: follow),
+    ]
+
+
+def merge_streams(streams, position=None, newer=False, limit=20):
+    """
+    Return up to `limit` items after/before `position`, merged across streams.
+    Older pages come newest first; newer pages come oldest first.
+    """
+    merged = heapq.merge(
+        *(stream.items(position, newer, limit) for stream in streams),
+        key=attrgetter('position'), reverse=not newer,
+    )
+    return list(islice(merged, limit))
+
+
+async def amerge_streams(streams, position=None, newer=False, limit=20):
+    """
+    `merge_streams` for async views. Django runs async ORM queries one
+    at a time on its thread-sensitive executor, so the streams are
+    fetched in turn; the event loop is free for other requests while
+    each query runs.
+    """
+    pages = [await stream.aitems(position, newer, limit) for stream in streams]
+    merged = heapq.merge(*pages, key=attrgetter('position'), reverse=not newer)
+    return list(islice(merged, limit))
+
+
+def feed_recipes(user, limit):
+    """
+    Newest `limit` recipes of the user's feed: the materialized entries
+    merged with recipes pulled from celebrity authors.
+    """
+    return [item.obj for item in merge_streams(recipe_streams(user), limit=limit)]
+
+
+def encode_cursor(position):
+    created_at, item_type, item_id = position
+    raw = json.dumps([created_at.isoformat(), item_type, item_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Decode an opaque feed cursor, raising ValueError if it is malformed.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        created_at, item_type, item_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (TypeError, ValueError, binascii.Error):
+        raise ValueError('Invalid feed cursor.')
+    created_at = parse_datetime(created_at) if isinstance(created_at, str) else None
+    if created_at is None or item_type not in (FOLLOW, RECIPE) or not isinstance(item_id, int):
+        raise ValueError('Invalid feed cursor.')
+    return (created_at, item_type, item_id)
@@ -0,0 +1,121 @@
+"""
+Follow and unfollow as single statements.
+
+`INSERT ... ON CONFLICT DO NOTHING RETURNING` and `DELETE ... RETURNING`
+report which rows actually changed, so concurrent requests can't race
+between an existence check and the write (the old toggle could hit the
+unique constraint and answer 500). Both need PostgreSQL or SQLite 3.35+.
+Bulk writes send no signals, so post_save / post_delete are sent here
+for the changed rows, keeping the feed and counter handlers in
+`recipes/signals.py` in step.
+"""
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from . import cache
+from .models import Following
+
+MAX_BULK_IDS = 500
+
+
+def _names():
+    quote = connection.ops.quote_name
+    fields = Following._meta
+    return {
+        'table': quote(fields.db_table),
+        'id': quote(fields.pk.column),
+        'follower': quote(fields.get_field('follower').column),
+        'following': quote(fields.get_field('following').column),
+        'created_at': quote(fields.get_field('created_at').column),
+        'users': quote(User._meta.db_table),
+        'user_id': quote(User._meta.pk.column),
+    }
+
+
+def follow_many(follower, user_ids):
+    """
+    Follow every existing user in `user_ids` in one INSERT ... SELECT;
+    returns the ids that were not already followed. The follower's own id
+    is skipped.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return []
+    created_at = timezone.now()
+    sql = (
+        'INSERT INTO {table} ({follower}, {following}, {created_at}) '
+        'SELECT %s, {user_id}, %s FROM {users} WHERE {user_id} IN ({placeholders}) AND {user_id} <> %s '
+        'ON CONFLICT ({follower}, {following}) DO NOTHING '
+        'RETURNING {id}, {following}'
+    ).format(placeholders=', '.join(['%s'] * len(user_ids)), **_names())
+    params = [
+        follower.pk,
+        Following._meta.get_field('created_at').get_db_prep_value(created_at, connection),
+        *user_ids,
+        follower.pk,
+    ]
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        for pk, following_id in rows:
+            instance = Following(pk=pk, follower=follower, following_id=following_id, created_at=created_at)
+            post_save.send(
+                sender=Following, instance=instance, created=True,
+                update_fields=None, raw=False, using=connection.alias,
+            )
+    return [following_id for _, following_id in rows]
+
+
+def unfollow_many(follower, user_ids):
+    """
+    Unfollow `user_ids` in one DELETE ... RETURNING; returns the ids that
+    were actually followed.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return []
+    sql = (
+        'DELETE FROM {table} WHERE {follower} = %s AND {following} IN ({placeholders}) '
+        'RETURNING {id}, {following}'
+    ).format(placeholders=', '.join(['%s'] * len(user_ids)), **_names())
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [follower.pk, *user_ids])
+            rows = cursor.fetchall()
+        for pk, following_id in rows:
+            instance = Following(pk=pk, follower=follower, following_id=following_id)
+            post_delete.send(sender=Following, instance=instance, using=connection.alias, origin=instance)
+    return [following_id for _, following_id in rows]
+
+
+def _followed_ids_key(user_id):
+    return f'followed-ids:{user_id}'
+
+
+def followed_ids(user):
+    """
+    The set of user ids `user` follows, cached for the response cache TTL
+    and dropped by the Following signal handlers on every change.
+    """
+    key = _followed_ids_key(user.pk)
+    ids = cache.backend().get(key) if cache.timeout() else None
+    if ids is None:
+        ids = frozenset(Following.objects.filter(follower=user).values_list('following_id', flat=True))
+        if cache.timeout():
+            cache.backend().set(key, ids, cache.timeout())
+    return ids
+
+
+def forget_followed_ids(user_id):
+    cache.backend().delete(_followed_ids_key(user_id))
+
+
+def follow(follower, user_id):
+    return bool(follow_many(follower, [user_id]))
+
+
+def unfollow(follower, user_id):
+    return bool(unfollow_many(follower, [user_id]))
@@ -0,0 +1,198 @@
+"""
+Recipe images: streamed uploads and resized variants.
+
+An upload is written to a temporary file as it arrives
+(`ImageUploadHandler`), never held in memory, and handed to the default
+storage from there. Once it is committed, a per-process pool of
+`RECIPE_IMAGE_WORKERS` threads resizes it to each of
+`RECIPE_IMAGE_WIDTHS` narrower than the original, largest first and
+each from the previous one, and encodes every size as WebP and, when
+Pillow can, AVIF. The variants' storage names go into
+`Recipe.image_variants`, which is all the API shows (`image_data`, a
+srcset per format), so no response points at the full-size upload
+unless Pillow was built without WebP, when it is the fallback `src`.
+
+A resize still queued when its process exits is lost;
+`python manage.py generate_thumbnails` redoes the missing ones.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import cache
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Pillow format, MIME type, file extension; in the order clients should prefer.
+FORMATS = [('AVIF', 'image/avif', 'avif'), ('WEBP', 'image/webp', 'webp')]
+QUALITY = 80
+
+
+def max_bytes():
+    return getattr(settings, 'RECIPE_IMAGE_MAX_BYTES', 10 * 1024 * 1024)
+
+
+def widths():
+    return sorted(getattr(settings, 'RECIPE_IMAGE_WIDTHS', [320, 640, 1280]))
+
+
+def workers():
+    return getattr(settings, 'RECIPE_IMAGE_WORKERS', 2)
+
+
+def formats():
+    Image.init()
+    return [entry for entry in FORMATS if entry[0] in Image.SAVE]
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Write the upload straight to a temporary file (the default handlers
+    keep up to 2.5 MB in memory) and stop reading once it passes
+    `max_bytes()`, setting `too_large`.
+    """
+    too_large = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > max_bytes():
+            self.too_large = True
+            raise StopUpload(connection_reset=True)
+        return super().receive_data_chunk(raw_data, start)
+
+
+def variant_widths(original_width):
+    """
+    The configured widths narrower than the original, plus the original
+    width when it is narrower than the widest one (no upscaling).
+    """
+    sizes = [width for width in widths() if width < original_width]
+    if original_width < widths()[-1]:
+        sizes.append(original_width)
+    return sizes
+
+
+def make_variants(name):
+    """
+    Resize and encode the stored image `name`; returns the
+    `image_variants` value for it. Variants already written are deleted
+    if a later one fails.
+    """
+    stem = os.path.splitext(name)[0]
+    with default_storage.open(name) as source, Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or 'A' in image.mode else 'RGB')
+        variants = {'width': image.width, 'height': image.height, 'original': name, 'sources': {}}
+        resized = image
+        try:
+            for width in reversed(variant_widths(image.width)):
+                height = max(round(image.height * width / image.width), 1)
+                resized = resized.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+                for format, mime_type, extension in formats():
+                    output = BytesIO()
+                    resized.save(output, format, quality=QUALITY)
+                    saved = default_storage.save(f'{stem}-{width}w.{extension}', ContentFile(output.getvalue()))
+                    variants['sources'].setdefault(mime_type, {})[str(width)] = saved
+        except Exception:
+            delete_files(variant_names(variants))
+            raise
+    return variants
+
+
+def variant_names(variants):
+    return [name for by_width in (variants or {}).get('sources', {}).values() for name in by_width.values()]
+
+
+def delete_files(names):
+    for name in names:
+        if name:
+            default_storage.delete(name)
+
+
+def generate(recipe_id):
+    """
+    Make the variants of a recipe's current image and store them, unless
+    the image was replaced or removed meanwhile. Returns the variants
+    stored, or None.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).values('image', 'image_variants', 'author_id').first()
+    if recipe is None or not recipe['image']:
+        return None
+    variants = make_variants(recipe['image'])
+    # update() sends no post_save: bump the response cache here, and
+    # updated_at so ETags and Last-Modified change with the image.
+    stored = Recipe.objects.filter(pk=recipe_id, image=recipe['image']).update(
+        image_variants=variants, updated_at=timezone.now(),
+    )
+    if not stored:
+        delete_files(variant_names(variants))
+        return None
+    delete_files(variant_names(recipe['image_variants']))
+    cache.bump('recipes', f'recipe:{recipe_id}', cache.author_scope(recipe['author_id']))
+    return variants
+
+
+def _generate_in_worker(recipe_id):
+    try:
+        generate(recipe_id)
+    except Exception:
+        logger.exception("Could not make image variants for recipe %s", recipe_id)
+    finally:
+        # Worker threads have connections of their own.
+        close_old_connections()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(workers(), thread_name_prefix='recipe-images')
+        return _pool
+
+
+def submit(recipe_id):
+    """
+    Make the variants once the current transaction commits: on the worker
+    pool, or right away with `RECIPE_IMAGE_WORKERS = 0`.
+    """
+    if workers():
+        transaction.on_commit(lambda: pool().submit(_generate_in_worker, recipe_id))
+    else:
+        transaction.on_commit(lambda: generate(recipe_id))
+
+
+def image_data(variants):
+    """
+    What the API shows of an image: its size (for the aspect ratio), the
+    smallest WebP as a fallback `src` (the original without WebP), and a
+    srcset per MIME type. None until the variants are ready.
+    """
+    if not variants:
+        return None
+    srcset = {}
+    for mime_type, by_width in variants['sources'].items():
+        ordered = sorted(by_width.items(), key=lambda item: int(item[0]))
+        srcset[mime_type] = ', '.join(f'{default_storage.url(name)} {width}w' for width, name in ordered)
+    webp = variants['sources'].get('image/webp')
+    src = webp[min(webp, key=int)] if webp else variants.get('original')
+    return {
+        'src': default_storage.url(src) if src else None,
+        'width': variants['width'],
+        'height': variants['height'],
+        'srcset': srcset,
+    }
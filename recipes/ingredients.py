@@ -0,0 +1,200 @@
+"""
+Parses free-form `Recipe.ingredients` text into normalized `Ingredient`
+rows and answers "what can I cook with" queries from the resulting
+ingredient -> recipe postings.
+"""
+import re
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Case, Exists, IntegerField, Max, OuterRef, Q, When
+
+from . import jobs
+from .models import Recipe, Ingredient, RecipeIngredient
+
+BATCH_SIZE = 500
+
+UNITS = {
+    'g', 'gram', 'kg', 'mg', 'ml', 'l', 'litre', 'liter', 'dl', 'cl', 'oz', 'ounce', 'lb', 'pound',
+    'cup', 'tbsp', 'tablespoon', 'tsp', 'teaspoon', 'pinch', 'dash', 'clove', 'can', 'tin', 'jar',
+    'handful', 'bunch', 'slice', 'piece', 'packet', 'pack', 'sprig', 'stick', 'large', 'medium', 'small',
+}
+QUANTITY_RE = re.compile(r'^[\d\s/.,½¼¾⅓⅔⅛-]+')
+NOISE_RE = re.compile(r'\(.*?\)|[^\w\s-]')
+
+# Search terms that stand for a family of ingredients.
+INGREDIENT_GROUPS = {
+    'nut': ['almond', 'cashew', 'hazelnut', 'peanut', 'pecan', 'pistachio', 'walnut', 'macadamia'],
+    'dairy': ['butter', 'cheese', 'cream', 'milk', 'parmesan', 'yogurt'],
+    'meat': ['bacon', 'beef', 'chicken', 'lamb', 'pork', 'sausage', 'turkey'],
+    'seafood': ['cod', 'crab', 'prawn', 'salmon', 'shrimp', 'tuna'],
+}
+
+
+def singular(word):
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 4 and word.endswith(('oes', 'ches', 'shes')):
+        return word[:-2]
+    if len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us')):
+        return word[:-1]
+    return word
+
+
+def normalize(name):
+    """
+    Lowercase, drop notes and punctuation, singularize: "Red Onions, diced" -> "red onion".
+    """
+    name = name.split(',')[0].lower()
+    words = NOISE_RE.sub(' ', name).split()
+    return ' '.join(singular(word) for word in words)[:100]
+
+
+def parse_line(line):
+    """
+    Split "2 tbsp olive oil" into ("olive oil", "2 tbsp"); None for blank lines.
+    """
+    line = line.strip().lstrip('-*• ').strip()
+    if not line:
+        return None
+    match = QUANTITY_RE.match(line)
+    quantity, rest = (match.group().strip(), line[match.end():]) if match else ('', line)
+    words = rest.split()
+    while words and singular(words[0].lower().rstrip('.')) in UNITS | {'of'}:
+        word = words.pop(0)
+        if word.lower() != 'of':
+            quantity = f'{quantity} {word}'.strip()
+    name = normalize(' '.join(words))
+    return (name, quantity[:50]) if name else None
+
+
+def parse_ingredients(text):
+    """
+    Parse one ingredient per line, keeping the first quantity for duplicates.
+    """
+    parsed = {}
+    for line in (text or '').splitlines():
+        item = parse_line(line)
+        if item and item[0] not in parsed:
+            parsed[item[0]] = item[1]
+    return parsed
+
+
+def _ingredient_ids(names):
+    names = set(names)
+    existing = dict(Ingredient.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = [Ingredient(name=name) for name in names - existing.keys()]
+    if missing:
+        Ingredient.objects.bulk_create(missing, ignore_conflicts=True)
+        existing.update(Ingredient.objects.filter(name__in=[i.name for i in missing]).values_list('name', 'id'))
+    return existing
+
+
+def index_recipes(recipes):
+    """
+    Replace the parsed ingredient rows of the given recipes.
+    """
+    recipes = list(recipes)
+    parsed = {recipe.pk: parse_ingredients(recipe.ingredients) for recipe in recipes}
+    ids = _ingredient_ids(name for items in parsed.values() for name in items)
+    with transaction.atomic():
+        RecipeIngredient.objects.filter(recipe_id__in=parsed.keys()).delete()
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe_id=recipe_id, ingredient_id=ids[name], quantity=quantity)
+            for recipe_id, items in parsed.items()
+            for name, quantity in items.items()
+        )
+
+
+@jobs.task
+def index_recipe(recipe_id):
+    """
+    Task: index a saved recipe, unless it was deleted meanwhile.
+    """
+    index_recipe_ids([recipe_id])
+
+
+@jobs.task
+def index_recipe_ids(recipe_ids):
+    """
+    Task: index a batch of saved recipes (a bulk import chunk), skipping
+    those deleted meanwhile.
+    """
+    index_recipes(Recipe.objects.filter(pk__in=recipe_ids).only('id', 'ingredients'))
+
+
+def index_all(queryset=None, batch_size=BATCH_SIZE):
+    queryset = (queryset if queryset is not None else Recipe.objects.all()).only('id', 'ingredients')
+    recipes = queryset.order_by('id').iterator(chunk_size=batch_size)
+    total = 0
+    while True:
+        batch = list(islice(recipes, batch_size))
+        if not batch:
+            return total
+        index_recipes(batch)
+        total += len(batch)
+
+
+def resolve_term(term):
+    """
+    Ingredient ids a search term stands for: "chicken" matches
+    "chicken breast" and "smoked chicken"; group terms like "nuts" expand.
+    """
+    term = normalize(term)
+    if not term:
+        return []
+    names = INGREDIENT_GROUPS.get(term, []) + [term]
+    condition = Q()
+    for name in names:
+        condition |= (
+            Q(name=name) | Q(name__startswith=f'{name} ')
+            | Q(name__endswith=f' {name}') | Q(name__contains=f' {name} ')
+        )
+    return list(Ingredient.objects.filter(condition).values_list('id', flat=True))
+
+
+def _uses_any(ingredient_ids):
+    return Exists(RecipeIngredient.objects.filter(recipe_id=OuterRef('recipe_id'), ingredient_id__in=ingredient_ids))
+
+
+def recipes_with(include, exclude=(), match_all=False, limit=20):
+    """
+    Rank recipes by how many `include` terms they cover, dropping any that
+    contain an `exclude` term. Returns (recipe_id, matched_terms) pairs.
+
+    Recipes covering every term are found first by walking one term's
+    postings newest-first and probing the (ingredient, recipe) index for
+    the others, which stops after `limit` hits. Only when that tier is
+    short do we fall back to counting matches over all postings.
+    """
+    include_ids = [ids for ids in map(resolve_term, include) if ids]
+    if not include_ids or (match_all and len(include_ids) < len(include)):
+        return []
+    exclude_ids = {pk for term in exclude for pk in resolve_term(term)}
+
+    first, *others = include_ids
+    full = RecipeIngredient.objects.filter(ingredient_id__in=first)
+    for ids in others:
+        full = full.filter(_uses_any(ids))
+    if exclude_ids:
+        full = full.exclude(_uses_any(exclude_ids))
+    full = list(full.order_by('-recipe_id').values_list('recipe_id', flat=True).distinct()[:limit])
+    if match_all or len(full) == limit or len(include_ids) == 1:
+        return [(recipe_id, len(include_ids)) for recipe_id in full]
+
+    matched = sum(
+        Max(Case(When(ingredient_id__in=ids, then=1), default=0, output_field=IntegerField()))
+        for ids in include_ids
+    )
+    partial = (
+        RecipeIngredient.objects
+        .filter(ingredient_id__in={pk for ids in include_ids for pk in ids})
+        .values('recipe_id')
+        .annotate(matched=matched)
+    )
+    if exclude_ids:
+        partial = partial.exclude(
+            recipe_id__in=RecipeIngredient.objects.filter(ingredient_id__in=exclude_ids).values('recipe_id')
+        )
+    partial = partial.order_by('-matched', '-recipe_id')[:limit]
+    return [(row['recipe_id'], row['matched']) for row in partial]
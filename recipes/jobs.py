@@ -0,0 +1,177 @@
+"""
+Background jobs in a database table, run by `manage.py run_worker`.
+
+Side effects of writes that readers can wait a moment for (feed fan-out
+and backfill, the ingredient index) are enqueued as `Job` rows instead of
+running in the request. A job is inserted once the write's transaction
+commits, so a rolled-back write leaves none behind and a worker never
+sees a job before the rows it refers to.
+
+Workers claim due jobs in batches of `JOBS_BATCH_SIZE`:
+
+- where the database can skip locked rows (PostgreSQL), with
+  `SELECT ... FOR UPDATE SKIP LOCKED`, so workers never wait on each
+  other's batches;
+- elsewhere (SQLite), with a single `UPDATE` that stamps a random claim
+  token on up to that many due jobs, which SQLite's database-wide write
+  lock makes atomic, then reading back the jobs carrying the token.
+
+Each job runs in its own transaction. A job that succeeds is deleted; one
+that raises is retried after `JOBS_RETRY_SECONDS`, doubling with every
+attempt up to `JOBS_RETRY_MAX_SECONDS`, and marked failed after
+`JOBS_MAX_ATTEMPTS`. Jobs left running by a worker that died are claimed
+again after `JOBS_CLAIM_TIMEOUT` seconds. A job can therefore run more
+than once, so tasks must be idempotent.
+
+With `JOBS_INLINE` (the default with DEV), tasks run right away in the
+calling code instead, as before the queue, and no worker is needed.
+"""
+import logging
+import random
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Task name -> function, filled by the @task decorator
+TASKS = {}
+
+
+def inline():
+    return getattr(settings, 'JOBS_INLINE', False)
+
+
+def batch_size():
+    return getattr(settings, 'JOBS_BATCH_SIZE', 20)
+
+
+def max_attempts():
+    return getattr(settings, 'JOBS_MAX_ATTEMPTS', 5)
+
+
+def retry_seconds():
+    return getattr(settings, 'JOBS_RETRY_SECONDS', 10)
+
+
+def retry_max_seconds():
+    return getattr(settings, 'JOBS_RETRY_MAX_SECONDS', 3600)
+
+
+def claim_timeout():
+    return getattr(settings, 'JOBS_CLAIM_TIMEOUT', 300)
+
+
+def task_name(func):
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def task(func):
+    """
+    Register `func` so it can be enqueued; it is called with the keyword
+    arguments given to `enqueue`, which must be JSON-serializable.
+    """
+    TASKS[task_name(func)] = func
+    return func
+
+
+def enqueue(func, **kwargs):
+    """
+    Run the task `func(**kwargs)` in a worker once the current transaction
+    commits (right away outside one), or now with `JOBS_INLINE`.
+    """
+    name = task_name(func)
+    if TASKS.get(name) is not func:
+        raise ValueError(f"{name} is not a registered task")
+    if inline():
+        func(**kwargs)
+    else:
+        transaction.on_commit(lambda: Job.objects.create(task=name, payload=kwargs))
+
+
+def backoff(attempts):
+    """
+    Seconds to wait before retrying a job that failed `attempts` times,
+    with jitter so jobs that failed together don't retry together.
+    """
+    delay = min(retry_seconds() * 2 ** (attempts - 1), retry_max_seconds())
+    return delay * random.uniform(0.75, 1)
+
+
+def due():
+    now = timezone.now()
+    return Job.objects.filter(
+        Q(status=Job.PENDING, run_at__lte=now)
+        | Q(status=Job.RUNNING, claimed_at__lt=now - timedelta(seconds=claim_timeout()))
+    )
+
+
+def claim(size=None):
+    """
+    Claim up to `size` due jobs, oldest first, for this worker alone.
+    """
+    size = size or batch_size()
+    token = uuid.uuid4().hex
+    claimed = {
+        'status': Job.RUNNING, 'claimed_by': token, 'claimed_at': timezone.now(),
+        'attempts': F('attempts') + 1,
+    }
+    ready = due().order_by('run_at', 'id')
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(ready.select_for_update(skip_locked=True).values_list('id', flat=True)[:size])
+            Job.objects.filter(pk__in=ids).update(**claimed)
+    else:
+        # The outer due() repeats the subquery's check within the UPDATE itself.
+        due().filter(pk__in=ready.values('pk')[:size]).update(**claimed)
+    return list(Job.objects.filter(claimed_by=token).order_by('run_at', 'id'))
+
+
+def run(job):
+    """
+    Run a claimed job in a transaction of its own; returns whether it succeeded.
+    """
+    try:
+        func = TASKS.get(job.task)
+        if func is None:
+            raise LookupError(f"Unknown task {job.task}")
+        with transaction.atomic():
+            func(**job.payload)
+    except Exception:
+        logger.exception("Job %s (%s) failed on attempt %s", job.pk, job.task, job.attempts)
+        retry(job, traceback.format_exc())
+        return False
+    return True
+
+
+def retry(job, error):
+    """
+    Release a failed job for another attempt after `backoff`, or mark it
+    failed once it has had `max_attempts()`.
+    """
+    if job.attempts >= max_attempts():
+        changes = {'status': Job.FAILED}
+    else:
+        changes = {'status': Job.PENDING, 'run_at': timezone.now() + timedelta(seconds=backoff(job.attempts))}
+    # Unless the claim timed out and another worker has the job now
+    Job.objects.filter(pk=job.pk, claimed_by=job.claimed_by).update(
+        claimed_by='', claimed_at=None, last_error=error, **changes,
+    )
+
+
+def work(size=None):
+    """
+    Claim and run one batch; returns (succeeded, failed) counts.
+    """
+    jobs = claim(size)
+    done = [job.pk for job in jobs if run(job)]
+    if done:
+        Job.objects.filter(pk__in=done).delete()
+    return len(done), len(jobs) - len(done)
@@ -0,0 +1,30 @@
+"""
+gunicorn configuration used by `bench_workers`: with
+BENCH_QUERY_DELAY_MS set, each worker sleeps that long before every SQL
+statement, standing in for a database across the network (a local
+SQLite file answers in microseconds, which hides what a worker model
+does while it waits). The leading underscore keeps Django from listing
+this module as a command.
+"""
+import os
+import time
+
+
+def post_worker_init(worker):
+    delay = float(os.environ.get('BENCH_QUERY_DELAY_MS', 0)) / 1000
+    if not delay:
+        return
+    from django.db.backends.signals import connection_created
+
+    def delayed(execute, sql, params, many, context):
+        time.sleep(delay)
+        return execute(sql, params, many, context)
+
+    def add_delay(sender, connection, **kwargs):
+        # Fired again on every reconnect of the same connection object, often
+        # inside a `connection.execute_wrapper()` block, which pops the last
+        # wrapper on exit: so go first in the list, never last.
+        if delayed not in connection.execute_wrappers:
+            connection.execute_wrappers.insert(0, delayed)
+
+    connection_created.connect(add_delay, weak=False)
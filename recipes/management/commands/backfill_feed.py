@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from recipes import feed
+from recipes.models import Recipe, Following, FeedEntry
+
+
+class Command(BaseCommand):
+    help = (
+        "Materialize every user's feed from the Following graph. "
+        "Recipes by authors above FEED_FANOUT_MAX_FOLLOWERS are left to be pulled on read."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help="Delete all existing feed entries before backfilling.",
+        )
+        parser.add_argument('--batch-size', type=int, default=feed.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        celebrities = (
+            Following.objects.values('following_id')
+            .annotate(followers=Count('id'))
+            .filter(followers__gt=feed.fanout_max_followers())
+            .values('following_id')
+        )
+
+        with transaction.atomic():
+            if options['rebuild']:
+                FeedEntry.objects.all().delete()
+            Recipe.objects.filter(author_id__in=celebrities).update(fanned_out=False)
+            Recipe.objects.exclude(author_id__in=celebrities).update(fanned_out=True)
+            # Authors who became celebrities are now pulled on read.
+            FeedEntry.objects.filter(recipe__fanned_out=False).delete()
+
+        authors = (
+            Recipe.objects.filter(fanned_out=True)
+            .order_by('author_id').values_list('author_id', flat=True).distinct()
+        )
+        created = 0
+        for author_id in authors.iterator():
+            recipes = list(
+                Recipe.objects.filter(author_id=author_id, fanned_out=True)
+                .values_list('id', 'created_at')
+            )
+            followers = Following.objects.filter(following_id=author_id).values_list('follower_id', flat=True)
+            with transaction.atomic():
+                created += feed.bulk_insert_entries(
+                    (FeedEntry(owner_id=follower_id, recipe_id=recipe_id,
+                               author_id=author_id, created_at=created_at)
+                     for follower_id in followers.iterator()
+                     for recipe_id, created_at in recipes),
+                    batch_size=batch_size,
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled feeds ({created} entries written or kept)."))
@@ -0,0 +1,363 @@
+import json
+import secrets
+import statistics
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Callable, NamedTuple
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.test.client import encode_multipart
+from django.test.utils import override_settings
+from PIL import Image
+
+from recipes import urls as recipe_urls
+from recipes.models import Category, Following, Recipe
+from recipes.seeding import BENCH_USERNAME, seed_dataset
+
+# Logs in for the staff-only routes in-process; only exists in the rolled-back run.
+STAFF_USERNAME = 'bench_staff'
+
+
+class Route(NamedTuple):
+    name: str
+    method: str
+    path: str
+    # Called with the resolved targets; returns a JSON-able object, a str or bytes.
+    body: Callable = None
+    content_type: str = 'application/json'
+    auth: bool = True
+    write: bool = False
+    staff: bool = False
+
+
+def recipe_body(values):
+    return {
+        'title': 'Benchmark soup', 'description': 'Simmer slowly until rich.',
+        'ingredients': '1 onion\n2 tbsp olive oil', 'instructions': 'Chop.\nSimmer.',
+        'category': values['category'],
+    }
+
+
+BOUNDARY = 'BenchBoundary'
+
+
+def image_body(values):
+    """
+    A multipart upload of a 1600x1200 photo-like JPEG.
+    """
+    output = BytesIO()
+    Image.effect_noise((1600, 1200), 48).convert('RGB').save(output, 'JPEG', quality=85)
+    return encode_multipart(BOUNDARY, {'image': SimpleUploadedFile('bench.jpg', output.getvalue(), 'image/jpeg')})
+
+
+ROUTES = [
+    Route('user-feed', 'GET', '/api/feed/?page_size=20'),
+    Route('recipe-list-create', 'GET', '/api/recipes/?page_size=20'),
+    Route('recipe-list-create', 'POST', '/api/recipes/', body=recipe_body, write=True),
+    Route('recipe-bulk', 'GET', '/api/recipes/bulk/?author={author}'),
+    Route(
+        'recipe-bulk', 'POST', '/api/recipes/bulk/', body=lambda values: json.dumps(recipe_body(values)) + '\n',
+        content_type='application/x-ndjson', write=True,
+    ),
+    Route('recipe-search', 'GET', '/api/recipes/search/?q=chicken'),
+    Route('recipes-by-ingredients', 'GET', '/api/recipes/by-ingredients/?include=garlic,onion'),
+    Route('my-recipes', 'GET', '/api/my_recipes/?page_size=20'),
+    Route('recipe-trending', 'GET', '/api/recipes/trending/'),
+    Route('recipe-detail', 'GET', '/api/recipes/{recipe}/'),
+    Route(
+        'recipe-image', 'PUT', '/api/recipes/{own_recipe}/image/', body=image_body,
+        content_type=f'multipart/form-data; boundary={BOUNDARY}', write=True,
+    ),
+    Route('recipe-save', 'POST', '/api/recipes/{recipe}/save/', write=True),
+    Route('category-list', 'GET', '/api/categories/'),
+    Route('category-detail', 'GET', '/api/categories/{category}/'),
+    Route('user-list', 'GET', '/api/users/?page_size=20'),
+    Route(
+        'bulk-follow', 'POST', '/api/users/follow/',
+        body=lambda values: {'follow': values['user_ids'], 'unfollow': []}, write=True,
+    ),
+    Route('follow-status', 'GET', '/api/users/follow-status/?ids={user_id_list}'),
+    Route('follow-suggestions', 'GET', '/api/users/suggestions/'),
+    Route('follow-user', 'PUT', '/api/users/{author_id}/follow/', write=True),
+    Route('check-follow-status', 'GET', '/api/users/{author_id}/is-following/'),
+    Route('cache-stats', 'GET', '/api/cache-stats/', staff=True),
+    Route('metrics', 'GET', '/api/_metrics', staff=True),
+    Route(
+        'token_obtain_pair', 'POST', '/auth/token/', auth=False,
+        body=lambda values: {'username': BENCH_USERNAME, 'password': values['password']},
+    ),
+    Route(
+        'token_refresh', 'POST', '/auth/token/refresh/', auth=False,
+        body=lambda values: {'refresh': values['refresh']},
+    ),
+]
+JWT_ROUTE_NAMES = {'token_obtain_pair', 'token_refresh'}
+
+
+def uncovered_routes(routes=ROUTES):
+    """
+    URL names in recipes/urls.py (plus the JWT routes) no route benchmarks.
+    """
+    names = {pattern.name for pattern in recipe_urls.urlpatterns} | JWT_ROUTE_NAMES
+    return names - {route.name for route in routes}
+
+
+def queries_from(server_timing):
+    """
+    The query count from a `db;dur=..;desc="N queries"` Server-Timing entry.
+    """
+    for entry in server_timing.split(','):
+        name, _, params = entry.strip().partition(';')
+        if name == 'db' and 'desc="' in params:
+            return int(params.split('desc="')[1].split()[0])
+    return None
+
+
+def percentiles(samples):
+    """
+    p50, p95 and p99 of millisecond latency samples.
+    """
+    latencies = sorted(samples)
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = latencies[0]
+    return {'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3), 'p99_ms': round(p99, 3)}
+
+
+def summarize(route, samples, queries, statuses, elapsed):
+    counted = [count for count in queries if count is not None]
+    return {
+        'name': route.name,
+        'method': route.method,
+        'path': route.path,
+        'requests': len(samples),
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        **percentiles(samples),
+        'queries': statistics.median(counted) if counted else None,
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else None,
+    }
+
+
+def targets():
+    """
+    Values for the route templates, read from the bench reader's data.
+    """
+    reader = User.objects.filter(username=BENCH_USERNAME).first()
+    if reader is None:
+        raise CommandError(f"No {BENCH_USERNAME} user; run seed_data first or drop --no-seed.")
+    followed = Following.objects.filter(follower=reader).order_by('id').values_list('following_id', flat=True)
+    author = User.objects.filter(pk__in=followed[:1]).first() or reader
+    recipe = Recipe.objects.order_by('-created_at', '-id').values_list('pk', flat=True).first()
+    own_recipe = Recipe.objects.filter(author=reader).order_by('-created_at', '-id').values_list('pk', flat=True).first()
+    user_ids = list(User.objects.exclude(pk=reader.pk).order_by('id').values_list('pk', flat=True)[:20])
+    return {
+        'recipe': recipe or 0,
+        'own_recipe': own_recipe or 0,
+        'category': Category.objects.order_by('id').values_list('pk', flat=True).first() or 0,
+        'author': author.username,
+        'author_id': author.pk,
+        'user_ids': user_ids,
+        'user_id_list': ','.join(map(str, user_ids)),
+    }
+
+
+def obtain_tokens(transport, username, password):
+    status, _, content, _ = transport.request(
+        'POST', '/auth/token/', json.dumps({'username': username, 'password': password}),
+        'application/json', {},
+    )
+    if status != 200:
+        raise CommandError(f"Could not log in as {username} (HTTP {status}).")
+    return json.loads(content)
+
+
+class ClientTransport:
+    """
+    In-process requests through the Django test client.
+    """
+    def __init__(self):
+        self.client = Client()
+
+    def request(self, method, path, body, content_type, headers):
+        start = time.perf_counter()
+        response = self.client.generic(
+            method, path, data=body or '', content_type=content_type,
+            **{f"HTTP_{name.upper().replace('-', '_')}": value for name, value in headers.items()},
+        )
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        elapsed = time.perf_counter() - start
+        return response.status_code, response.get('Server-Timing', ''), content, elapsed
+
+
+class HttpTransport:
+    """
+    Real HTTP requests to a running server (e.g. a local gunicorn).
+    """
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, body, content_type, headers):
+        request = urllib.request.Request(
+            self.base_url + path, data=body.encode() if isinstance(body, str) else body, method=method,
+            headers={'Content-Type': content_type, **headers},
+        )
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                status, timing, content = response.status, response.headers.get('Server-Timing', ''), response.read()
+        except urllib.error.HTTPError as error:
+            status, timing, content = error.code, error.headers.get('Server-Timing', ''), error.read()
+        return status, timing, content, time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every route in recipes/urls.py and the JWT token routes as the seeded "
+        "bench reader: p50/p95/p99 latency, queries per request and throughput. Runs in-process "
+        "on a dataset seeded inside a rolled-back transaction, or against --base-url, where the "
+        "staff-only routes are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--categories', type=int, default=12)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--no-seed', action='store_true',
+            help="Use the data already in the database (from seed_data) instead of seeding.",
+        )
+        parser.add_argument('--requests', type=int, default=50, help="Measured requests per route.")
+        parser.add_argument('--warmup', type=int, default=3, help="Unmeasured requests per route.")
+        parser.add_argument(
+            '--base-url',
+            help="Benchmark a running server on this database, e.g. http://127.0.0.1:8000 (implies --no-seed).",
+        )
+        parser.add_argument(
+            '--password', help=f"Password of {BENCH_USERNAME}, as printed by seed_data (required with --base-url).",
+        )
+        parser.add_argument('--concurrency', type=int, default=1, help="Parallel requests with --base-url.")
+        parser.add_argument('--read-only', action='store_true', help="Skip routes that write.")
+        parser.add_argument('--cache', action='store_true', help="Keep the response cache enabled in-process.")
+        parser.add_argument('--route', action='append', help="Only run routes with this URL name (repeatable).")
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        missing = uncovered_routes()
+        if missing:
+            raise CommandError(f"No benchmark route for: {', '.join(sorted(missing))}")
+        routes = [
+            route for route in ROUTES
+            if not (options['read_only'] and route.write)
+            and (not options['route'] or route.name in options['route'])
+        ]
+        if options['base_url']:
+            if options['concurrency'] < 1:
+                raise CommandError("--concurrency must be at least 1.")
+            if not options['password']:
+                raise CommandError(f"--base-url needs --password for {BENCH_USERNAME}.")
+            skipped = [route.name for route in routes if route.staff]
+            if skipped:
+                self.stderr.write(f"Skipping staff-only routes: {', '.join(skipped)}")
+            routes = [route for route in routes if not route.staff]
+            results = self.run(HttpTransport(options['base_url']), routes, options['password'], options)
+        else:
+            cache_settings = {} if options['cache'] else {'RESPONSE_CACHE_TIMEOUT': 0}
+            options['concurrency'] = 1
+            # Uploaded images go to a scratch directory, gone with the run's data.
+            media = tempfile.TemporaryDirectory()
+            storages = {**settings.STORAGES, 'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'}}
+            with media, override_settings(
+                ALLOWED_HOSTS=['testserver'], STORAGES=storages, MEDIA_ROOT=media.name, **cache_settings,
+            ), transaction.atomic():
+                # A throwaway password: the reader and staff user only log in within this transaction.
+                password = secrets.token_urlsafe(16)
+                if options['no_seed']:
+                    User.objects.filter(username=BENCH_USERNAME).update(password=make_password(password))
+                else:
+                    if User.objects.filter(username=BENCH_USERNAME).exists():
+                        raise CommandError(f"{BENCH_USERNAME} already exists; pass --no-seed to use that data.")
+                    seed_dataset(
+                        options['users'], options['recipes'], options['categories'], seed=options['seed'],
+                        password=password,
+                    )
+                User.objects.update_or_create(
+                    username=STAFF_USERNAME, defaults={'is_staff': True, 'password': make_password(password)},
+                )
+                results = self.run(ClientTransport(), routes, password, options)
+                transaction.set_rollback(True)
+
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({
+                    'target': options['base_url'] or 'test client',
+                    'dataset': 'existing' if options['base_url'] or options['no_seed'] else {
+                        name: options[name] for name in ('users', 'recipes', 'categories', 'seed')
+                    },
+                    'requests': options['requests'],
+                    'concurrency': options['concurrency'],
+                    'routes': results,
+                }, output, indent=2)
+
+    def run(self, transport, routes, password, options):
+        values = {**targets(), 'password': password}
+        results = []
+        for route in routes:
+            # A fresh token per route, so long runs never use an expired one.
+            tokens = obtain_tokens(transport, STAFF_USERNAME if route.staff else BENCH_USERNAME, password)
+            values['refresh'] = tokens['refresh']
+            headers = {'Authorization': f"Bearer {tokens['access']}"} if route.auth else {}
+            path = route.path.format(**values)
+            body = route.body(values) if route.body else None
+            if body is not None and not isinstance(body, (str, bytes)):
+                body = json.dumps(body)
+
+            def call(_):
+                return transport.request(route.method, path, body, route.content_type, headers)
+
+            for _ in range(options['warmup']):
+                call(None)
+            start = time.perf_counter()
+            if options['concurrency'] > 1:
+                with ThreadPoolExecutor(options['concurrency']) as pool:
+                    responses = list(pool.map(call, range(options['requests'])))
+            else:
+                responses = [call(None) for _ in range(options['requests'])]
+            elapsed = time.perf_counter() - start
+            results.append(summarize(
+                route,
+                [seconds * 1000 for _, _, _, seconds in responses],
+                [queries_from(timing) for _, timing, _, _ in responses],
+                Counter(status for status, _, _, _ in responses),
+                elapsed,
+            ))
+        return results
+
+    def report(self, results):
+        self.stdout.write(
+            f"{'route':<24}{'method':<8}{'status':<12}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'queries':>9}{'req/s':>9}"
+        )
+        for result in results:
+            statuses = ','.join(result['statuses'])
+            line = (
+                f"{result['name']:<24}{result['method']:<8}{statuses:<12}{result['p50_ms']:>9.2f}"
+                f"{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+                f"{'-' if result['queries'] is None else result['queries']:>9}{result['throughput_rps']:>9}"
+            )
+            failed = any(not code.startswith(('2', '3')) for code in result['statuses'])
+            self.stdout.write(self.style.ERROR(line) if failed else line)
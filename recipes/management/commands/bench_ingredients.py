@@ -0,0 +1,51 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes import ingredients
+from recipes.seeding import seed_users, seed_categories, seed_recipes
+
+QUERIES = [
+    (['chicken', 'rice'], ['nuts']),
+    (['garlic', 'tomato', 'basil'], []),
+    (['salmon'], ['dairy']),
+    (['tofu', 'ginger', 'soy sauce'], ['peanuts']),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed and index recipes inside a rolled-back transaction and time "
+        "include/exclude ingredient queries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            authors = seed_users(20, prefix='bench_ingredients')
+            categories = seed_categories(10, prefix='Bench')
+            seed_recipes(options['recipes'], authors, categories)
+            ingredients.index_all()
+
+            self.stdout.write(f"{'include':<30}{'exclude':<12}{'any ms':>10}{'all ms':>10}")
+            for include, exclude in QUERIES:
+                any_ms = self.median_ms(lambda: ingredients.recipes_with(include, exclude), options['repeat'])
+                all_ms = self.median_ms(
+                    lambda: ingredients.recipes_with(include, exclude, match_all=True), options['repeat'],
+                )
+                self.stdout.write(f"{','.join(include):<30}{','.join(exclude):<12}{any_ms:>10.3f}{all_ms:>10.3f}")
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def median_ms(func, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
@@ -0,0 +1,119 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from recipes import jobs
+from recipes.management.commands.bench_api import percentiles
+from recipes.models import Category, Following, Job
+from recipes.seeding import seed_categories, seed_users
+
+PREFIX = 'bench_jobs'
+
+
+@jobs.task
+def bench_job(ms=0):
+    if ms:
+        time.sleep(ms / 1000)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the job queue: recipe creation latency for an author with followers, "
+        "inline and queued, then how fast worker threads drain queued jobs at several "
+        "batch sizes. Works on committed rows (workers use their own connections), so "
+        "run it against a scratch database; its users and jobs are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--followers', type=int, default=1000)
+        parser.add_argument('--writes', type=int, default=50, help="Recipes created per mode.")
+        parser.add_argument('--jobs', type=int, default=2000, help="Jobs queued per drain run.")
+        parser.add_argument('--job-ms', type=float, default=0, help="Time each drained job sleeps.")
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+        parser.add_argument('--batch-size', type=int, nargs='+', default=[1, 10, 50])
+
+    def handle(self, *args, **options):
+        try:
+            self.bench_writes(options)
+            self.bench_drain(options)
+        finally:
+            Job.objects.filter(task=jobs.task_name(bench_job)).delete()
+            User.objects.filter(username__startswith=f'{PREFIX}_').delete()
+            Category.objects.filter(name__startswith=PREFIX).delete()
+
+    def bench_writes(self, options):
+        author, = seed_users(1, prefix=f'{PREFIX}_author')
+        followers = seed_users(options['followers'], prefix=f'{PREFIX}_follower')
+        Following.objects.bulk_create(Following(follower=user, following=author) for user in followers)
+        client = APIClient()
+        client.force_authenticate(author)
+        category, = seed_categories(1, prefix=PREFIX)
+        body = {
+            'title': 'Benchmark soup', 'description': 'd', 'ingredients': '1 onion', 'instructions': 's',
+            'category': category.pk,
+        }
+
+        self.stdout.write(f"Creating a recipe, author with {options['followers']} followers")
+        self.stdout.write(f"{'mode':<10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for mode, inline in (('inline', True), ('queued', False)):
+            samples = []
+            with override_settings(JOBS_INLINE=inline, ALLOWED_HOSTS=['testserver']):
+                for _ in range(options['writes']):
+                    start = time.perf_counter()
+                    response = client.post('/api/recipes/', body, format='json')
+                    samples.append((time.perf_counter() - start) * 1000)
+                    if response.status_code != 201:
+                        raise CommandError(f"Creating a recipe answered {response.status_code}: {response.content!r}")
+            result = percentiles(samples)
+            self.stdout.write(f"{mode:<10}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}")
+
+        start = time.perf_counter()
+        ran = self.drain(1, None)
+        self.stdout.write(f"Ran the {ran} queued jobs in {time.perf_counter() - start:.2f} s\n")
+
+    def bench_drain(self, options):
+        count = options['jobs']
+        with override_settings(JOBS_INLINE=False):
+            start = time.perf_counter()
+            for _ in range(count):
+                jobs.enqueue(bench_job, ms=options['job_ms'])
+            enqueued = count / (time.perf_counter() - start)
+        Job.objects.filter(task=jobs.task_name(bench_job)).delete()
+        self.stdout.write(f"Enqueued {enqueued:.0f} jobs/s (one INSERT each)")
+
+        self.stdout.write(f"{'workers':>8}{'batch':>7}{'jobs/s':>10}{'failed':>8}")
+        for workers in options['workers']:
+            for size in options['batch_size']:
+                Job.objects.bulk_create(
+                    Job(task=jobs.task_name(bench_job), payload={'ms': options['job_ms']}) for _ in range(count)
+                )
+                start = time.perf_counter()
+                ran = self.drain(workers, size)
+                rate = ran / (time.perf_counter() - start)
+                failed = Job.objects.filter(task=jobs.task_name(bench_job)).count()
+                Job.objects.filter(task=jobs.task_name(bench_job)).delete()
+                self.stdout.write(f"{workers:>8}{size:>7}{rate:>10.0f}{failed:>8}")
+
+    @staticmethod
+    def drain(workers, size):
+        """
+        Run jobs on `workers` threads until none is due; returns how many succeeded.
+        """
+        def work(_):
+            done = 0
+            try:
+                while True:
+                    succeeded, failed = jobs.work(size)
+                    if not succeeded + failed:
+                        return done
+                    done += succeeded
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(workers) as pool:
+            return sum(pool.map(work, range(workers)))
@@ -0,0 +1,99 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory
+
+from recipes.models import Recipe
+from recipes.pagination import RecipeCursorPagination
+from recipes.seeding import seed_users, seed_categories, seed_recipes
+from recipes.views import RecipeListCreateView
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed recipes inside a rolled-back transaction and compare the latency "
+        "of keyset pages against OFFSET pages on /api/recipes/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--authors', type=int, default=5)
+        parser.add_argument('--categories', type=int, default=5)
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--pages', default='1,10,100,1000,10000')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        pages = [int(page) for page in options['pages'].split(',')]
+        with override_settings(ALLOWED_HOSTS=['testserver'], RESPONSE_CACHE_TIMEOUT=0), transaction.atomic():
+            authors = seed_users(options['authors'], prefix='bench_author')
+            categories = seed_categories(options['categories'], prefix='Bench')
+            seed_recipes(options['recipes'], authors, categories)
+
+            modes = [
+                ('all', {}),
+                ('author', {'author': authors[0].username}),
+                ('category', {'category': categories[0].pk}),
+            ]
+            self.stdout.write(
+                f"{'filter':<10}{'page':>8}{'endpoint ms':>13}{'keyset ms':>12}{'offset ms':>12}"
+            )
+            for mode, params in modes:
+                for page in pages:
+                    result = self.measure(params, page, options['page_size'], options['repeat'])
+                    if result is None:
+                        continue
+                    endpoint_ms, keyset_ms, offset_ms = result
+                    self.stdout.write(
+                        f"{mode:<10}{page:>8}{endpoint_ms:>13.3f}{keyset_ms:>12.3f}{offset_ms:>12.3f}"
+                    )
+            transaction.set_rollback(True)
+
+    def measure(self, params, page, page_size, repeat):
+        queryset = Recipe.objects.order_by('-created_at', '-id')
+        if 'author' in params:
+            queryset = queryset.filter(author__username=params['author'])
+        if 'category' in params:
+            queryset = queryset.filter(category_id=params['category'])
+
+        offset = (page - 1) * page_size
+        query = dict(params, page_size=page_size)
+        paginator = RecipeCursorPagination()
+        keyset = queryset
+        if offset:
+            previous = queryset.values('created_at', 'id')[offset - 1:offset]
+            if not previous:
+                return None
+            position = paginator.get_position(previous[0])
+            query['cursor'] = paginator.encode_cursor(position)
+            keyset = queryset.filter(paginator.build_keyset_filter(position))
+
+        factory = APIRequestFactory()
+        view = RecipeListCreateView.as_view()
+
+        def keyset_page():
+            view(factory.get('/api/recipes/', query)).render()
+
+        def keyset_query():
+            list(keyset.select_related('category')[:page_size + 1])
+
+        def offset_query():
+            list(queryset.select_related('category')[offset:offset + page_size])
+
+        return (
+            self.median_ms(keyset_page, repeat),
+            self.median_ms(keyset_query, repeat),
+            self.median_ms(offset_query, repeat),
+        )
+
+    @staticmethod
+    def median_ms(func, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
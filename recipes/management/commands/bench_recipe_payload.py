@@ -0,0 +1,74 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory
+
+from recipes.models import Recipe
+from recipes.seeding import seed_users, seed_categories, seed_recipes
+from recipes.serializers import RecipeSerializer, RecipeListSerializer
+from recipes.views import RecipeListCreateView
+
+FULL_FIELDS = ','.join(RecipeSerializer.selected_fields(None))
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed recipes inside a rolled-back transaction and compare payload size, "
+        "serialization time and request time of full and compact /api/recipes/ lists."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=20_000)
+        parser.add_argument('--page-sizes', default='20,100')
+        parser.add_argument('--list-rows', type=int, default=5000,
+                            help="Rows serialized for the unpaginated comparison.")
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        with override_settings(ALLOWED_HOSTS=['testserver'], RESPONSE_CACHE_TIMEOUT=0), transaction.atomic():
+            authors = seed_users(20, prefix='bench_payload')
+            categories = seed_categories(10, prefix='Bench')
+            seed_recipes(options['recipes'], authors, categories)
+
+            self.stdout.write(f"{'request':<28}{'bytes':>12}{'full bytes':>12}{'ms':>10}{'full ms':>10}")
+            for page_size in [int(size) for size in options['page_sizes'].split(',')]:
+                compact = {'page_size': page_size}
+                full = dict(compact, fields=FULL_FIELDS)
+                compact_bytes, compact_ms = self.measure_request(compact, repeat)
+                full_bytes, full_ms = self.measure_request(full, repeat)
+                self.stdout.write(
+                    f"{f'page_size={page_size}':<28}{compact_bytes:>12}{full_bytes:>12}"
+                    f"{compact_ms:>10.3f}{full_ms:>10.3f}"
+                )
+
+            rows = options['list_rows']
+            recipes = Recipe.objects.select_related('author', 'category').order_by('-created_at', '-id')
+            compact_qs = recipes.only(*RecipeListSerializer.model_fields(RecipeListSerializer.default_fields))
+            full_ms = self.median_ms(lambda: RecipeSerializer(list(recipes[:rows]), many=True).data, repeat)
+            compact_ms = self.median_ms(
+                lambda: RecipeListSerializer(list(compact_qs[:rows]), many=True).data, repeat
+            )
+            self.stdout.write(
+                f"\nfetch + serialize {rows} rows: compact {compact_ms:.3f} ms, full {full_ms:.3f} ms "
+                f"({100 * (1 - compact_ms / full_ms):.0f}% less)"
+            )
+            transaction.set_rollback(True)
+
+    def measure_request(self, query, repeat):
+        factory = APIRequestFactory()
+        view = RecipeListCreateView.as_view()
+        size = len(view(factory.get('/api/recipes/', query)).render().content)
+        return size, self.median_ms(lambda: view(factory.get('/api/recipes/', query)).render(), repeat)
+
+    @staticmethod
+    def median_ms(func, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
@@ -0,0 +1,64 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from recipes import search
+from recipes.models import Recipe
+from recipes.seeding import seed_users, seed_categories, seed_recipes
+
+QUERIES = ['chicken', 'coconut curry', 'zest', 'walnuts tart', 'spicy salmon bowl', 'nothingmatches']
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed recipes inside a rolled-back transaction and compare ranked "
+        "full-text search against icontains scans."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        limit, repeat = options['limit'], options['repeat']
+        with transaction.atomic():
+            authors = seed_users(20, prefix='bench_search')
+            categories = seed_categories(10, prefix='Bench')
+            seed_recipes(options['recipes'], authors, categories)
+
+            self.stdout.write(f"search backend: {search.backend()}")
+            self.stdout.write(
+                f"{'query':<22}{'search ms':>12}{'icontains ms':>15}{'icontains all ms':>18}{'matches':>9}"
+            )
+            for query in QUERIES:
+                search_ms = self.median_ms(lambda: search.ranked_ids(query, limit), repeat)
+                scan_ms = self.median_ms(lambda: list(self.icontains(query)[:limit]), repeat)
+                full_scan_ms = self.median_ms(lambda: self.icontains(query).count(), repeat)
+                matches = self.icontains(query).count()
+                self.stdout.write(
+                    f"{query:<22}{search_ms:>12.3f}{scan_ms:>15.3f}{full_scan_ms:>18.3f}{matches:>9}"
+                )
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def icontains(query):
+        """
+        The unranked scan clients effectively do today, newest first.
+        """
+        condition = Q()
+        for term in search.search_terms(query):
+            condition &= Q(title__icontains=term) | Q(ingredients__icontains=term) | Q(description__icontains=term)
+        return Recipe.objects.filter(condition).order_by('-created_at', '-id').values_list('id', flat=True)
+
+    @staticmethod
+    def median_ms(func, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
@@ -0,0 +1,78 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from recipes.fastpath import RecipeRows
+from recipes.models import Recipe
+from recipes.renderers import FastJSONRenderer
+from recipes.seeding import seed_users, seed_categories, seed_recipes
+from recipes.serializers import RecipeListSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed recipes inside a rolled-back transaction and compare the DRF serializer "
+        "and JSONRenderer with the values() fast path and orjson renderer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        context = {'request': request}
+        with override_settings(ALLOWED_HOSTS=['testserver']), transaction.atomic():
+            authors = seed_users(20, prefix='bench_serialization')
+            categories = seed_categories(10, prefix='Bench')
+            seed_recipes(rows, authors, categories)
+
+            queryset = Recipe.objects.select_related('author', 'category').order_by('-created_at', '-id')
+            compact_qs = queryset.only(*RecipeListSerializer.model_fields(RecipeListSerializer.default_fields))
+            fast = RecipeRows(RecipeListSerializer, request)
+            instances = list(compact_qs[:rows])
+            values = list(fast.values(queryset)[:rows])
+
+            drf_data = RecipeListSerializer(instances, many=True, context=context).data
+            fast_data = fast.serialize(values)
+            if JSONRenderer().render(drf_data) != FastJSONRenderer().render(fast_data):
+                self.stderr.write("Fast path output differs from the serializer.")
+
+            results = [
+                ('fetch + serialize + render', (
+                    lambda: JSONRenderer().render(
+                        RecipeListSerializer(list(compact_qs[:rows]), many=True, context=context).data
+                    ),
+                    lambda: FastJSONRenderer().render(fast.serialize(fast.values(queryset)[:rows])),
+                )),
+                ('serialize', (
+                    lambda: RecipeListSerializer(instances, many=True, context=context).data,
+                    lambda: fast.serialize(values),
+                )),
+                ('render', (
+                    lambda: JSONRenderer().render(drf_data),
+                    lambda: FastJSONRenderer().render(fast_data),
+                )),
+            ]
+            self.stdout.write(f"{rows} rows, median of {repeat}")
+            self.stdout.write(f"{'step':<30}{'drf ms':>10}{'fast ms':>10}{'speedup':>10}")
+            for name, (drf, fast_func) in results:
+                drf_ms, fast_ms = self.median_ms(drf, repeat), self.median_ms(fast_func, repeat)
+                self.stdout.write(f"{name:<30}{drf_ms:>10.3f}{fast_ms:>10.3f}{drf_ms / fast_ms:>9.1f}x")
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def median_ms(func, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
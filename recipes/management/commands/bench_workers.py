@@ -0,0 +1,158 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.management.commands.bench_api import ROUTES, HttpTransport, obtain_tokens, percentiles, targets
+from recipes.seeding import BENCH_USERNAME
+
+SERVERS = {
+    'wsgi': ['drf_api.wsgi'],
+    'asgi': ['drf_api.asgi', '--worker-class', 'uvicorn_worker.UvicornWorker'],
+}
+DEFAULT_ROUTES = ['user-feed', 'recipe-list-create', 'recipe-detail', 'category-list', 'check-follow-status']
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the WSGI (sync gunicorn workers) and ASGI (uvicorn workers) deployments "
+        "at the same worker count: throughput and latency of a mix of read endpoints at "
+        "rising concurrency. Needs a database filled by seed_data and the reader's password."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--password', required=True, help=f"Password of {BENCH_USERNAME}, as printed by seed_data.")
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+        parser.add_argument('--requests', type=int, default=200, help="Requests per concurrency level.")
+        parser.add_argument(
+            '--query-delay-ms', type=float, default=0,
+            help="Sleep this long before every query in the workers, as a remote database would.",
+        )
+        parser.add_argument('--route', action='append', help="URL names to request (default: the main reads).")
+        parser.add_argument('--server', choices=sorted(SERVERS), action='append', help="Only run these servers.")
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        names = options['route'] or DEFAULT_ROUTES
+        routes = [route for route in ROUTES if route.method == 'GET' and not route.staff and route.name in names]
+        if not routes:
+            raise CommandError(f"No GET routes named {', '.join(names)}.")
+        values = targets()
+        base_url = f"http://127.0.0.1:{options['port']}"
+
+        self.stdout.write(
+            f"{'server':<8}{'workers':>8}{'concurrency':>13}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}"
+            f"{'p99 ms':>9}  statuses"
+        )
+        results = []
+        for server in options['server'] or list(SERVERS):
+            with self.serve(server, options):
+                transport = HttpTransport(base_url)
+                headers = {'Authorization': f"Bearer {obtain_tokens(transport, BENCH_USERNAME, options['password'])['access']}"}
+                requests = [(route, route.path.format(**values)) for route in routes]
+                for concurrency in options['concurrency']:
+                    results.append({
+                        'server': server,
+                        'workers': options['workers'],
+                        'concurrency': concurrency,
+                        **self.load(transport, requests, headers, concurrency, options['requests']),
+                    })
+                    self.report(results[-1])
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({
+                    'routes': [route.name for route in routes],
+                    'query_delay_ms': options['query_delay_ms'],
+                    'results': results,
+                }, output, indent=2)
+
+    def serve(self, server, options):
+        command = [
+            sys.executable, '-m', 'gunicorn', *SERVERS[server],
+            '--workers', str(options['workers']),
+            '--bind', f"127.0.0.1:{options['port']}",
+            '--config', 'python:recipes.management.commands._gunicorn_bench',
+            '--log-level', 'warning',
+        ]
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'drf_api.settings'),
+            'BENCH_QUERY_DELAY_MS': str(options['query_delay_ms']),
+        }
+        return Server(command, env, options['port'], cwd=settings.BASE_DIR)
+
+    def load(self, transport, requests, headers, concurrency, count):
+        """
+        `count` requests cycling through `requests`, `concurrency` at a time.
+        """
+        def call(item):
+            route, path = item
+            status, _, _, seconds = transport.request(route.method, path, None, route.content_type, headers)
+            return status, seconds * 1000
+
+        for item in requests:  # warm up every route once
+            call(item)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            responses = list(pool.map(call, islice(cycle(requests), count)))
+        elapsed = time.perf_counter() - start
+        return {
+            'requests': count,
+            'statuses': {str(code): n for code, n in sorted(Counter(status for status, _ in responses).items())},
+            **percentiles([ms for _, ms in responses]),
+            'throughput_rps': round(count / elapsed, 1),
+        }
+
+    def report(self, result):
+        line = (
+            f"{result['server']:<8}{result['workers']:>8}{result['concurrency']:>13}{result['throughput_rps']:>9}"
+            f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}  "
+            f"{','.join(result['statuses'])}"
+        )
+        failed = any(not code.startswith('2') for code in result['statuses'])
+        self.stdout.write(self.style.ERROR(line) if failed else line)
+
+
+class Server:
+    """
+    A gunicorn process for the duration of a `with` block.
+    """
+    def __init__(self, command, env, port, cwd, timeout=30):
+        self.command = command
+        self.env = env
+        self.port = port
+        self.cwd = cwd
+        self.timeout = timeout
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.command, env=self.env, cwd=self.cwd)
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError(f"{' '.join(self.command)} exited with {self.process.returncode}.")
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                return self
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__()
+        raise CommandError(f"Server did not start listening on port {self.port}.")
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from recipes import suggestions
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute friend-of-friend follow suggestions from the follow graph "
+        "and store each user's top suggestions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=suggestions.TOP_K)
+        parser.add_argument('--batch-size', type=int, default=suggestions.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        users, written = suggestions.compute_suggestions(
+            top_k=options['top_k'], batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Stored {written} suggestions for {users} users."))
@@ -0,0 +1,126 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe, Category, Following
+from recipes.seeding import seed_users, seed_categories, seed_recipes
+
+ENDPOINTS = [
+    '/api/recipes/',
+    '/api/recipes/?page_size=20',
+    '/api/recipes/?page_size=20&cursor={cursor}',
+    '/api/recipes/?page_size=20&author={author}',
+    '/api/recipes/?page_size=20&category={category}',
+    '/api/my_recipes/?page_size=20',
+    '/api/recipes/{recipe}/',
+    '/api/recipes/trending/',
+    '/api/recipes/trending/?category={category}',
+    '/api/categories/',
+    '/api/categories/{category}/',
+    '/api/users/',
+    '/api/users/?page_size=20',
+    '/api/users/?q={author}&fields=id,username',
+    '/api/users/{author_id}/is-following/',
+    '/api/feed/',
+    '/api/feed/?page_size=20&cursor={feed_cursor}',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Run every read endpoint once and print the database's EXPLAIN plan "
+        "for each query it issues (SQLite or PostgreSQL)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Username to authenticate as (default: first user).")
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help="Seed this many recipes first, inside a transaction that is rolled back.",
+        )
+        parser.add_argument('--analyze', action='store_true', help="Use EXPLAIN ANALYZE on PostgreSQL.")
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f"Unsupported database vendor: {connection.vendor}")
+
+        with override_settings(ALLOWED_HOSTS=['testserver'], RESPONSE_CACHE_TIMEOUT=0), transaction.atomic():
+            reader = self.seed(options['seed']) if options['seed'] else None
+            user = self.get_user(options['user']) if options['user'] or not reader else reader
+            client = APIClient()
+            client.force_authenticate(user)
+            for url in self.resolve(ENDPOINTS, user, client):
+                self.explain_endpoint(client, url, options['analyze'])
+            transaction.set_rollback(True)
+
+    def seed(self, count):
+        authors = seed_users(max(count // 50, 2), prefix='explain_author')
+        categories = seed_categories(10, prefix='Explain')
+        seed_recipes(count, authors, categories)
+        Recipe.objects.filter(id__in=Recipe.objects.order_by('-id').values('id')[:count // 10]).update(
+            trending_score=F('id'),
+        )
+        Following.objects.bulk_create(
+            [Following(follower=authors[0], following=author) for author in authors[1:]],
+            ignore_conflicts=True,
+        )
+        call_command('backfill_feed', stdout=StringIO())
+        return authors[0]
+
+    def get_user(self, username):
+        queryset = User.objects.order_by('id')
+        user = queryset.filter(username=username).first() if username else queryset.first()
+        if user is None:
+            raise CommandError("No user to run the endpoints as; pass --seed or --user.")
+        return user
+
+    def resolve(self, urls, user, client):
+        recipe = Recipe.objects.select_related('author').order_by('-created_at', '-id').first()
+        values = {
+            'recipe': recipe.pk if recipe else 0,
+            'author': recipe.author.username if recipe else user.username,
+            'author_id': recipe.author_id if recipe else user.pk,
+            'category': Category.objects.values_list('pk', flat=True).first() or 0,
+            'cursor': self.next_cursor(client, '/api/recipes/?page_size=1'),
+            'feed_cursor': self.next_cursor(client, '/api/feed/?page_size=1'),
+        }
+        for url in urls:
+            if '{cursor}' in url and not values['cursor'] or '{feed_cursor}' in url and not values['feed_cursor']:
+                continue
+            yield url.format(**values)
+
+    def next_cursor(self, client, url):
+        next_url = client.get(url).data.get('next')
+        return next_url.split('cursor=')[1].split('&')[0] if next_url else None
+
+    def explain_endpoint(self, client, url, analyze):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.stdout.write(self.style.MIGRATE_HEADING(f"GET {url} -> {response.status_code}"))
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            self.stdout.write(f"  {sql}")
+            for line in self.explain(sql, analyze):
+                self.stdout.write(f"    {line}")
+        self.stdout.write('')
+
+    def explain(self, sql, analyze):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                depth = {0: 0}
+                for node_id, parent, _, detail in cursor.fetchall():
+                    depth[node_id] = depth.get(parent, 0) + 1
+                    yield '  ' * (depth[node_id] - 1) + detail
+            else:
+                cursor.execute(f"EXPLAIN {'ANALYZE ' if analyze else ''}{sql}")
+                for (line,) in cursor.fetchall():
+                    yield line
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from recipes import images
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        "Make the resized variants of recipe images that have none, e.g. resizes lost "
+        "when a worker process exited; --all remakes every image's variants."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help="Remake existing variants too (after changing RECIPE_IMAGE_WIDTHS).",
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        made = failed = 0
+        for recipe_id in recipes.order_by('id').values_list('id', flat=True).iterator():
+            try:
+                made += images.generate(recipe_id) is not None
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Recipe {recipe_id}: {e}")
+        self.stdout.write(self.style.SUCCESS(f"Made variants for {made} images ({failed} failed)."))
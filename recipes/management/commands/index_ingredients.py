@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from recipes import ingredients
+
+
+class Command(BaseCommand):
+    help = "Parse every recipe's ingredient text into the structured ingredient index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=ingredients.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        total = ingredients.index_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed ingredients of {total} recipes."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from recipes import engagement
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Recipe.trending_score from the time-decayed engagement buckets "
+        "and delete buckets older than the trending window."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=engagement.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        scored, updated = engagement.recompute_trending(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Scored {scored} recipes, updated {updated} trending scores."))
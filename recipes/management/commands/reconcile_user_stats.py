@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from recipes import stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount followers, follows and recipes per user in batched aggregate "
+        "queries and repair drifted or missing UserStats rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=stats.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        checked, fixed = stats.reconcile(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} users, fixed {fixed} stats rows."))
@@ -0,0 +1,42 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from recipes import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs (feed fan-out, ingredient index) from the job table until "
+        "stopped; SIGTERM or Ctrl-C stops after the current batch. Run as many as needed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help="Jobs claimed at a time (default: JOBS_BATCH_SIZE).")
+        parser.add_argument('--sleep', type=float, default=1.0, help="Seconds to wait when no job is due.")
+        parser.add_argument('--burst', action='store_true', help="Exit once no job is due.")
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        handlers = {signum: signal.signal(signum, self.stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+        succeeded = failed = 0
+        try:
+            while not self.stopping:
+                close_old_connections()
+                done, errors = jobs.work(options['batch_size'])
+                succeeded += done
+                failed += errors
+                if not done + errors:
+                    if options['burst']:
+                        break
+                    time.sleep(options['sleep'])
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+            close_old_connections()
+        self.stdout.write(f"Ran {succeeded + failed} jobs ({failed} failed).")
+
+    def stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,54 @@
+import secrets
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import FeedEntry, Following, Recipe
+from recipes.seeding import BENCH_USERNAME, seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a reproducible synthetic dataset (users on a power-law follow graph, "
+        "recipes, categories, engagement) for load tests and benchmarks. "
+        "The same options and --seed give the same data. Refuses to run without DEBUG "
+        "unless --force is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=20_000)
+        parser.add_argument('--categories', type=int, default=12)
+        parser.add_argument('--average-follows', type=int, default=20)
+        parser.add_argument(
+            '--celebrity-followers', type=int,
+            help="FEED_FANOUT_MAX_FOLLOWERS used to backfill feeds (default: 5%% of --users).",
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='seed', help="Username and category name prefix.")
+        parser.add_argument(
+            '--password', help=f"Password for {BENCH_USERNAME} (default: a random one, printed once).",
+        )
+        parser.add_argument('--force', action='store_true', help="Seed even though DEBUG is off.")
+
+    def handle(self, *args, **options):
+        if not (settings.DEBUG or options['force']):
+            raise CommandError("DEBUG is off, so this may be a production database; pass --force to seed it anyway.")
+        if User.objects.filter(username=BENCH_USERNAME).exists():
+            raise CommandError(f"{BENCH_USERNAME} already exists; this database has already been seeded.")
+        password = options['password'] or secrets.token_urlsafe(16)
+        start = time.perf_counter()
+        with transaction.atomic():
+            seed_dataset(
+                options['users'], options['recipes'], options['categories'],
+                average_follows=options['average_follows'], seed=options['seed'], prefix=options['prefix'],
+                celebrity_followers=options['celebrity_followers'], password=password,
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {options['users']} users, {Following.objects.count()} follows, "
+            f"{Recipe.objects.count()} recipes and {FeedEntry.objects.count()} feed entries "
+            f"in {time.perf_counter() - start:.1f} s. Log in as {BENCH_USERNAME} / {password}."
+        ))
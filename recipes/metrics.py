@@ -0,0 +1,157 @@
+"""
+In-process request metrics, exported in the Prometheus text format.
+
+`PerformanceMiddleware` (recipes/middleware.py) records one observation
+per request into the histograms below, labelled by URL name. Like the
+response cache counters, the numbers are per worker process: scrape
+every worker, or sum them in Prometheus.
+"""
+import threading
+import time
+from contextvars import ContextVar
+
+from . import cache
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram per label tuple, as Prometheus expects.
+    """
+    def __init__(self, name, help_text, buckets, labels=('view',)):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labels = labels
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for label_values, (counts, total, count) in sorted(self.series.items()):
+                labels = format_labels(self.labels, label_values)
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {bucket_count}')
+                lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+                lines.append(f'{self.name}_sum{{{labels}}} {total:.6f}')
+                lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+class Counter:
+    """
+    Monotonic counter per label tuple.
+    """
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self.lock:
+            for label_values, value in sorted(self.series.items()):
+                lines.append(f'{self.name}{{{format_labels(self.labels, label_values)}}} {value}')
+        return lines
+
+
+def format_labels(names, values):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+request_duration = Histogram(
+    'recipehub_request_duration_seconds', 'Time from request to rendered response.', LATENCY_BUCKETS,
+    labels=('view', 'method'),
+)
+db_duration = Histogram('recipehub_db_duration_seconds', 'SQL time per request.', LATENCY_BUCKETS)
+db_queries = Histogram('recipehub_db_queries', 'SQL queries per request.', QUERY_BUCKETS)
+serialize_duration = Histogram(
+    'recipehub_serialize_duration_seconds', 'Serializer time per request.', LATENCY_BUCKETS,
+)
+response_size = Histogram('recipehub_response_bytes', 'Response body size.', SIZE_BUCKETS)
+responses = Counter('recipehub_responses_total', 'Responses by status code.', ('view', 'status'))
+slow_queries = Counter('recipehub_slow_queries_total', 'Queries slower than SLOW_QUERY_MS.', ('view',))
+
+METRICS = (request_duration, db_duration, db_queries, serialize_duration, response_size, responses, slow_queries)
+
+
+def render():
+    """
+    Every metric, plus the response cache hit/miss counters, as
+    Prometheus text exposition (version 0.0.4).
+    """
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    cache_counts = Counter(
+        'recipehub_response_cache_lookups_total', 'Response cache lookups by result.', ('view', 'result'),
+    )
+    results = {'hits': 'hit', 'misses': 'miss'}
+    for key, value in cache.stats().items():
+        view, _, result = key.rpartition('.')
+        if view:
+            cache_counts.inc(view, results[result], amount=value)
+    lines += cache_counts.render()
+    return '\n'.join(lines) + '\n'
+
+
+# Per-request phase timings, set by the middleware for the current request.
+_phases = ContextVar('recipehub_phases', default=None)
+_active_phase = ContextVar('recipehub_active_phase', default=None)
+
+
+def start_request():
+    phases = {}
+    return phases, _phases.set(phases)
+
+
+def end_request(token):
+    _phases.reset(token)
+
+
+class phase:
+    """
+    Add the time spent in the block to the current request's `name`
+    phase. Nested blocks of the same phase are only counted once.
+    A class rather than @contextmanager: serializers enter it per item.
+    """
+    __slots__ = ('name', 'phases', 'token', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.phases = _phases.get()
+        if self.phases is None or _active_phase.get() == self.name:
+            self.phases = None
+            return
+        self.token = _active_phase.set(self.name)
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        if self.phases is not None:
+            self.phases[self.name] = self.phases.get(self.name, 0.0) + time.perf_counter() - self.start
+            _active_phase.reset(self.token)
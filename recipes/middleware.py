@@ -0,0 +1,166 @@
+"""
+Per-request performance instrumentation.
+
+`PerformanceMiddleware` times every request, counts and times its SQL
+through `connection.execute_wrapper`, and picks up the serializer and
+render phases recorded with `metrics.phase`. The breakdown is sent back
+in a `Server-Timing` header (shown in the browser's network panel),
+aggregated into the histograms served at `/api/_metrics`, and any query
+slower than `SLOW_QUERY_MS` is logged with the endpoint that ran it.
+
+Both middlewares here are async-capable, so under ASGI a request to an
+async view never leaves the event loop on their account.
+"""
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics
+
+logger = logging.getLogger('recipes.performance')
+
+
+def slow_query_ms():
+    return getattr(settings, 'SLOW_QUERY_MS', 200)
+
+
+class QueryRecorder:
+    """
+    `execute_wrapper` that counts queries and adds up their time.
+    """
+    def __init__(self, request):
+        self.request = request
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if elapsed * 1000 >= slow_query_ms():
+                view = view_name(self.request)
+                metrics.slow_queries.inc(view)
+                logger.warning(
+                    "Slow query (%.1f ms) in %s %s [%s]: %s",
+                    elapsed * 1000, self.request.method, self.request.path, view, sql,
+                )
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unmatched'
+
+
+def add_execute_wrapper(wrapper):
+    connection.execute_wrappers.append(wrapper)
+
+
+def remove_execute_wrapper(wrapper):
+    connection.execute_wrappers.remove(wrapper)
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        phases, token = metrics.start_request()
+        recorder = QueryRecorder(request)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(recorder):
+                response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        total = time.perf_counter() - start
+        self.record(request, response, recorder, phases, total)
+        response['Server-Timing'] = self.server_timing(recorder, phases, total)
+        return response
+
+    async def __acall__(self, request):
+        # The async ORM runs every query of a request on that request's
+        # thread (and connection), so the recorder is installed there.
+        phases, token = metrics.start_request()
+        recorder = QueryRecorder(request)
+        start = time.perf_counter()
+        await sync_to_async(add_execute_wrapper)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(remove_execute_wrapper)(recorder)
+            metrics.end_request(token)
+        total = time.perf_counter() - start
+        self.record(request, response, recorder, phases, total)
+        response['Server-Timing'] = self.server_timing(recorder, phases, total)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that too.
+        render = response.render
+
+        def timed_render():
+            with metrics.phase('render'):
+                return render()
+        response.render = timed_render
+        return response
+
+    def record(self, request, response, recorder, phases, total):
+        view = view_name(request)
+        metrics.request_duration.observe(total, view, request.method)
+        metrics.db_duration.observe(recorder.duration, view)
+        metrics.db_queries.observe(recorder.count, view)
+        metrics.serialize_duration.observe(phases.get('serialize', 0.0), view)
+        if not response.streaming:
+            metrics.response_size.observe(len(response.content), view)
+        metrics.responses.inc(view, response.status_code)
+
+    def server_timing(self, recorder, phases, total):
+        entries = [f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"']
+        entries += [f'{name};dur={duration * 1000:.1f}' for name, duration in sorted(phases.items())]
+        entries.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(entries)
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise, made async-capable: its middleware is sync-only, which
+    would make Django run everything below it in a thread under ASGI.
+    Looking a path up is a dict lookup, so only static file requests are
+    served synchronously.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from recipes import search
+
+
+def create_search_index(apps, schema_editor):
+    search.create_search_index(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    search.drop_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_following_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.3 on 2026-10-17 01:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from recipes import stats
+
+
+def count_existing_users(apps, schema_editor):
+    stats.reconcile(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('recipes', '0010_category_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('followers_count', models.IntegerField(default=0)),
+                ('following_count', models.IntegerField(default=0)),
+                ('recipes_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_existing_users, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.3 on 2026-10-17 01:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from recipes import search
+
+
+def reinstall_search_triggers(apps, schema_editor):
+    # Adding trending_score rebuilds recipes_recipe on SQLite, dropping its triggers.
+    search.install_sqlite_triggers(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_user_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeEngagement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('saves', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('trending_score__gt', 0)), fields=['-trending_score', '-id'], name='recipe_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('trending_score__gt', 0)), fields=['category', '-trending_score', '-id'], name='recipe_category_trending_idx'),
+        ),
+        migrations.AddField(
+            model_name='recipeengagement',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='engagement', to='recipes.recipe'),
+        ),
+        migrations.AddIndex(
+            model_name='recipeengagement',
+            index=models.Index(fields=['hour'], name='engagement_hour_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipeengagement',
+            constraint=models.UniqueConstraint(fields=('recipe', 'hour'), name='unique_recipe_engagement_hour'),
+        ),
+        migrations.RunPython(reinstall_search_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.3 on 2026-10-17 02:39
+
+import recipes.models
+from django.db import migrations, models
+
+from recipes import search
+
+
+def reinstall_search_triggers(apps, schema_editor):
+    # Adding the image columns rebuilds recipes_recipe on SQLite, dropping its triggers.
+    search.install_sqlite_triggers(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_follow_suggestions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(blank=True, default='', upload_to=recipes.models.recipe_image_path),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(reinstall_search_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,217 @@
+import hashlib
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.shortcuts import aget_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.functional import classproperty
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from . import cache
+
+
+def make_etag(*parts):
+    """
+    Strong ETag over the repr of the given validator parts.
+    """
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+def set_validator_headers(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+class AsyncDispatchMixin:
+    """
+    Let an APIView's handlers be coroutines (`async def get`), served
+    without a thread under ASGI.
+
+    Authentication, permissions and throttling (`initial`) may query the
+    database, so they run through `sync_to_async`, as do handlers that
+    are still synchronous (e.g. POST on a list/create view). Under WSGI
+    Django runs the whole view in a one-off event loop.
+    """
+    @classproperty
+    def view_is_async(cls):
+        return True
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def aget_object(self):
+        """
+        `GenericAPIView.get_object` with the async ORM.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = await aget_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+class CachedResponseMixin:
+    """
+    Serve GET responses from the versioned response cache.
+
+    The cached body is shared by every caller; `personalize` fills in the
+    per-user fields (`is_author`) on each request, which is a dict lookup
+    per item instead of a serializer pass. With `AsyncDispatchMixin` the
+    rest of the view is awaited and the cache is read off the event loop.
+    """
+    def get_cache_scopes(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        if self.view_is_async:
+            return self.aget_cached(request, *args, **kwargs)
+        if not cache.timeout():
+            return super().get(request, *args, **kwargs)
+        key, data = self.cached_data(request)
+        if data is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            data = response.data
+            cache.store(key, data)
+        return Response(self.personalize(data, request))
+
+    async def aget_cached(self, request, *args, **kwargs):
+        if not cache.timeout():
+            return await super().get(request, *args, **kwargs)
+        key, data = await sync_to_async(self.cached_data)(request)
+        if data is None:
+            response = await super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            data = response.data
+            await sync_to_async(cache.store)(key, data)
+        return Response(self.personalize(data, request))
+
+    def cached_data(self, request):
+        """
+        The response cache key for this request and the data stored under it, if any.
+        """
+        view_name = type(self).__name__
+        key = cache.response_key(view_name, request, self.get_cache_scopes())
+        return key, cache.lookup(key, view_name)
+
+    def personalize(self, data, request):
+        return data
+
+
+class ConditionalGetMixin:
+    """
+    Answer `If-None-Match` / `If-Modified-Since` before anything is
+    serialized.
+
+    `get_validators()` returns `(state, last_modified)` from a cheap
+    aggregate (row count, newest `updated_at`), or None when the object
+    does not exist. Validators are cached under the same version counters
+    as the response body, so a warm conditional GET runs no queries. The
+    user and full path are part of the tag because `is_author` and the
+    query string change the body. Async views implement
+    `aget_validators()` instead.
+    """
+    def get_validators(self):
+        raise NotImplementedError
+
+    async def aget_validators(self):
+        raise NotImplementedError
+
+    def current_validators(self):
+        if not cache.timeout():
+            return self.get_validators()
+        key = cache.response_key(f'etag:{type(self).__name__}', self.request, self.get_cache_scopes())
+        validators = cache.backend().get(key)
+        if validators is None:
+            validators = self.get_validators()
+            if validators is not None:
+                cache.store(key, validators)
+        return validators
+
+    def get_etag(self, state):
+        return make_etag(type(self).__name__, state, self.request.user.pk, self.request.get_full_path())
+
+    def check_preconditions(self, validators):
+        """
+        The 304/412 response the request's conditional headers call for, if any.
+        """
+        state, last_modified = validators
+        return get_conditional_response(
+            self.request, etag=self.get_etag(state),
+            last_modified=last_modified and int(last_modified.timestamp()),
+        )
+
+    async def acurrent_validators(self):
+        if not cache.timeout():
+            return await self.aget_validators()
+        # In a thread: the scopes may need a query (`cache.author_id`)
+        key = await sync_to_async(lambda: cache.response_key(
+            f'etag:{type(self).__name__}', self.request, self.get_cache_scopes(),
+        ))()
+        validators = await sync_to_async(cache.backend().get)(key)
+        if validators is None:
+            validators = await self.aget_validators()
+            if validators is not None:
+                await sync_to_async(cache.store)(key, validators)
+        return validators
+
+    def get(self, request, *args, **kwargs):
+        if self.view_is_async:
+            return self.aget_conditional(request, *args, **kwargs)
+        validators = self.current_validators()
+        if validators is None:
+            return super().get(request, *args, **kwargs)
+        response = self.check_preconditions(validators)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            set_validator_headers(response, self.get_etag(validators[0]), validators[1])
+        return response
+
+    async def aget_conditional(self, request, *args, **kwargs):
+        validators = await self.acurrent_validators()
+        if validators is None:
+            return await super().get(request, *args, **kwargs)
+        response = self.check_preconditions(validators)
+        if response is None:
+            response = await super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            set_validator_headers(response, self.get_etag(validators[0]), validators[1])
+        return response
+
+
+class RecipeOwnershipMixin:
+    """
+    Recompute `is_author` on cached recipe payloads for the current user.
+    """
+    def personalize(self, data, request):
+        username = request.user.username if request.user.is_authenticated else None
+        items = data.get('results', [data]) if isinstance(data, dict) else data
+        for item in items:
+            if 'is_author' in item:
+                item['is_author'] = username is not None and item.get('author') == username
+        return data
@@ -1,5 +1,14 @@
+import os
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+
+def recipe_image_path(instance, filename):
+    """ A fresh name per upload, so a replaced image is never served from a stale cache. """
+    return f'recipes/{instance.pk}/{uuid.uuid4().hex}{os.path.splitext(filename)[1].lower()}'
 
 
 class Recipe(models.Model):
@@ -13,12 +22,45 @@ class Recipe(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recipes')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # False for recipes by "celebrity" authors, which are pulled into
+    # feeds at read time instead of being copied into every follower's feed.
+    fanned_out = models.BooleanField(default=False)
+    # Time-decayed engagement, recomputed by `recompute_trending`.
+    trending_score = models.FloatField(default=0)
+    # The uploaded original; only the resized variants are ever served.
+    image = models.ImageField(upload_to=recipe_image_path, blank=True, default='')
+    # Thumbnails made by `recipes.images`: {"width", "height", "sources":
+    # {mime type: {width: storage name}}}, empty until they are ready.
+    image_variants = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        # One composite index per list filter, each ending in the
+        # (created_at, id) keyset used by cursor pagination.
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='recipe_created_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='recipe_author_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='recipe_category_created_idx'),
+            models.Index(
+                fields=['author', '-created_at', '-id'], name='recipe_feed_pull_idx',
+                condition=models.Q(fanned_out=False),
+            ),
+            # Trending lists only cover recipes with a score.
+            models.Index(
+                fields=['-trending_score', '-id'], name='recipe_trending_idx',
+                condition=models.Q(trending_score__gt=0),
+            ),
+            models.Index(
+                fields=['category', '-trending_score', '-id'], name='recipe_category_trending_idx',
+                condition=models.Q(trending_score__gt=0),
+            ),
+        ]
 
 
 class Category(models.Model):
     """ Defines categories for organizing recipes. """
     name = models.CharField(max_length=50)
     description = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -31,7 +73,127 @@ class Following(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ('follower', 'following')  # Ensures unique follow relationships
+        constraints = [
+            # Ensures unique follow relationships; also serves (follower, following) lookups
+            models.UniqueConstraint(fields=['follower', 'following'], name='unique_follow'),
+        ]
+        indexes = [
+            # The user's own follows, newest first (feed follow stream)
+            models.Index(fields=['follower', '-created_at', '-id'], name='follow_follower_created_idx'),
+            # Followers of an author, covering the fan-out read of follower ids
+            models.Index(fields=['following', 'follower'], name='follow_following_follower_idx'),
+        ]
 
     def __str__(self):
         return f"{self.follower.username} follows {self.following.username}"
+
+
+class FeedEntry(models.Model):
+    """ A recipe fanned out into one follower's materialized feed. """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed_entries')
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='feed_entries')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()  # Copied from the recipe so reads never join it for ordering
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'recipe'], name='unique_feed_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-recipe'], name='feed_owner_created_idx'),
+            models.Index(fields=['owner', 'author'], name='feed_owner_author_idx'),
+        ]
+
+
+class Ingredient(models.Model):
+    """ A normalized ingredient name shared across recipes. """
+    name = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class RecipeIngredient(models.Model):
+    """ One parsed ingredient line of a recipe; a posting in the ingredient index. """
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='recipe_ingredients')
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE, related_name='recipe_ingredients')
+    quantity = models.CharField(max_length=50, blank=True)
+
+    class Meta:
+        constraints = [
+            # Ingredient-first so the constraint doubles as the posting list
+            models.UniqueConstraint(fields=['ingredient', 'recipe'], name='unique_recipe_ingredient'),
+        ]
+
+
+class UserStats(models.Model):
+    """ Denormalized per-user counters, kept in step by `recipes/stats.py`. """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    followers_count = models.IntegerField(default=0)
+    following_count = models.IntegerField(default=0)
+    recipes_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Stats for {self.user.username}"
+
+
+class RecipeEngagement(models.Model):
+    """ Views and saves of a recipe within one hour, written in batches by `recipes/engagement.py`. """
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='engagement')
+    hour = models.DateTimeField()
+    views = models.PositiveIntegerField(default=0)
+    saves = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['recipe', 'hour'], name='unique_recipe_engagement_hour'),
+        ]
+        indexes = [
+            models.Index(fields=['hour'], name='engagement_hour_idx'),
+        ]
+
+
+class FollowSuggestion(models.Model):
+    """ A precomputed "people you may know" entry, written by `recipes/suggestions.py`. """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='follow_suggestions')
+    suggested = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    # People the user follows who follow `suggested`
+    mutual_count = models.PositiveIntegerField()
+    # Recipes `suggested` posted in the activity window
+    recent_recipes = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            # Also the index the endpoint reads a user's list in rank order from
+            models.UniqueConstraint(fields=['user', 'rank'], name='unique_follow_suggestion_rank'),
+        ]
+
+
+class Job(models.Model):
+    """ A queued call of a task registered in `recipes/jobs.py`, run by `manage.py run_worker`. """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (FAILED, 'Failed')]
+
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    # Random token of the claim a worker holds the job under
+    claimed_by = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Workers claim the oldest due jobs
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+            models.Index(fields=['claimed_by'], name='job_claimed_by_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} ({self.status})"
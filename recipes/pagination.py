@@ -0,0 +1,177 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor (keyset) pagination over a unique, deterministic ordering.
+
+    Instead of OFFSET scans, each page is fetched with a
+    `WHERE (ordering) < (last row)` predicate, so page 10,000 costs the same
+    as page one as long as an index backs the ordering.
+    Pagination is opt-in: it only kicks in when the client sends a
+    `cursor` or `page_size` query parameter, otherwise the view falls back
+    to its plain list response.
+    """
+    ordering = ('-id',)
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def is_requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        `paginate_queryset` for async views.
+        """
+        if not self.is_requested(request):
+            return None
+        return self.set_page([row async for row in self.page_queryset(queryset, request)])
+
+    def page_queryset(self, queryset, request):
+        """
+        The requested page plus one row, to tell whether a next page exists.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.build_keyset_filter(position))
+        return queryset.order_by(*self.ordering)[:self.page_size + 1]
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        cursor = self.encode_cursor(self.get_position(self.page[-1]))
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_position(self, row):
+        """
+        Return the ordering values of a row (model instance or dict).
+        """
+        names = [field.lstrip('-') for field in self.ordering]
+        if isinstance(row, dict):
+            return [row[name] for name in names]
+        return [getattr(row, name) for name in names]
+
+    def build_keyset_filter(self, position):
+        """
+        Build `(f1, f2, ...) < (v1, v2, ...)` for the configured ordering.
+
+        Written as `f1 <= v1 AND (f1 < v1 OR (f2, ...) < (v2, ...))` so the
+        leading column is always a plain range predicate the index can use.
+        """
+        condition = None
+        for field, value in reversed(list(zip(self.ordering, position))):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            strict = Q(**{f'{name}__{lookup}': value})
+            if condition is None:
+                condition = strict
+            else:
+                condition = Q(**{f'{name}__{lookup}e': value}) & (strict | condition)
+        return condition
+
+    def encode_cursor(self, position):
+        values = [value.isoformat() if hasattr(value, 'isoformat') else value
+                  for value in position]
+        raw = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                self.model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class RecipeCursorPagination(KeysetPagination):
+    """
+    Newest-first recipe pages, tie-broken on id so the order is total.
+    Backed by the `(…, created_at, id)` composite indexes on `Recipe`.
+    """
+    ordering = ('-created_at', '-id')
+
+
+class TrendingCursorPagination(KeysetPagination):
+    """
+    Highest `trending_score` first, backed by the partial
+    `(…, trending_score, id)` indexes. Trending lists always page.
+    """
+    ordering = ('-trending_score', '-id')
+
+    def is_requested(self, request):
+        return True
+
+
+class UsernameCursorPagination(KeysetPagination):
+    """
+    Users in username order, backed by the unique index on `username`.
+    A `q` search always pages, so autocomplete never lists every match.
+    """
+    ordering = ('username',)
+
+    def is_requested(self, request):
+        return 'q' in request.query_params or super().is_requested(request)
@@ -0,0 +1,34 @@
+"""
+JSON renderer that uses orjson when it is installed.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Same bytes as `JSONRenderer` for its default compact UTF-8 output,
+    encoded by orjson. Types orjson would format differently (datetimes,
+    Decimals, lazy strings, ...) go through DRF's encoder via `default`;
+    indented output (the browsable API), ASCII-only settings, a missing
+    orjson or anything it rejects fall back to the stdlib renderer.
+    """
+    options = orjson and (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or not self.compact or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=JSONEncoder().default, option=self.options)
+        except (TypeError, ValueError):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Like JSONRenderer, escape the separators JavaScript treats as newlines.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
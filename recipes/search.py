@@ -0,0 +1,166 @@
+"""
+Ranked full-text recipe search.
+
+PostgreSQL uses a GIN index over a weighted tsvector expression; SQLite
+uses an external-content FTS5 table kept in sync by triggers. Both weight
+matches in the title above ingredients above description, and treat each
+search term as a prefix. Other databases (or SQLite without FTS5) fall
+back to unranked `icontains` scans.
+"""
+import re
+from functools import lru_cache
+
+from django.db import connection, connections
+from django.db.models import Q
+from django.db.utils import OperationalError
+
+from .models import Recipe
+
+FTS_TABLE = 'recipes_recipe_fts'
+
+POSTGRES_VECTOR = """(
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(ingredients, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'C')
+)"""
+
+SQLITE_TRIGGERS = {
+    'recipes_recipe_fts_insert': """
+        CREATE TRIGGER recipes_recipe_fts_insert AFTER INSERT ON recipes_recipe BEGIN
+            INSERT INTO recipes_recipe_fts(rowid, title, ingredients, description)
+            VALUES (new.id, new.title, new.ingredients, new.description);
+        END
+    """,
+    'recipes_recipe_fts_delete': """
+        CREATE TRIGGER recipes_recipe_fts_delete AFTER DELETE ON recipes_recipe BEGIN
+            INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, title, ingredients, description)
+            VALUES ('delete', old.id, old.title, old.ingredients, old.description);
+        END
+    """,
+    'recipes_recipe_fts_update': """
+        CREATE TRIGGER recipes_recipe_fts_update AFTER UPDATE OF title, ingredients, description
+        ON recipes_recipe BEGIN
+            INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, title, ingredients, description)
+            VALUES ('delete', old.id, old.title, old.ingredients, old.description);
+            INSERT INTO recipes_recipe_fts(rowid, title, ingredients, description)
+            VALUES (new.id, new.title, new.ingredients, new.description);
+        END
+    """,
+}
+
+# (title, ingredients, description) column weights for bm25()
+SQLITE_WEIGHTS = (10.0, 4.0, 1.0)
+
+
+def create_search_index(schema_editor):
+    has_fts_table.cache_clear()
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f"CREATE INDEX recipe_search_idx ON recipes_recipe USING GIN ({POSTGRES_VECTOR})")
+    elif vendor == 'sqlite':
+        try:
+            schema_editor.execute(f"""
+                CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+                    title, ingredients, description,
+                    content='recipes_recipe', content_rowid='id', tokenize='porter unicode61'
+                )
+            """)
+        except OperationalError:
+            return  # SQLite built without FTS5
+        install_sqlite_triggers(schema_editor)
+        schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def drop_search_index(schema_editor):
+    has_fts_table.cache_clear()
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS recipe_search_idx")
+    elif vendor == 'sqlite':
+        for name in SQLITE_TRIGGERS:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def install_sqlite_triggers(schema_editor):
+    """
+    (Re)create the FTS sync triggers. SQLite migrations that rebuild the
+    recipes table drop its triggers, so they must call this afterwards.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    if FTS_TABLE not in schema_editor.connection.introspection.table_names():
+        return
+    for name, sql in SQLITE_TRIGGERS.items():
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        schema_editor.execute(sql)
+
+
+def search_terms(query):
+    return re.findall(r'\w+', query.lower())[:16]
+
+
+@lru_cache
+def has_fts_table(alias):
+    """
+    Whether the FTS5 table exists on the database `alias`, looked up once
+    per process; the search index migration clears this.
+    """
+    return FTS_TABLE in connections[alias].introspection.table_names()
+
+
+def backend():
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite' and has_fts_table(connection.alias):
+        return 'sqlite'
+    return 'fallback'
+
+
+def ranked_ids(query, limit, offset=0):
+    """
+    Return up to `limit` recipe ids matching `query`, best match first.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    engine = backend()
+
+    if engine == 'fallback':
+        condition = Q()
+        for term in terms:
+            condition &= Q(title__icontains=term) | Q(ingredients__icontains=term) | Q(description__icontains=term)
+        queryset = Recipe.objects.filter(condition).order_by('-created_at', '-id')
+        return list(queryset.values_list('id', flat=True)[offset:offset + limit])
+
+    if engine == 'postgresql':
+        sql = f"""
+            SELECT id FROM recipes_recipe
+            WHERE {POSTGRES_VECTOR} @@ to_tsquery('english', %s)
+            ORDER BY ts_rank({POSTGRES_VECTOR}, to_tsquery('english', %s)) DESC, id DESC
+            LIMIT %s OFFSET %s
+        """
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        params = [tsquery, tsquery, limit, offset]
+    else:
+        sql = f"""
+            SELECT rowid FROM {FTS_TABLE}
+            WHERE {FTS_TABLE} MATCH %s
+            ORDER BY bm25({FTS_TABLE}, %s, %s, %s), rowid DESC
+            LIMIT %s OFFSET %s
+        """
+        match = ' '.join(f'"{term}"*' for term in terms)
+        params = [match, *SQLITE_WEIGHTS, limit, offset]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_recipes(query, limit, offset=0):
+    """
+    Matching recipes in rank order, with author and category joined.
+    """
+    ids = ranked_ids(query, limit, offset)
+    recipes = Recipe.objects.select_related('author', 'category').in_bulk(ids)
+    return [recipes[pk] for pk in ids if pk in recipes]
@@ -0,0 +1,202 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from io import StringIO
+from itertools import accumulate
+from typing import NamedTuple
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+
+from . import engagement, ingredients, stats, suggestions
+from .models import Recipe, Category, Following, RecipeEngagement
+
+# Zipf exponent of author popularity (who gets followed, who posts)
+POPULARITY_EXPONENT = 1.1
+# Pareto shape of how many people each user follows
+FOLLOWS_SHAPE = 1.5
+BENCH_USERNAME = 'bench_reader'
+READER_RECIPES = 10
+
+
+@contextmanager
+def explicit_timestamps(model, *field_names):
+    """
+    Temporarily disable `auto_now`/`auto_now_add` so seeded rows can carry
+    realistic, spread-out timestamps instead of all sharing "now".
+    """
+    fields = [model._meta.get_field(name) for name in field_names]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def seed_users(count, prefix='seed_user', batch_size=1000):
+    users = [User(username=f'{prefix}_{i}') for i in range(count)]
+    User.objects.bulk_create(users, batch_size=batch_size)
+    return list(User.objects.filter(username__startswith=f'{prefix}_').order_by('id'))
+
+
+def seed_categories(count, prefix='Category'):
+    categories = [Category(name=f'{prefix} {i}') for i in range(count)]
+    return Category.objects.bulk_create(categories)
+
+
+INGREDIENTS = [
+    'chicken breast', 'basmati rice', 'garlic', 'onion', 'tomato', 'olive oil',
+    'butter', 'flour', 'eggs', 'milk', 'sugar', 'salt', 'black pepper', 'lemon',
+    'ginger', 'soy sauce', 'coconut milk', 'chickpeas', 'spinach', 'mushrooms',
+    'beef mince', 'salmon', 'potatoes', 'carrots', 'parmesan', 'basil', 'cumin',
+    'paprika', 'honey', 'walnuts', 'almonds', 'peanuts', 'pasta', 'tofu', 'cream',
+]
+UNITS = ['g', 'ml', 'cup', 'cups', 'tbsp', 'tsp', '']
+DISHES = ['curry', 'stew', 'salad', 'soup', 'risotto', 'bake', 'stir fry', 'pie', 'tart', 'bowl']
+ADJECTIVES = ['easy', 'spicy', 'creamy', 'quick', 'classic', 'smoky', 'zesty', 'hearty', 'crispy']
+WORDS = (
+    'stir simmer roast chop season serve fresh golden tender slowly until heat pan oven '
+    'family weeknight favourite recipe flavour bright warm comforting simple rich'
+).split()
+
+
+def recipe_text(rng):
+    """
+    Random but plausible title, description, ingredients and instructions.
+    """
+    picked = rng.sample(INGREDIENTS, rng.randint(3, 8))
+    title = f"{rng.choice(ADJECTIVES).title()} {picked[0]} {rng.choice(DISHES)}"
+    ingredients = '\n'.join(
+        f"{rng.randint(1, 500)} {rng.choice(UNITS)} {name}".replace('  ', ' ') for name in picked
+    )
+    description = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(15, 40)))
+    instructions = '\n'.join(
+        ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))) for _ in range(rng.randint(3, 8))
+    )
+    return title, description, ingredients, instructions
+
+
+def popularity_weights(count, exponent=POPULARITY_EXPONENT):
+    """
+    Cumulative Zipf weights: item i is picked in proportion to 1 / (i + 1) ** exponent.
+    """
+    return list(accumulate(1 / (rank + 1) ** exponent for rank in range(count)))
+
+
+def seed_recipes(count, authors, categories, seed=0, batch_size=2000, author_weights=None):
+    """
+    Bulk-insert `count` recipes spread one minute apart going back in time.
+    `author_weights` (cumulative, as from `popularity_weights`) skews who
+    wrote them; authors are picked uniformly otherwise.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    picked_authors = rng.choices(authors, cum_weights=author_weights, k=count)
+    recipes = []
+    for i in range(count):
+        created = now - timedelta(minutes=count - i)
+        title, description, ingredients, instructions = recipe_text(rng)
+        recipes.append(Recipe(
+            title=title,
+            description=description,
+            ingredients=ingredients,
+            instructions=instructions,
+            author=picked_authors[i],
+            category=rng.choice(categories),
+            created_at=created,
+            updated_at=created,
+        ))
+    with explicit_timestamps(Recipe, 'created_at', 'updated_at'):
+        Recipe.objects.bulk_create(recipes, batch_size=batch_size)
+
+
+def seed_follows(users, average, seed=0, batch_size=5000, weights=None):
+    """
+    Power-law follow graph: how many people each user follows is Pareto
+    distributed around `average`, and whom they follow is Zipf
+    distributed over `users` (early users are the popular ones).
+    Returns the number of follows created.
+    """
+    rng = random.Random(seed)
+    weights = weights or popularity_weights(len(users))
+    scale = average * (FOLLOWS_SHAPE - 1) / FOLLOWS_SHAPE  # Pareto mean is shape / (shape - 1)
+    follows = []
+    for follower in users:
+        wanted = min(int(rng.paretovariate(FOLLOWS_SHAPE) * scale), len(users) - 1)
+        followed = set(rng.choices(users, cum_weights=weights, k=wanted))
+        followed.discard(follower)
+        follows.extend(Following(follower=follower, following=user) for user in followed)
+    Following.objects.bulk_create(follows, batch_size=batch_size, ignore_conflicts=True)
+    return len(follows)
+
+
+def seed_engagement(recipes, hours=48, seed=0, batch_size=5000):
+    """
+    Hourly view/save buckets over the last `hours` for a Zipf-popular
+    sample of the `recipes` newest recipes, then fold them into
+    `trending_score`. Returns the number of buckets created.
+    """
+    rng = random.Random(seed)
+    recipe_ids = list(Recipe.objects.order_by('-created_at', '-id').values_list('id', flat=True)[:recipes])
+    weights = popularity_weights(len(recipe_ids))
+    now = engagement.current_hour()
+    buckets = {}
+    for hour in range(hours):
+        for recipe_id in set(rng.choices(recipe_ids, cum_weights=weights, k=len(recipe_ids) // 10 + 1)):
+            views = rng.randint(1, 50)
+            buckets[(recipe_id, hour)] = RecipeEngagement(
+                recipe_id=recipe_id, hour=now - timedelta(hours=hour), views=views, saves=rng.randint(0, views // 5),
+            )
+    RecipeEngagement.objects.bulk_create(buckets.values(), batch_size=batch_size)
+    engagement.recompute_trending()
+    return len(buckets)
+
+
+class Dataset(NamedTuple):
+    reader: User
+    users: list
+    categories: list
+
+
+def seed_dataset(users, recipes, categories, average_follows=20, seed=0, prefix='seed',
+                 celebrity_followers=None, password=None):
+    """
+    A reproducible dataset for benchmarks and load tests: `users` users on
+    a power-law follow graph, `recipes` recipes mostly by popular authors,
+    engagement on the newest recipes, and `BENCH_USERNAME`, who follows
+    the 50 most popular users, to read feeds and call authenticated
+    endpoints as, with `READER_RECIPES` recipes of their own. The reader
+    is an ordinary user with `password`, or none it can log in with if
+    that is not given. Derived data bulk_create skips (feeds, ingredient
+    index, user counters, follow suggestions) is rebuilt afterwards.
+
+    Feeds are backfilled with `FEED_FANOUT_MAX_FOLLOWERS` at
+    `celebrity_followers` (default: 5% of `users`), so the head of the
+    follow graph is pulled on read, as it would be at full scale, and
+    fanning out stays proportional to the dataset.
+    """
+    if celebrity_followers is None:
+        celebrity_followers = max(users // 20, 1)
+    people = seed_users(users, prefix=f'{prefix}_user')
+    reader = User.objects.create(username=BENCH_USERNAME, password=make_password(password))
+    groups = seed_categories(categories, prefix=prefix.title())
+    weights = popularity_weights(len(people))
+    seed_follows(people, average_follows, seed=seed, weights=weights)
+    Following.objects.bulk_create(Following(follower=reader, following=user) for user in people[:50])
+    seed_recipes(recipes, people, groups, seed=seed, author_weights=weights)
+    # A few of the reader's own, for my_recipes and the author-only routes.
+    seed_recipes(READER_RECIPES, [reader], groups, seed=seed)
+
+    with override_settings(FEED_FANOUT_MAX_FOLLOWERS=celebrity_followers):
+        call_command('backfill_feed', stdout=StringIO())
+    ingredients.index_all()
+    stats.reconcile()
+    seed_engagement(min(recipes, 1000), seed=seed)
+    suggestions.compute_suggestions()
+    return Dataset(reader, people, groups)
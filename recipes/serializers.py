@@ -1,9 +1,22 @@
 from django.contrib.auth.models import User
-from rest_framework import serializers
-from .models import Recipe, Category, Following
+from django.db import IntegrityError
+from rest_framework import exceptions, serializers
+from rest_framework_simplejwt import serializers as jwt_serializers
+from . import authentication, images, metrics
+from .models import Recipe, Category, Following, FollowSuggestion
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class TimedSerializerMixin:
+    """
+    Count `to_representation` towards the request's `serialize` time
+    (reported by `PerformanceMiddleware`).
+    """
+    def to_representation(self, instance):
+        with metrics.phase('serialize'):
+            return super().to_representation(instance)
+
+
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for the Category model.
     Includes fields for the category ID and name.
@@ -13,7 +26,71 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name']
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipePreviewSerializer(serializers.ModelSerializer):
+    """
+    A recipe's title line, for previews inside other resources.
+    """
+    author = serializers.ReadOnlyField(source='author.username')
+
+    class Meta:
+        model = Recipe
+        fields = ['id', 'title', 'author', 'created_at']
+
+
+class CategoryListSerializer(CategorySerializer):
+    """
+    Category with its recipe count and newest recipes, both annotated
+    or prefetched by the view.
+    """
+    recipe_count = serializers.IntegerField(read_only=True)
+    latest_recipes = RecipePreviewSerializer(many=True, read_only=True)
+
+    class Meta(CategorySerializer.Meta):
+        fields = CategorySerializer.Meta.fields + ['recipe_count', 'latest_recipes']
+
+
+class SparseFieldsMixin:
+    """
+    `?fields=a,b` picks and `?omit=c` drops output fields. Without
+    `fields`, the serializer's `default_fields` (all fields if None) are
+    used. Views pass the same selection to `model_fields()` so that
+    `only()` skips the columns nobody reads.
+    """
+    default_fields = None
+    # Output field -> model lookups it reads (default: the field itself)
+    field_sources = {}
+    # Model fields every query needs (ordering, select_related joins)
+    required_model_fields = ('id',)
+
+    @classmethod
+    def selected_fields(cls, request):
+        write_only = {name for name, field in cls._declared_fields.items() if field.write_only}
+        readable = [name for name in cls.Meta.fields if name not in write_only]
+        params = request.query_params if request is not None else {}
+        fields = [name for name in params.get('fields', '').split(',') if name]
+        omit = [name for name in params.get('omit', '').split(',') if name]
+        unknown = set(fields + omit) - set(readable)
+        if unknown:
+            raise exceptions.ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}"})
+        selected = fields or cls.default_fields or readable
+        return [name for name in readable if name in selected and name not in omit]
+
+    @classmethod
+    def model_fields(cls, names):
+        columns = dict.fromkeys(cls.required_model_fields)
+        for name in names:
+            columns.update(dict.fromkeys(cls.field_sources.get(name, (name,))))
+        return list(columns)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = set(self.selected_fields(self.context.get('request')))
+        for name, field in list(self.fields.items()):
+            if not field.write_only and name not in selected:
+                del self.fields[name]
+
+
+class RecipeSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for the Recipe model.
     Handles author details, ownership check,
@@ -23,22 +100,53 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_author = serializers.SerializerMethodField()
     category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), write_only=True)
     category_name = serializers.ReadOnlyField(source="category.name")
+    image = serializers.SerializerMethodField()
+
+    field_sources = {
+        # `is_author` is recomputed from `author` on cached payloads
+        'is_author': ('author__username',),
+        'author': ('author__username',),
+        'category_name': ('category__name',),
+        'image': ('image_variants',),
+    }
+    required_model_fields = ('id', 'author', 'category', 'created_at')
+
+    @classmethod
+    def selected_fields(cls, request):
+        names = super().selected_fields(request)
+        if 'is_author' in names and 'author' not in names:
+            names.insert(names.index('is_author'), 'author')
+        return names
 
     def get_is_author(self, obj):
+        # Compare ids so the check never loads the author row.
         request = self.context.get('request')
-        return request.user == obj.author if request else False
+        return obj.author_id == request.user.pk if request else False
 
+    def get_image(self, obj):
+        # Resized variants only, never the uploaded original
+        return images.image_data(obj.image_variants)
 
-class Meta:
-    model = Recipe
-    fields = [
+    class Meta:
+        model = Recipe
+        fields = [
             'id', 'author', 'title', 'description', 'ingredients',
             'instructions', 'category', 'created_at', 'updated_at',
-            'is_author', 'category_name',
+            'is_author', 'category_name', 'image',
         ]
 
 
-class FollowingSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(RecipeSerializer):
+    """
+    Compact recipe for list views: everything but the three large text
+    fields, which can still be requested with `?fields=`.
+    """
+    default_fields = [
+        'id', 'author', 'title', 'created_at', 'updated_at', 'is_author', 'category_name', 'image',
+    ]
+
+
+class FollowingSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for the Following model.
     Manages unique relationships between followers and followed users.
@@ -52,7 +160,7 @@ class FollowingSerializer(serializers.ModelSerializer):
         try:
             return super().create(validated_data)
 
-        except IntegrityError:          
+        except IntegrityError:
             raise serializers.ValidationError(
                 {'detail': 'Possible duplicate follow'})
 
@@ -61,7 +169,7 @@ class FollowingSerializer(serializers.ModelSerializer):
         fields = ['id', 'follower', 'follower_name', 'following', 'following_name', 'created_at']
 
 
-class FeedSerializer(serializers.Serializer):
+class FeedSerializer(TimedSerializerMixin, serializers.Serializer):
     """
     Serializer to handle feed data, including recipes, likes, comments, and follows.
     """
@@ -70,7 +178,55 @@ class FeedSerializer(serializers.Serializer):
     data = serializers.JSONField()
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    Serializer for users with their denormalized counters;
+    select_related('stats') to avoid a query per user.
+    """
+    followers_count = serializers.ReadOnlyField(source='stats.followers_count')
+    following_count = serializers.ReadOnlyField(source='stats.following_count')
+    recipes_count = serializers.ReadOnlyField(source='stats.recipes_count')
+
     class Meta:
         model = User
-        fields = ["id", "username"]
+        fields = ["id", "username", "followers_count", "following_count", "recipes_count"]
+
+
+class UserFollowStatusSerializer(UserSerializer):
+    """
+    User with an `is_following` flag annotated onto the queryset.
+    """
+    is_following = serializers.BooleanField(read_only=True)
+
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + ["is_following"]
+
+
+class FollowSuggestionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    A suggested user, with the follows they have in common with the
+    caller and their recent recipe count.
+    """
+    user = UserSerializer(source='suggested')
+
+    class Meta:
+        model = FollowSuggestion
+        fields = ["user", "mutual_count", "recent_recipes"]
+
+
+class RecipeImageSerializer(serializers.Serializer):
+    """
+    An image upload, checked by Pillow (format, size, decompression bombs).
+    """
+    image = serializers.ImageField()
+
+
+class TokenObtainPairSerializer(jwt_serializers.TokenObtainPairSerializer):
+    """
+    JWT pair whose tokens also carry the username and staff flags, so
+    `JWT_AUTH_MODE = 'claims'` can authenticate reads without a lookup.
+    Refreshed access tokens copy them from the refresh token.
+    """
+    @classmethod
+    def get_token(cls, user):
+        return authentication.add_user_claims(super().get_token(user), user)
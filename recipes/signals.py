@@ -0,0 +1,108 @@
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework_simplejwt.tokens import Token
+
+from . import authentication, cache, feed, follows, images, ingredients, jobs, stats
+from .models import Recipe, Category, Following, UserStats
+
+
+# Feed and ingredient index upkeep runs in background jobs (see recipes/jobs.py).
+@receiver(post_save, sender=Recipe)
+def fan_out_new_recipe(sender, instance, created, **kwargs):
+    if created:
+        jobs.enqueue(feed.fan_out_new_recipe, recipe_id=instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe_ingredients(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'ingredients' in update_fields:
+        jobs.enqueue(ingredients.index_recipe, recipe_id=instance.pk)
+
+
+@receiver(post_save, sender=Following)
+def backfill_followed_author(sender, instance, created, **kwargs):
+    if created:
+        jobs.enqueue(feed.sync_followed_author, owner_id=instance.follower_id, author_id=instance.following_id)
+
+
+@receiver(post_delete, sender=Following)
+def drop_unfollowed_author(sender, instance, **kwargs):
+    jobs.enqueue(feed.sync_followed_author, owner_id=instance.follower_id, author_id=instance.following_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_images(sender, instance, **kwargs):
+    names = [instance.image.name, *images.variant_names(instance.image_variants)]
+    if names[0]:
+        transaction.on_commit(lambda: images.delete_files(names))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_responses(sender, instance, **kwargs):
+    cache.bump('recipes', f'recipe:{instance.pk}', cache.author_scope(instance.author_id))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_responses(sender, instance, **kwargs):
+    cache.bump('categories')
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Following)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        stats.adjust(instance.follower_id, following_count=1)
+        stats.adjust(instance.following_id, followers_count=1)
+
+
+@receiver(post_delete, sender=Following)
+def count_unfollow(sender, instance, **kwargs):
+    stats.adjust(instance.follower_id, following_count=-1)
+    stats.adjust(instance.following_id, followers_count=-1)
+
+
+@receiver(post_save, sender=Recipe)
+def count_new_recipe(sender, instance, created, **kwargs):
+    if created:
+        stats.adjust(instance.author_id, recipes_count=1)
+
+
+@receiver(post_delete, sender=Recipe)
+def count_deleted_recipe(sender, instance, **kwargs):
+    stats.adjust(instance.author_id, recipes_count=-1)
+
+
+@receiver(post_save, sender=Following)
+@receiver(post_delete, sender=Following)
+def invalidate_followed_ids(sender, instance, **kwargs):
+    follows.forget_followed_ids(instance.follower_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_logins(sender, instance, update_fields=None, **kwargs):
+    # Logging in only touches last_login, which the projection leaves out
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        authentication.forget_user(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def forget_deleted_author(sender, instance, **kwargs):
+    cache.forget_author_id(instance.username)
+
+
+@receiver(user_logged_out)
+def revoke_logged_out_token(sender, request, user, **kwargs):
+    token = getattr(request, 'auth', None)
+    if isinstance(token, Token):
+        authentication.revoke(token)
@@ -1,3 +1,1746 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from PIL import Image
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import authentication, bulk, engagement, feed, images, ingredients, jobs, suggestions
+from .fastpath import RecipeRows
+from .management.commands.bench_api import queries_from, uncovered_routes
+from .models import (
+    Recipe, Category, Following, FeedEntry, FollowSuggestion, Job, RecipeEngagement, RecipeIngredient, UserStats,
+)
+from .renderers import FastJSONRenderer
+from .seeding import BENCH_USERNAME, seed_dataset, seed_users, seed_categories, seed_recipes
+from .serializers import RecipeListSerializer, RecipeSerializer
+from .views import FeedView
+
+
+class RecipeCursorPaginationTests(TestCase):
+    """
+    Keyset pagination on /api/recipes/.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice')
+        cls.bob = User.objects.create_user('bob')
+        cls.desserts = Category.objects.create(name='Desserts')
+        cls.mains = Category.objects.create(name='Mains')
+        seed_recipes(45, [cls.alice, cls.bob], [cls.desserts, cls.mains])
+        # Rows sharing a timestamp must still be ordered by id.
+        Recipe.objects.filter(id__in=Recipe.objects.order_by('id')[:5].values('id')).update(
+            created_at=Recipe.objects.order_by('id').first().created_at
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def collect(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def expected_ids(self, **filters):
+        queryset = Recipe.objects.filter(**filters).order_by('-created_at', '-id')
+        return list(queryset.values_list('id', flat=True))
+
+    def test_pages_cover_all_recipes_in_order(self):
+        self.assertEqual(self.collect('/api/recipes/?page_size=10'), self.expected_ids())
+
+    def test_pages_combine_with_filters(self):
+        self.assertEqual(
+            self.collect('/api/recipes/?page_size=7&author=alice'),
+            self.expected_ids(author=self.alice),
+        )
+        self.assertEqual(
+            self.collect(f'/api/recipes/?page_size=7&category={self.mains.pk}'),
+            self.expected_ids(category=self.mains),
+        )
+
+    def test_my_recipes_pages(self):
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(
+            self.collect('/api/my_recipes/?page_size=4'),
+            self.expected_ids(author=self.bob),
+        )
+
+    def test_unpaginated_by_default(self):
+        response = self.client.get('/api/recipes/')
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 45)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/recipes/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(FEED_FANOUT_MAX_FOLLOWERS=2)
+class MaterializedFeedTests(TestCase):
+    """
+    The fan-out-on-write feed must match the fan-out-on-read query.
+    """
+    def setUp(self):
+        self.reader = User.objects.create_user('reader')
+        self.other = User.objects.create_user('other')
+        self.cook = User.objects.create_user('cook')
+        self.star = User.objects.create_user('star')
+        self.stranger = User.objects.create_user('stranger')
+        for fan in User.objects.exclude(pk=self.star.pk):
+            Following.objects.create(follower=fan, following=self.star)
+        Following.objects.create(follower=self.reader, following=self.cook)
+
+    def create_recipes(self, author, count):
+        for i in range(count):
+            Recipe.objects.create(
+                title=f'{author.username} {i}', description='d', ingredients='i',
+                instructions='s', author=author,
+            )
+
+    def assertFeedMatchesOnRead(self, user):
+        self.assertEqual(
+            [recipe.id for recipe in feed.feed_recipes(user, 100)],
+            list(feed.on_read_recipes(user).values_list('id', flat=True)[:100]),
+        )
+
+    def test_celebrity_recipes_are_pulled_not_fanned_out(self):
+        self.create_recipes(self.star, 3)
+        self.create_recipes(self.cook, 3)
+        self.create_recipes(self.stranger, 2)
+        self.assertFalse(FeedEntry.objects.filter(author=self.star).exists())
+        self.assertEqual(FeedEntry.objects.filter(owner=self.reader, author=self.cook).count(), 3)
+        self.assertFeedMatchesOnRead(self.reader)
+        self.assertFeedMatchesOnRead(self.other)
+
+    def test_follow_and_unfollow_update_the_feed(self):
+        self.create_recipes(self.cook, 2)
+        self.create_recipes(self.stranger, 2)
+        Following.objects.create(follower=self.reader, following=self.stranger)
+        self.assertFeedMatchesOnRead(self.reader)
+        Following.objects.filter(follower=self.reader, following=self.cook).delete()
+        self.assertFeedMatchesOnRead(self.reader)
+        self.assertFalse(FeedEntry.objects.filter(owner=self.reader, author=self.cook).exists())
+
+    def test_backfill_command_materializes_existing_recipes(self):
+        self.create_recipes(self.cook, 3)
+        self.create_recipes(self.star, 2)
+        FeedEntry.objects.all().delete()
+        Recipe.objects.update(fanned_out=False)
+
+        call_command('backfill_feed', stdout=StringIO())
+
+        self.assertEqual(FeedEntry.objects.filter(owner=self.reader).count(), 3)
+        self.assertFeedMatchesOnRead(self.reader)
+        self.assertFeedMatchesOnRead(self.other)
+
+    def test_feed_view_serves_materialized_recipes(self):
+        self.create_recipes(self.cook, 2)
+        self.create_recipes(self.star, 1)
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        response = client.get('/api/feed/')
+        self.assertEqual(response.status_code, 200)
+        recipe_ids = [item['data']['id'] for item in response.data if item['type'] == 'recipe']
+        self.assertEqual(sorted(recipe_ids), sorted(feed.on_read_recipes(self.reader).values_list('id', flat=True)))
+
+
+class FeedCursorTests(TestCase):
+    """
+    Cursor paging and "since" polling on /api/feed/.
+    """
+    def setUp(self):
+        self.reader = User.objects.create_user('reader')
+        self.authors = [User.objects.create_user(f'author{i}') for i in range(4)]
+        for author in self.authors:
+            Following.objects.create(follower=self.reader, following=author)
+        for i in range(9):
+            Recipe.objects.create(
+                title=f'Recipe {i}', description='d', ingredients='i',
+                instructions='s', author=self.authors[i % 4],
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def expected(self):
+        recipes = [(r.created_at, 'recipe', r.id) for r in feed.on_read_recipes(self.reader)]
+        follows = [(f.created_at, 'follow', f.id) for f in Following.objects.filter(follower=self.reader)]
+        return [(kind, pk) for _, kind, pk in sorted(recipes + follows, reverse=True)]
+
+    def collect(self, url):
+        items = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            items.extend((item['type'], item['data']['id']) for item in response.data['results'])
+            url = response.data['next']
+        return items
+
+    def test_pages_walk_the_merged_feed(self):
+        self.assertEqual(self.collect('/api/feed/?page_size=3'), self.expected())
+
+    def test_pages_break_timestamp_ties_on_type_and_id(self):
+        moment = Recipe.objects.first().created_at
+        Recipe.objects.update(created_at=moment)
+        FeedEntry.objects.update(created_at=moment)
+        Following.objects.update(created_at=moment)
+        self.assertEqual(self.collect('/api/feed/?page_size=2'), self.expected())
+
+    def test_unpaginated_returns_newest_items(self):
+        response = self.client.get('/api/feed/')
+        self.assertEqual([(item['type'], item['data']['id']) for item in response.data], self.expected())
+
+    def test_since_returns_only_newer_items(self):
+        poll = self.client.get('/api/feed/?page_size=5').data['poll']
+        self.assertEqual(self.client.get(poll).status_code, 304)
+
+        recipe = Recipe.objects.create(
+            title='Fresh', description='d', ingredients='i', instructions='s', author=self.authors[0],
+        )
+        response = self.client.get(poll)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['data']['id'] for item in response.data['results']], [recipe.id])
+        self.assertEqual(self.client.get(response.data['poll']).status_code, 304)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/feed/?cursor=bogus').status_code, 404)
+
+
+class QueryBudgetMixin:
+    """
+    Every endpoint must run a fixed number of queries however many rows
+    it returns. Subclasses set `rows`; budgets are shared so a size-
+    dependent query count fails at one size or the other.
+    Budgets are for cache misses, so the response cache is disabled;
+    recipe endpoints spend one extra query on their ETag validators.
+    """
+    rows = 10
+    budgets = {
+        'recipe-list': ('/api/recipes/', 2),
+        'recipe-page': ('/api/recipes/?page_size=100', 2),
+        'recipe-page-author': ('/api/recipes/?page_size=100&author=seed_user_0', 2),
+        'my-recipes': ('/api/my_recipes/', 2),
+        'recipe-detail': ('/api/recipes/{recipe}/', 2),
+        'recipe-trending': ('/api/recipes/trending/?page_size=100', 1),
+        'recipe-trending-category': ('/api/recipes/trending/?page_size=100&category={category}', 1),
+        'category-list': ('/api/categories/', 2),
+        'category-detail': ('/api/categories/{category}/', 1),
+        'user-list': ('/api/users/', 1),
+        'user-page': ('/api/users/?page_size=100', 1),
+        'user-search': ('/api/users/?q=seed_user_1&fields=id,username', 1),
+        'user-list-follow-status': ('/api/users/?include=is_following', 1),
+        'follow-status-batch': ('/api/users/follow-status/?ids={author_ids}', 1),
+        'user-suggestions': ('/api/users/suggestions/', 1),
+        'feed': ('/api/feed/', 3),
+        'feed-page': ('/api/feed/?page_size=100', 3),
+        'follow-status': ('/api/users/{author}/is-following/', 2),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user('reader')
+        authors = seed_users(cls.rows)
+        categories = seed_categories(3)
+        seed_recipes(cls.rows, authors + [cls.reader], categories)
+        Following.objects.bulk_create(Following(follower=cls.reader, following=a) for a in authors)
+        call_command('backfill_feed', stdout=StringIO())
+        Recipe.objects.update(trending_score=1)
+        FollowSuggestion.objects.bulk_create(
+            FollowSuggestion(user=cls.reader, suggested=user, rank=rank, mutual_count=1, recent_recipes=0)
+            for rank, user in enumerate(seed_users(cls.rows, prefix='suggested'), start=1)
+        )
+        cls.urls = {
+            name: url.format(recipe=Recipe.objects.first().pk,
+                             category=categories[0].pk, author=authors[0].pk,
+                             author_ids=','.join(str(a.pk) for a in authors[:500]))
+            for name, (url, _) in cls.budgets.items()
+        }
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0, ENGAGEMENT_FLUSH_SECONDS=3600)
+    def test_query_budgets(self):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        for name, (_, budget) in self.budgets.items():
+            with self.subTest(endpoint=name), self.assertNumQueries(budget):
+                response = client.get(self.urls[name])
+                self.assertEqual(response.status_code, 200)
+
+
+class SmallQueryBudgetTests(QueryBudgetMixin, TestCase):
+    rows = 10
+
+
+class LargeQueryBudgetTests(QueryBudgetMixin, TestCase):
+    rows = 1000
+
+
+class ExplainQueriesCommandTests(TestCase):
+    def test_hot_paths_use_indexes(self):
+        out = StringIO()
+        call_command('explain_queries', seed=200, stdout=out)
+        output = out.getvalue()
+        for index in ('recipe_created_idx', 'recipe_author_created_idx', 'recipe_category_created_idx',
+                      'feed_owner_created_idx', 'follow_follower_created_idx'):
+            self.assertIn(index, output)
+
+
+class RecipeSearchTests(TestCase):
+    """
+    Ranked search on /api/recipes/search/ (FTS5 on SQLite).
+    """
+    def setUp(self):
+        author = User.objects.create_user('cook')
+
+        def create(title, ingredients='', description=''):
+            return Recipe.objects.create(
+                title=title, ingredients=ingredients, description=description,
+                instructions='s', author=author,
+            )
+
+        self.in_description = create('Weeknight bowl', 'rice', 'Goes well with chicken')
+        self.in_title = create('Chicken curry', 'rice\nonion', 'Spicy')
+        self.in_ingredients = create('Fried rice', 'chicken thighs\nrice', 'Quick')
+        self.unrelated = create('Lemon tart', 'lemons\nsugar', 'Sweet')
+
+    def search(self, query):
+        response = APIClient().get('/api/recipes/search/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_ranks_title_above_ingredients_above_description(self):
+        self.assertEqual(
+            self.search('chicken'),
+            [self.in_title.id, self.in_ingredients.id, self.in_description.id],
+        )
+
+    def test_prefix_and_all_terms_match(self):
+        self.assertEqual(self.search('chick onio'), [self.in_title.id])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.unrelated.title = 'Chicken lemon tart'
+        self.unrelated.save()
+        self.assertIn(self.unrelated.id, self.search('chicken'))
+        self.in_title.delete()
+        self.assertNotIn(self.in_title.id, self.search('chicken'))
+
+    def test_backend_is_resolved_once(self):
+        self.search('chicken')
+        with CaptureQueriesContext(connection) as queries:
+            self.search('chicken')
+        self.assertFalse([query for query in queries if 'sqlite_master' in query['sql']])
+
+    def test_pages_with_offset(self):
+        response = APIClient().get('/api/recipes/search/', {'q': 'rice', 'page_size': 2})
+        self.assertEqual(len(response.data['results']), 2)
+        rest = APIClient().get(response.data['next'])
+        self.assertEqual(len(rest.data['results']), 1)
+        self.assertIsNone(rest.data['next'])
+
+
+class IngredientIndexTests(TestCase):
+    """
+    Parsing ingredient text and include/exclude queries.
+    """
+    def setUp(self):
+        self.cook = User.objects.create_user('cook')
+
+    def create(self, title, ingredients):
+        return Recipe.objects.create(
+            title=title, description='d', ingredients=ingredients, instructions='s', author=self.cook,
+        )
+
+    def test_parse_lines(self):
+        self.assertEqual(ingredients.parse_ingredients(
+            "2 tbsp olive oil\n- 3 Red Onions, diced\n1 pinch of salt\n\n500g chicken breasts (skinless)"
+        ), {'olive oil': '2 tbsp', 'red onion': '3', 'salt': '1 pinch', 'chicken breast': '500 g'})
+
+    def test_include_exclude_ranked_by_coverage(self):
+        both = self.create('Chicken rice', '2 chicken thighs\n1 cup basmati rice')
+        nutty = self.create('Satay chicken rice', 'chicken breast\nrice\n2 tbsp peanuts')
+        chicken_only = self.create('Roast chicken', '1 whole chicken\nlemon')
+        self.create('Lemon tart', 'lemons\nsugar')
+
+        response = APIClient().get('/api/recipes/by-ingredients/', {'include': 'chicken,rice', 'exclude': 'nuts'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['id'] for r in response.data], [both.id, chicken_only.id])
+        self.assertEqual([r['coverage'] for r in response.data], [1.0, 0.5])
+
+        response = APIClient().get('/api/recipes/by-ingredients/', {'include': 'chicken,rice', 'match': 'all'})
+        self.assertEqual([r['id'] for r in response.data], [nutty.id, both.id])
+
+    def test_recipe_deleted_after_ranking_is_skipped(self):
+        recipe = self.create('Chicken rice', 'chicken\nrice')
+        gone = self.create('Chicken soup', 'chicken')
+        ranked = ingredients.recipes_with(['chicken'])
+        gone.delete()
+        with mock.patch.object(ingredients, 'recipes_with', return_value=ranked):
+            response = APIClient().get('/api/recipes/by-ingredients/', {'include': 'chicken'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['id'] for r in response.data], [recipe.id])
+
+    def test_index_follows_edits_and_backfill(self):
+        recipe = self.create('Soup', 'carrots')
+        recipe.ingredients = 'leeks\npotatoes'
+        recipe.save()
+        self.assertEqual(ingredients.recipes_with(['potato']), [(recipe.id, 1)])
+        self.assertEqual(ingredients.recipes_with(['carrot']), [])
+
+        RecipeIngredient.objects.all().delete()
+        call_command('index_ingredients', stdout=StringIO())
+        self.assertEqual(ingredients.recipes_with(['leek']), [(recipe.id, 1)])
+
+
+class ResponseCacheTests(TestCase):
+    """
+    Versioned response caching of recipe and category reads.
+    """
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.category = Category.objects.create(name='Mains')
+        self.recipe = Recipe.objects.create(
+            title='Stew', description='d', ingredients='i', instructions='s',
+            author=self.alice, category=self.category,
+        )
+        self.client = APIClient()
+
+    def test_second_read_is_served_from_cache(self):
+        self.client.get('/api/recipes/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(response.data[0]['title'], 'Stew')
+
+    def test_writes_invalidate_lists_and_detail(self):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        self.client.get(url)
+        self.client.get('/api/recipes/?author=alice')
+        self.recipe.title = 'Beef stew'
+        self.recipe.save()
+        self.assertEqual(self.client.get(url).data['title'], 'Beef stew')
+        self.assertEqual(self.client.get('/api/recipes/?author=alice').data[0]['title'], 'Beef stew')
+
+        self.category.name = 'Dinners'
+        self.category.save()
+        self.assertEqual(self.client.get(url).data['category_name'], 'Dinners')
+
+        self.recipe.delete()
+        self.assertEqual(self.client.get('/api/recipes/').data, [])
+
+    def test_other_authors_lists_stay_cached(self):
+        self.client.get('/api/recipes/?author=bob')
+        Recipe.objects.create(title='Tart', description='d', ingredients='i', instructions='s', author=self.alice)
+        with self.assertNumQueries(0):
+            self.client.get('/api/recipes/?author=bob')
+
+    def test_invalidation_does_not_load_the_author(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        with CaptureQueriesContext(connection) as queries:
+            recipe.save()
+            recipe.delete()
+        self.assertFalse([query for query in queries if 'FROM "auth_user"' in query['sql']])
+
+    def test_is_author_is_computed_per_user(self):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        self.client.force_authenticate(self.alice)
+        self.assertTrue(self.client.get(url).data['is_author'])
+        self.client.force_authenticate(self.bob)
+        self.assertFalse(self.client.get(url).data['is_author'])
+        self.client.force_authenticate(None)
+        self.assertFalse(self.client.get(url).data['is_author'])
+
+    def test_my_recipes_are_cached_per_user(self):
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(len(self.client.get('/api/my_recipes/').data), 1)
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(self.client.get('/api/my_recipes/').data, [])
+
+    def test_stats_endpoint_is_admin_only(self):
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(self.client.get('/api/cache-stats/').status_code, 403)
+        self.client.force_authenticate(User.objects.create_user('admin', is_staff=True))
+        self.client.get('/api/categories/')
+        self.client.get('/api/categories/')
+        self.assertGreaterEqual(self.client.get('/api/cache-stats/').data['CategoryListView.hits'], 1)
+
+
+class ConditionalRequestTests(TestCase):
+    """
+    ETags, 304 Not Modified and If-Match on recipe and feed endpoints.
+    """
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.category = Category.objects.create(name='Mains')
+        self.recipe = Recipe.objects.create(
+            title='Stew', description='d', ingredients='i', instructions='s',
+            author=self.alice, category=self.category,
+        )
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+        self.client = APIClient()
+
+    def test_unchanged_resources_return_304(self):
+        for url in (self.url, '/api/recipes/', '/api/recipes/?page_size=5'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+            self.assertTrue(response['ETag'])
+
+    def test_warm_304_runs_no_queries(self):
+        etag = self.client.get('/api/recipes/')['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/recipes/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_changes_invalidate_etags(self):
+        detail_etag = self.client.get(self.url)['ETag']
+        list_etag = self.client.get('/api/recipes/')['ETag']
+        self.category.name = 'Dinners'
+        self.category.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=detail_etag).status_code, 200)
+        self.assertEqual(self.client.get('/api/recipes/', HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+
+        list_etag = self.client.get('/api/recipes/')['ETag']
+        Recipe.objects.create(title='Tart', description='d', ingredients='i', instructions='s', author=self.bob)
+        self.assertEqual(self.client.get('/api/recipes/', HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+
+        list_etag = self.client.get('/api/recipes/')['ETag']
+        self.recipe.delete()
+        self.assertEqual(self.client.get('/api/recipes/', HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_page_etag_follows_its_rows(self):
+        url = '/api/recipes/?page_size=1'
+        etag = self.client.get(url)['ETag']
+        Recipe.objects.filter(pk=self.recipe.pk).update(title='Beef stew', updated_at=timezone.now())
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(url)['ETag']
+        Recipe.objects.create(title='Tart', description='d', ingredients='i', instructions='s', author=self.bob)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_differs_per_user(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.force_authenticate(self.alice)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_author'])
+
+    def test_if_modified_since_on_detail(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_if_match_guards_updates(self):
+        self.client.force_authenticate(self.alice)
+        etag = self.client.get(self.url)['ETag']
+        data = {
+            'title': 'Beef stew', 'description': 'd', 'ingredients': 'i', 'instructions': 's',
+            'category': self.category.pk,
+        }
+        response = self.client.put(self.url, data, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        response = self.client.patch(self.url, {'title': 'Lost update'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.title, 'Beef stew')
+
+        fresh = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.patch(self.url, {'title': 'Stew'}, HTTP_IF_MATCH=fresh).status_code, 200)
+
+    def test_feed_304_until_a_followed_author_posts(self):
+        Following.objects.create(follower=self.bob, following=self.alice)
+        self.client.force_authenticate(self.bob)
+        for url in ('/api/feed/', '/api/feed/?page_size=5'):
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            self.recipe.title = f'Stew {url}'
+            self.recipe.save()
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class BulkImportExportTests(TestCase):
+    """
+    JSON Lines import and streaming export on /api/recipes/bulk/.
+    """
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.category = Category.objects.create(name='Mains')
+        Following.objects.create(follower=self.bob, following=self.alice)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def line(self, title, **fields):
+        row = {'title': title, 'description': 'd', 'ingredients': '2 leeks\n1 onion',
+               'instructions': 's', 'category': self.category.pk}
+        return json.dumps({**row, **fields})
+
+    def post(self, lines):
+        return self.client.post('/api/recipes/bulk/', '\n'.join(lines), content_type='application/x-ndjson')
+
+    def test_import_reports_errors_per_line(self):
+        self.client.get('/api/recipes/')
+        response = self.post([
+            self.line('Soup'),
+            '{not json',
+            '',
+            self.line('', category=999),
+            self.line('Pie'),
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['failed'], 2)
+        self.assertEqual([error['line'] for error in response.data['errors']], [2, 4])
+        self.assertEqual(set(response.data['errors'][1]['errors']), {'title', 'category'})
+
+        self.assertEqual(Recipe.objects.filter(author=self.alice).count(), 2)
+        self.assertEqual(len(self.client.get('/api/recipes/').data), 2)
+
+    def test_import_applies_signal_side_effects(self):
+        self.post([self.line('Soup'), self.line('Pie')])
+        self.assertEqual(FeedEntry.objects.filter(owner=self.bob).count(), 2)
+        self.assertTrue(all(Recipe.objects.values_list('fanned_out', flat=True)))
+        self.assertEqual(len(ingredients.recipes_with(['leek'])), 2)
+
+    @override_settings(JOBS_INLINE=False)
+    def test_import_enqueues_one_job_per_chunk(self):
+        Job.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post([self.line(f'Soup {i}') for i in range(3)])
+        self.assertEqual(
+            sorted(Job.objects.values_list('task', flat=True)),
+            ['recipes.feed.fan_out_new_recipes', 'recipes.ingredients.index_recipe_ids'],
+        )
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(jobs.work(), (2, 0))
+        self.assertEqual(FeedEntry.objects.filter(owner=self.bob).count(), 3)
+        self.assertEqual(len(ingredients.recipes_with(['leek'])), 3)
+
+    def test_import_queries_do_not_grow_with_rows(self):
+        self.post([self.line('Soup')])
+        counts = []
+        for rows in (5, 50):
+            with CaptureQueriesContext(connection) as queries:
+                self.post([self.line(f'Soup {i}') for i in range(rows)])
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_import_requires_login(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.post([self.line('Soup')]).status_code, 401)
+
+    def test_all_invalid_is_a_bad_request(self):
+        self.assertEqual(self.post(['[]']).status_code, 400)
+
+    def test_export_round_trips(self):
+        self.post([self.line(f'Soup {i}') for i in range(3)])
+        response = self.client.get(f'/api/recipes/bulk/?category={self.category.pk}')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Soup 0', 'Soup 1', 'Soup 2'])
+        self.assertEqual(rows[0]['author'], 'alice')
+        self.assertEqual(rows[0]['category_name'], 'Mains')
+
+        self.client.force_authenticate(self.bob)
+        response = self.post(json.dumps(row) for row in rows)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(Recipe.objects.filter(author=self.bob).count(), 3)
+
+    def test_export_requires_a_filter(self):
+        self.assertEqual(self.client.get('/api/recipes/bulk/').status_code, 400)
+
+    async def test_export_streams_under_asgi(self):
+        await sync_to_async(seed_recipes)(bulk.EXPORT_CHUNK_SIZE + 10, [self.alice], [self.category])
+        client = AsyncClient()
+        response = await client.get(f'/api/recipes/bulk/?category={self.category.pk}')
+        self.assertTrue(response.is_async)
+        chunks = response.streaming_content.__aiter__()
+        # The first chunk arrives before the rest of the rows are read
+        first = await chunks.__anext__()
+        self.assertEqual(first.count(b'\n'), bulk.EXPORT_CHUNK_SIZE)
+        rest = [chunk async for chunk in chunks]
+        self.assertEqual(b''.join(rest).count(b'\n'), 10)
+        ids = [json.loads(line)['id'] for line in (first + b''.join(rest)).splitlines()]
+        self.assertEqual(ids, sorted(ids))
+
+
+class UserStatsTests(TestCase):
+    """
+    Denormalized follower/following/recipe counters.
+    """
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.client = APIClient()
+        self.client.force_authenticate(self.bob)
+
+    def stats(self, user):
+        return UserStats.objects.values_list('followers_count', 'following_count', 'recipes_count').get(user=user)
+
+    def test_follow_toggle_updates_counts(self):
+        response = self.client.post(f'/api/users/{self.alice.pk}/follow/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['followers_count'], response.data['following_count']), (1, 1))
+        self.assertEqual(self.stats(self.alice), (1, 0, 0))
+        self.assertEqual(self.stats(self.bob), (0, 1, 0))
+
+        response = self.client.post(f'/api/users/{self.alice.pk}/follow/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['followers_count'], response.data['following_count']), (0, 0))
+
+    def test_recipe_create_and_delete_update_counts(self):
+        recipe = Recipe.objects.create(title='Stew', description='d', ingredients='i', instructions='s',
+                                       author=self.alice)
+        self.assertEqual(self.stats(self.alice), (0, 0, 1))
+        recipe.delete()
+        self.assertEqual(self.stats(self.alice), (0, 0, 0))
+
+    def test_counts_on_user_list(self):
+        Following.objects.create(follower=self.bob, following=self.alice)
+        users = {user['username']: user for user in self.client.get('/api/users/').data}
+        self.assertEqual(users['alice']['followers_count'], 1)
+        self.assertEqual(users['bob']['following_count'], 1)
+
+    def test_reconcile_repairs_drift_and_missing_rows(self):
+        authors = seed_users(5)
+        seed_recipes(12, authors, seed_categories(2))
+        Following.objects.bulk_create(Following(follower=self.bob, following=a) for a in authors)
+        UserStats.objects.filter(user=self.alice).update(followers_count=7)
+
+        out = StringIO()
+        call_command('reconcile_user_stats', batch_size=2, stdout=out)
+        self.assertIn('Checked 7 users, fixed 7 stats rows.', out.getvalue())
+        self.assertEqual(self.stats(self.alice), (0, 0, 0))
+        self.assertEqual(self.stats(self.bob), (0, 5, 0))
+        self.assertEqual(sum(UserStats.objects.values_list('recipes_count', flat=True)), 12)
+
+        call_command('reconcile_user_stats', stdout=out)
+        self.assertIn('Checked 7 users, fixed 0 stats rows.', out.getvalue())
+
+
+class FollowApiTests(TestCase):
+    """
+    Idempotent PUT/DELETE follows, the legacy toggle and bulk follows.
+    """
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.carol = User.objects.create_user('carol')
+        self.client = APIClient()
+        self.client.force_authenticate(self.bob)
+        self.url = f'/api/users/{self.alice.pk}/follow/'
+
+    def test_put_and_delete_are_idempotent(self):
+        Recipe.objects.create(title='Stew', description='d', ingredients='i', instructions='s', author=self.alice)
+        self.assertEqual(self.client.put(self.url).status_code, 201)
+        response = self.client.put(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['followers_count'], 1)
+        self.assertEqual(Following.objects.count(), 1)
+        self.assertEqual(FeedEntry.objects.filter(owner=self.bob).count(), 1)
+
+        self.assertEqual(self.client.delete(self.url).data['message'], 'Unfollowed user')
+        response = self.client.delete(self.url)
+        self.assertEqual((response.status_code, response.data['message']), (200, 'Not following'))
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(UserStats.objects.get(user=self.alice).followers_count, 0)
+
+    @override_settings(JOBS_INLINE=False)
+    def test_follow_is_one_statement(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.put(self.url)
+        follow_queries = [q['sql'] for q in queries if '"recipes_following"' in q['sql']]
+        self.assertEqual(len(follow_queries), 1)
+        self.assertIn('ON CONFLICT', follow_queries[0])
+
+    def test_post_still_toggles(self):
+        self.assertEqual(self.client.post(self.url).status_code, 201)
+        self.assertEqual(self.client.post(self.url).status_code, 200)
+        self.assertFalse(Following.objects.exists())
+
+    def test_unknown_user_is_404(self):
+        for method in (self.client.put, self.client.delete, self.client.post):
+            self.assertEqual(method('/api/users/9999/follow/').status_code, 404)
+        self.assertFalse(Following.objects.exists())
+
+    def test_bulk_follow(self):
+        Following.objects.create(follower=self.bob, following=self.carol)
+        response = self.client.post('/api/users/follow/', {
+            'follow': [self.alice.pk, self.alice.pk, 9999],
+            'unfollow': [self.carol.pk],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['followed'], [self.alice.pk])
+        self.assertEqual(response.data['unfollowed'], [self.carol.pk])
+        self.assertEqual(response.data['following_count'], 1)
+        self.assertEqual(list(Following.objects.values_list('following', flat=True)), [self.alice.pk])
+
+    def test_cannot_follow_self(self):
+        response = self.client.post('/api/users/follow/', {'follow': [self.bob.pk, self.alice.pk]}, format='json')
+        self.assertEqual(response.data['followed'], [self.alice.pk])
+        self.assertEqual(response.data['following_count'], 1)
+        self.assertEqual(self.client.put(f'/api/users/{self.bob.pk}/follow/').status_code, 400)
+        self.assertFalse(Following.objects.filter(follower=self.bob, following=self.bob).exists())
+        self.assertEqual(UserStats.objects.get(user=self.bob).followers_count, 0)
+
+    def test_bulk_follow_validates_ids(self):
+        self.assertEqual(self.client.post('/api/users/follow/', {'follow': ['x']}, format='json').status_code, 400)
+        too_many = {'follow': list(range(1, 502))}
+        self.assertEqual(self.client.post('/api/users/follow/', too_many, format='json').status_code, 400)
+
+
+class ConcurrentFollowTests(TransactionTestCase):
+    """
+    Many simultaneous follows of the same user must all succeed and leave one row.
+    """
+    def test_concurrent_puts(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            # Shared-cache in-memory SQLite fails with "table is locked"
+            # instead of waiting for the writer, which tests the harness.
+            self.skipTest('needs PostgreSQL or a file-backed SQLite test database')
+        alice = User.objects.create_user('alice')
+        bob = User.objects.create_user('bob')
+
+        def put(_):
+            try:
+                client = APIClient()
+                client.force_authenticate(bob)
+                return client.put(f'/api/users/{alice.pk}/follow/').status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            statuses = list(pool.map(put, range(32)))
+
+        self.assertEqual(sorted(set(statuses)), [200, 201])
+        self.assertEqual(statuses.count(201), 1)
+        self.assertEqual(Following.objects.count(), 1)
+        self.assertEqual(UserStats.objects.get(user=alice).followers_count, 1)
+
+
+class FollowStatusTests(TestCase):
+    """
+    Batch follow-status lookups and the is_following flag on the user list.
+    """
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.carol = User.objects.create_user('carol')
+        Following.objects.create(follower=self.bob, following=self.alice)
+        self.client = APIClient()
+        self.client.force_authenticate(self.bob)
+
+    def status_of(self, *users):
+        ids = ','.join(str(user.pk) for user in users)
+        return self.client.get(f'/api/users/follow-status/?ids={ids}').data['following']
+
+    def test_batch_lookup_is_cached_and_invalidated(self):
+        self.assertEqual(self.status_of(self.alice, self.carol), {self.alice.pk: True, self.carol.pk: False})
+        with self.assertNumQueries(0):
+            self.status_of(self.alice, self.carol)
+        Following.objects.create(follower=self.bob, following=self.carol)
+        self.assertEqual(self.status_of(self.carol), {self.carol.pk: True})
+        self.client.delete(f'/api/users/{self.alice.pk}/follow/')
+        self.assertEqual(self.status_of(self.alice), {self.alice.pk: False})
+
+    def test_batch_lookup_validates_ids(self):
+        self.assertEqual(self.client.get('/api/users/follow-status/?ids=1,x').status_code, 400)
+        self.assertEqual(self.status_of(), {})
+
+    def test_user_list_is_following(self):
+        users = self.client.get('/api/users/?include=is_following').data
+        self.assertEqual({u['username']: u['is_following'] for u in users},
+                         {'alice': True, 'bob': False, 'carol': False})
+        self.assertNotIn('is_following', self.client.get('/api/users/').data[0])
+
+
+class UserListTests(TestCase):
+    """
+    Username-ordered pages, prefix search and field projection on /api/users/.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user('reader')
+        for name in ('anna', 'annabel', 'anne', 'bob', 'Anton', 'ann_b'):
+            User.objects.create_user(name)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def usernames(self, url):
+        names = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            names.extend(user['username'] for user in response.data['results'])
+            url = response.data['next']
+        return names
+
+    def test_pages_cover_every_user_in_order(self):
+        names = self.usernames('/api/users/?page_size=2')
+        self.assertEqual(names, sorted(User.objects.values_list('username', flat=True)))
+
+    def test_prefix_search(self):
+        self.assertEqual(self.usernames('/api/users/?q=ann&page_size=2'), ['ann_b', 'anna', 'annabel', 'anne'])
+        self.assertEqual(self.usernames('/api/users/?q=anna'), ['anna', 'annabel'])
+        self.assertEqual(self.usernames('/api/users/?q=zz'), [])
+        # The last code point has no successor for the range's upper bound
+        self.assertEqual(self.usernames(f'/api/users/?q=an{chr(0x10FFFF)}'), [])
+
+    def test_fields_projection(self):
+        response = self.client.get('/api/users/?q=bo&fields=id')
+        self.assertEqual(response.data['results'], [{'id': User.objects.get(username='bob').pk}])
+        response = self.client.get('/api/users/?fields=username,followers_count,is_following')
+        self.assertEqual(response.data[0].keys(), {'username', 'followers_count', 'is_following'})
+        self.assertEqual(self.client.get('/api/users/?fields=password').status_code, 400)
+
+    def test_unpaginated_list_is_unchanged(self):
+        self.assertEqual(len(self.client.get('/api/users/').data), 7)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class SparseFieldsTests(TestCase):
+    """
+    Compact recipe lists and `?fields=` / `?omit=` projections.
+    """
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.category = Category.objects.create(name='Mains')
+        self.recipe = Recipe.objects.create(
+            title='Stew', description='d', ingredients='i', instructions='s',
+            author=self.alice, category=self.category,
+        )
+        self.client = APIClient()
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, queries[-1]['sql']
+
+    def test_list_is_compact_and_skips_large_columns(self):
+        response, sql = self.get('/api/recipes/')
+        self.assertEqual(set(response.data[0]), {
+            'id', 'author', 'title', 'created_at', 'updated_at', 'is_author', 'category_name', 'image',
+        })
+        for column in ('description', 'ingredients', 'instructions'):
+            self.assertNotIn(f'"recipes_recipe"."{column}"', sql)
+
+    def test_fields_and_omit(self):
+        response, sql = self.get('/api/recipes/?fields=title,description&page_size=5')
+        self.assertEqual(response.data['results'], [{'title': 'Stew', 'description': 'd'}])
+        self.assertNotIn('"recipes_recipe"."instructions"', sql)
+
+        response, _ = self.get(f'/api/recipes/{self.recipe.pk}/?omit=ingredients,instructions')
+        self.assertNotIn('ingredients', response.data)
+        self.assertIn('description', response.data)
+
+    def test_is_author_keeps_author(self):
+        self.client.force_authenticate(self.alice)
+        response, _ = self.get(f'/api/recipes/{self.recipe.pk}/?fields=is_author')
+        self.assertEqual(response.data, {'author': 'alice', 'is_author': True})
+
+    def test_unknown_fields_are_rejected(self):
+        self.assertEqual(self.client.get('/api/recipes/?fields=password').status_code, 400)
+        self.assertEqual(self.client.get('/api/recipes/?omit=category').status_code, 400)
+
+    def test_writes_return_the_full_recipe(self):
+        self.client.force_authenticate(self.alice)
+        response = self.client.post('/api/recipes/', {
+            'title': 'Pie', 'description': 'd', 'ingredients': 'i', 'instructions': 's',
+            'category': self.category.pk,
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['instructions'], 's')
+
+
+class FastPathTests(TestCase):
+    """
+    The values() fast path and the orjson renderer must produce the same
+    bytes as the DRF serializer and `JSONRenderer`.
+    """
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bøb')
+        category = Category.objects.create(name='Soups   & stews')
+        titles = [
+            'Stew', 'Crème brûlée', 'Tab\there "quoted" \\ \u2029', '\U0001f35c ramen',
+            'line\u2028sep', '',
+        ]
+        variants = {'width': 800, 'height': 600, 'sources': {
+            'image/webp': {'320': 'recipes/1/a-320w.webp', '640': 'recipes/1/a-640w.webp'},
+        }}
+        for i, title in enumerate(titles):
+            Recipe.objects.create(
+                author=self.alice if i % 2 else self.bob, title=title, description='d\n' * i,
+                ingredients='i', instructions='s', category=category if i % 3 else None,
+                image_variants=variants if i == 1 else {},
+            )
+
+    def request(self, user=None, **params):
+        django_request = APIRequestFactory().get('/api/recipes/', params)
+        if user is not None:
+            force_authenticate(django_request, user)
+        request = Request(django_request, authenticators=[])
+        request.user = user if user is not None else AnonymousUser()
+        return request
+
+    def assertSameBytes(self, serializer_class, request):
+        queryset = Recipe.objects.select_related('author', 'category').order_by('-created_at', '-id')
+        expected = JSONRenderer().render(
+            serializer_class(queryset, many=True, context={'request': request}).data
+        )
+        rows = RecipeRows(serializer_class, request)
+        self.assertEqual(FastJSONRenderer().render(rows.serialize(rows.values(queryset))), expected)
+
+    def test_matches_serializer(self):
+        for serializer_class in (RecipeListSerializer, RecipeSerializer):
+            for user in (None, self.alice):
+                for params in ({}, {'fields': 'id,is_author'}, {'omit': 'category_name,created_at'}):
+                    with self.subTest(serializer_class=serializer_class.__name__, user=user, **params):
+                        self.assertSameBytes(serializer_class, self.request(user, **params))
+
+    def test_renderer_matches_json_renderer(self):
+        data = {
+            'when': timezone.now(), 'price': Decimal('1.50'), 'lazy': gettext_lazy('Recipes'),
+            'text': 'a b\x00\x1f é', 'nested': [1, 2.5, None, True, {'k': ()}],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_list_endpoint_matches_serializer(self):
+        cache.clear()
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        response = client.get('/api/recipes/?page_size=3')
+        queryset = Recipe.objects.order_by('-created_at', '-id')[:3]
+        context = {'request': self.request(self.alice)}
+        expected = JSONRenderer().render(RecipeListSerializer(queryset, many=True, context=context).data)
+        self.assertEqual(json.loads(response.content)['results'], json.loads(expected))
+
+
+@override_settings(ENGAGEMENT_FLUSH_SECONDS=3600)
+class TrendingTests(TestCase):
+    """
+    Buffered engagement writes and the decayed trending score.
+    """
+    def setUp(self):
+        cache.clear()
+        engagement.buffer.drain()
+        self.alice = User.objects.create_user('alice')
+        self.mains = Category.objects.create(name='Mains')
+        self.desserts = Category.objects.create(name='Desserts')
+        self.stew, self.tart, self.pie = (
+            Recipe.objects.create(
+                title=title, description='d', ingredients='i', instructions='s',
+                author=self.alice, category=category,
+            )
+            for title, category in (('Stew', self.mains), ('Tart', self.desserts), ('Pie', self.desserts))
+        )
+        self.client = APIClient()
+
+    def bucket(self, recipe):
+        return RecipeEngagement.objects.values_list('views', 'saves').get(recipe=recipe)
+
+    def test_views_and_saves_are_buffered_and_summed(self):
+        for _ in range(3):
+            self.client.get(f'/api/recipes/{self.stew.pk}/')
+        self.assertFalse(RecipeEngagement.objects.exists())
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(engagement.flush(), 1)
+        self.assertEqual(sum(query['sql'].startswith('INSERT') for query in queries), 1)
+        self.assertEqual(self.bucket(self.stew), (3, 0))
+
+        self.client.get(f'/api/recipes/{self.stew.pk}/')
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(self.client.post(f'/api/recipes/{self.stew.pk}/save/').status_code, 202)
+        engagement.flush()
+        self.assertEqual(self.bucket(self.stew), (4, 1))
+
+    def test_full_buffer_flushes(self):
+        with override_settings(ENGAGEMENT_BUFFER_SIZE=2):
+            engagement.record(self.stew.pk, views=1)
+            self.assertFalse(RecipeEngagement.objects.exists())
+            engagement.record(self.tart.pk, views=1)
+        self.assertEqual(RecipeEngagement.objects.count(), 2)
+
+    def test_quiet_buffer_is_flushed_by_the_timer(self):
+        engagement.flush()  # drop any timer an earlier test left pending
+        with mock.patch.object(engagement, 'flush') as flush, override_settings(ENGAGEMENT_FLUSH_SECONDS=0.01):
+            engagement.record(self.stew.pk, views=1)
+            for _ in range(100):
+                if flush.called:
+                    break
+                time.sleep(0.01)
+        flush.assert_called_once_with()
+
+    def test_deleted_recipes_are_dropped(self):
+        engagement.record(self.stew.pk, views=1)
+        engagement.record(self.tart.pk, views=1)
+        self.stew.delete()
+        self.assertEqual(engagement.flush(), 1)
+
+    def test_save_needs_an_existing_recipe(self):
+        self.assertEqual(self.client.post(f'/api/recipes/{self.stew.pk}/save/').status_code, 401)
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(self.client.post('/api/recipes/0/save/').status_code, 404)
+
+    def test_scores_decay_and_expire(self):
+        now = engagement.current_hour()
+        RecipeEngagement.objects.bulk_create([
+            RecipeEngagement(recipe=self.stew, hour=now, views=10),
+            RecipeEngagement(recipe=self.tart, hour=now - timedelta(hours=24), views=10, saves=2),
+            RecipeEngagement(recipe=self.pie, hour=now - timedelta(hours=24 * 8), views=100),
+        ])
+        Recipe.objects.filter(pk=self.pie.pk).update(trending_score=50)
+
+        self.assertEqual(engagement.recompute_trending(now), (2, 3))
+        scores = dict(Recipe.objects.values_list('title', 'trending_score'))
+        self.assertEqual(scores, {'Stew': 10, 'Tart': 10, 'Pie': 0})
+        self.assertEqual(RecipeEngagement.objects.count(), 2)
+        self.assertEqual(engagement.recompute_trending(now), (2, 0))
+
+        RecipeEngagement.objects.filter(recipe=self.stew).update(views=11)
+        engagement.recompute_trending(now)
+        response = self.client.get('/api/recipes/trending/')
+        self.assertEqual([item['title'] for item in response.data['results']], ['Stew', 'Tart'])
+        response = self.client.get(f'/api/recipes/trending/?category={self.desserts.pk}')
+        self.assertEqual([item['title'] for item in response.data['results']], ['Tart'])
+        self.assertEqual(self.client.get('/api/recipes/trending/?category=x').status_code, 400)
+
+    def test_command(self):
+        engagement.record(self.stew.pk, saves=1)
+        engagement.flush()
+        out = StringIO()
+        call_command('recompute_trending', stdout=out)
+        self.assertIn('Scored 1 recipes, updated 1', out.getvalue())
+        # Decayed by up to an hour since the start of the current bucket
+        self.assertAlmostEqual(Recipe.objects.get(pk=self.stew.pk).trending_score, engagement.SAVE_WEIGHT, delta=0.2)
+
+
+class FollowSuggestionTests(TestCase):
+    """
+    Friend-of-friend suggestions: ranked by overlap, then recent recipes.
+    """
+    def setUp(self):
+        self.me, self.a, self.b, self.x, self.y, self.z = (
+            User.objects.create_user(name) for name in ('me', 'a', 'b', 'x', 'y', 'z')
+        )
+        edges = [
+            (self.me, self.a), (self.me, self.b),
+            (self.a, self.x), (self.a, self.y), (self.a, self.me),
+            (self.b, self.x), (self.b, self.z), (self.b, self.a),
+        ]
+        Following.objects.bulk_create(Following(follower=f, following=t) for f, t in edges)
+        Recipe.objects.create(title='Stew', description='d', ingredients='i', instructions='s', author=self.z)
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+
+    def suggested(self):
+        return [(item['user']['username'], item['mutual_count'], item['recent_recipes'])
+                for item in self.client.get('/api/users/suggestions/').data]
+
+    def test_ranking(self):
+        users, written = suggestions.compute_suggestions()
+        self.assertEqual(users, 3)
+        self.assertEqual(self.suggested(), [('x', 2, 0), ('z', 1, 1), ('y', 1, 0)])
+        # a follows `me` back, but nobody is suggested to themselves and b
+        # already follows x; equal scores go to the lower user id.
+        b_suggestions = FollowSuggestion.objects.filter(user=self.b).values_list('suggested__username', flat=True)
+        self.assertEqual(list(b_suggestions.order_by('rank')), ['me', 'y'])
+
+    def test_followed_users_drop_out_until_the_next_run(self):
+        suggestions.compute_suggestions(top_k=2)
+        Following.objects.create(follower=self.me, following=self.x)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.suggested(), [('z', 1, 1)])
+
+    def test_rerun_replaces_lists(self):
+        suggestions.compute_suggestions()
+        Following.objects.filter(follower=self.me).delete()
+        out = StringIO()
+        call_command('compute_follow_suggestions', stdout=out)
+        self.assertIn('for 2 users', out.getvalue())
+        self.assertEqual(self.suggested(), [])
+
+
+class CategoryListTests(TestCase):
+    """
+    Category list counts and previews without loading every recipe.
+    """
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user('alice')
+        self.mains = Category.objects.create(name='Mains')
+        self.empty = Category.objects.create(name='Empty')
+        seed_recipes(5, [self.alice], [self.mains])
+
+    def test_counts_and_newest_previews(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().get('/api/categories/')
+        self.assertEqual(len(queries), 2)
+        self.assertIn('ROW_NUMBER()', queries[1]['sql'])
+        mains, empty = response.data
+        newest = Recipe.objects.order_by('-created_at', '-id').values_list('id', flat=True)[:3]
+        self.assertEqual(mains['recipe_count'], 5)
+        self.assertEqual([recipe['id'] for recipe in mains['latest_recipes']], list(newest))
+        self.assertEqual(mains['latest_recipes'][0]['author'], 'alice')
+        self.assertEqual((empty['recipe_count'], empty['latest_recipes']), (0, []))
+
+    def test_new_recipes_refresh_the_cached_list(self):
+        client = APIClient()
+        client.get('/api/categories/')
+        recipe = Recipe.objects.create(
+            title='Stew', description='d', ingredients='i', instructions='s', author=self.alice, category=self.mains,
+        )
+        mains = client.get('/api/categories/').data[0]
+        self.assertEqual((mains['recipe_count'], mains['latest_recipes'][0]['id']), (6, recipe.pk))
+
+
+class PerformanceMiddlewareTests(TestCase):
+    """
+    Server-Timing headers, the slow query log and the metrics endpoint.
+    """
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user('alice')
+        seed_recipes(3, [self.alice], seed_categories(1))
+        self.client = APIClient()
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_server_timing(self):
+        response = self.client.get('/api/recipes/')
+        timing = dict(entry.split(';', 1) for entry in response['Server-Timing'].split(', '))
+        self.assertIn('desc="2 queries"', timing['db'])
+        self.assertEqual(set(timing), {'db', 'serialize', 'render', 'total'})
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_slow_queries_are_logged_with_their_endpoint(self):
+        with self.assertLogs('recipes.performance', 'WARNING') as logs:
+            self.client.get('/api/categories/')
+        self.assertIn('GET /api/categories/ [category-list]', logs.output[0])
+
+    def test_metrics_endpoint(self):
+        self.client.get('/api/recipes/')
+        self.client.get('/api/recipes/')
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(self.client.get('/api/_metrics').status_code, 403)
+        self.client.force_authenticate(User.objects.create_user('admin', is_staff=True))
+        response = self.client.get('/api/_metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE recipehub_request_duration_seconds histogram', body)
+        self.assertIn('recipehub_request_duration_seconds_bucket{view="recipe-list-create",method="GET",le="+Inf"}', body)
+        self.assertIn('recipehub_db_queries_count{view="recipe-list-create"}', body)
+        self.assertIn('recipehub_response_cache_lookups_total{view="RecipeListCreateView",result="hit"}', body)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BenchmarkSuiteTests(TestCase):
+    """
+    The synthetic dataset and the every-endpoint benchmark runner, at toy scale.
+    """
+    def test_seed_dataset(self):
+        dataset = seed_dataset(30, 300, 3, celebrity_followers=10, password='pw')
+        self.assertFalse(dataset.reader.is_staff)
+        self.assertTrue(dataset.reader.check_password('pw'))
+        self.assertEqual(Following.objects.filter(follower=dataset.reader).count(), 30)
+        self.assertEqual(Recipe.objects.filter(author__username__startswith='seed_user_').count(), 300)
+        # The most followed authors are pulled on read, the rest fanned out.
+        self.assertTrue(FeedEntry.objects.filter(owner=dataset.reader).exists())
+        self.assertTrue(Recipe.objects.filter(fanned_out=False).exists())
+        self.assertTrue(Recipe.objects.filter(trending_score__gt=0).exists())
+        self.assertTrue(FollowSuggestion.objects.exists())
+        top = dataset.users[0]
+        self.assertEqual(top.stats.recipes_count, Recipe.objects.filter(author=top).count())
+        self.assertEqual(top.stats.followers_count, Following.objects.filter(following=top).count())
+
+    def test_seed_data_needs_debug_or_force(self):
+        with self.assertRaisesMessage(CommandError, '--force'):
+            call_command('seed_data', users=5, recipes=10, stdout=StringIO())
+        self.assertFalse(User.objects.filter(username=BENCH_USERNAME).exists())
+
+        output = StringIO()
+        call_command('seed_data', users=5, recipes=10, categories=2, force=True, stdout=output)
+        password = output.getvalue().split(f'{BENCH_USERNAME} / ')[1].split('.')[0]
+        self.assertTrue(User.objects.get(username=BENCH_USERNAME).check_password(password))
+
+    def test_every_route_is_benchmarked(self):
+        self.assertEqual(uncovered_routes(), set())
+
+    def test_queries_from_server_timing(self):
+        self.assertEqual(queries_from('db;dur=1.2;desc="3 queries", total;dur=4.0'), 3)
+        self.assertIsNone(queries_from('total;dur=4.0'))
+
+    def test_bench_api(self):
+        with tempfile.NamedTemporaryFile('r', suffix='.json') as output:
+            call_command(
+                'bench_api', users=20, recipes=100, requests=2, warmup=0, output=output.name, stdout=StringIO(),
+            )
+            results = json.load(output)
+        self.assertEqual(len(results['routes']), 24)
+        for route in results['routes']:
+            self.assertTrue(all(code.startswith('2') for code in route['statuses']), route)
+            self.assertLessEqual(route['p50_ms'], route['p99_ms'])
+        # Everything the run seeded or wrote was rolled back.
+        self.assertFalse(User.objects.filter(username=BENCH_USERNAME).exists())
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0, ENGAGEMENT_FLUSH_SECONDS=3600)
+class AsyncViewTests(TestCase):
+    """
+    The async read views through the ASGI request path (`AsyncClient`):
+    a synchronous query on the event loop would raise
+    SynchronousOnlyOperation. Responses must match the WSGI path's.
+    """
+    urls = [
+        '/api/feed/',
+        '/api/feed/?page_size=2',
+        '/api/recipes/',
+        '/api/recipes/?page_size=2',
+        '/api/my_recipes/',
+        '/api/recipes/{recipe}/',
+        '/api/categories/',
+        '/api/categories/{category}/',
+        '/api/users/follow-status/?ids={cook},{reader}',
+        '/api/users/{cook}/is-following/',
+    ]
+
+    def setUp(self):
+        self.reader = User.objects.create_user('reader')
+        self.cook = User.objects.create_user('cook')
+        categories = seed_categories(2)
+        seed_recipes(5, [self.reader, self.cook], categories)
+        Following.objects.create(follower=self.reader, following=self.cook)
+        self.values = {
+            'recipe': Recipe.objects.values_list('pk', flat=True).first(),
+            'category': categories[0].pk,
+            'cook': self.cook.pk,
+            'reader': self.reader.pk,
+        }
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.reader)}'}
+
+    def test_views_are_async(self):
+        self.assertTrue(FeedView.view_is_async)
+
+    async def test_async_responses_match_sync(self):
+        client = AsyncClient()
+        for url in self.urls:
+            url = url.format(**self.values)
+            with self.subTest(url=url):
+                response = await client.get(url, headers=self.headers)
+                self.assertEqual(response.status_code, 200)
+                sync_response = await sync_to_async(self.client.get)(url, headers=self.headers)
+                self.assertEqual(response.json(), sync_response.json())
+
+    async def test_server_timing_counts_async_queries(self):
+        response = await AsyncClient().get('/api/categories/')
+        timing = dict(entry.split(';', 1) for entry in response['Server-Timing'].split(', '))
+        self.assertIn('desc="2 queries"', timing['db'])
+
+    async def test_not_found_and_writes(self):
+        client = AsyncClient()
+        response = await client.get('/api/recipes/999999/', headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+        response = await client.get('/api/users/999999/is-following/', headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+        # POST on an async list view runs the sync create in a thread.
+        response = await client.post('/api/recipes/', {
+            'title': 't', 'description': 'd', 'ingredients': 'i', 'instructions': 's',
+            'category': self.values['category'],
+        }, content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(await Recipe.objects.filter(title='t', author=self.reader).aexists())
+
+
+@override_settings(JWT_AUTH_SHARED_CACHE=True)
+class CachedJWTAuthenticationTests(TestCase):
+    """
+    `CachedJWTAuthentication`: one user lookup per token until the user
+    changes or logs out, and none for reads in claims mode. The tests run
+    in one process, so the local-memory cache counts as shared.
+    """
+    def setUp(self):
+        self.reader = User.objects.create_user('reader', password='reader-password')
+        self.cook = User.objects.create_user('cook')
+        self.url = f'/api/users/{self.cook.pk}/is-following/'
+        self.recipe = {
+            'title': 't', 'description': 'd', 'ingredients': 'i', 'instructions': 's',
+            'category': seed_categories(1)[0].pk,
+        }
+
+    def login(self):
+        response = self.client.post('/auth/token/', {'username': 'reader', 'password': 'reader-password'})
+        return {'Authorization': f"Bearer {response.json()['access']}"}
+
+    def get(self, url, headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, headers=headers)
+        return response.status_code, len(queries)
+
+    def test_user_is_looked_up_once_per_token(self):
+        headers = self.login()
+        status, first = self.get(self.url, headers)
+        self.assertEqual(status, 200)
+        self.assertEqual(self.get(self.url, headers), (200, first - 1))
+        # Another token is looked up again
+        self.assertEqual(self.get(self.url, self.login()), (200, first))
+
+    @override_settings(JWT_AUTH_SHARED_CACHE=None)
+    def test_per_process_cache_looks_the_user_up_every_time(self):
+        self.assertFalse(authentication.shared_cache())
+        headers = self.login()
+        status, first = self.get(self.url, headers)
+        self.assertEqual(self.get(self.url, headers), (status, first))
+        self.reader.is_active = False
+        self.reader.save(update_fields=['is_active'])
+        self.assertEqual(self.client.get(self.url, headers=headers).status_code, 401)
+
+    def test_cached_user_is_a_projection(self):
+        headers = self.login()
+        self.get('/api/my_recipes/', headers)
+        response = self.client.post('/api/recipes/', self.recipe, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['author'], 'reader')
+        self.assertEqual(self.client.get('/api/my_recipes/', headers=headers).json()[0]['title'], 't')
+
+    def test_user_changes_invalidate(self):
+        headers = self.login()
+        _, first = self.get(self.url, headers)
+        self.reader.set_password('another-password')
+        self.reader.save()
+        self.assertEqual(self.get(self.url, headers), (200, first))
+        self.reader.is_active = False
+        self.reader.save()
+        self.assertEqual(self.client.get(self.url, headers=headers).status_code, 401)
+
+    def test_logout_revokes_the_token(self):
+        headers = self.login()
+        self.assertEqual(self.client.get(self.url, headers=headers).status_code, 200)
+        self.assertEqual(self.client.post('/auth/logout/', headers=headers).status_code, 200)
+        response = self.client.get(self.url, headers=headers)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'token_revoked')
+        self.assertEqual(self.client.get(self.url, headers=self.login()).status_code, 200)
+
+    @override_settings(JWT_AUTH_MODE='claims')
+    def test_claims_mode_reads_skip_the_lookup(self):
+        # A token without the user claims is looked up as usual
+        _, looked_up = self.get(self.url, {'Authorization': f'Bearer {AccessToken.for_user(self.reader)}'})
+        headers = self.login()
+        self.assertEqual(self.get(self.url, headers), (200, looked_up - 1))
+        # Writes still load the user
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/recipes/', self.recipe, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(any('"auth_user"."password"' in query['sql'] for query in queries))
+
+    @override_settings(JWT_AUTH_CACHE_SIZE=2)
+    def test_lru_is_bounded_and_expires(self):
+        lru = authentication.ExpiringLRU()
+        later = timezone.now().timestamp() + 60
+        lru.set('a', 1, later)
+        lru.set('b', 2, later)
+        lru.get('a')
+        lru.set('c', 3, later)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+        lru.set('d', 4, later - 120)
+        self.assertIsNone(lru.get('d'))
+
+
+class RecipeImageTests(TestCase):
+    """
+    Image uploads: streamed to storage, resized to WebP variants, and only
+    the variants ever shown.
+    """
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+            },
+            MEDIA_ROOT=media.name, RECIPE_IMAGE_WORKERS=0, RECIPE_IMAGE_WIDTHS=[320, 640, 1280],
+            RESPONSE_CACHE_TIMEOUT=0,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.media = media.name
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.recipe = Recipe.objects.create(
+            author=self.alice, title='Stew', description='d', ingredients='i', instructions='s',
+        )
+        self.url = f'/api/recipes/{self.recipe.pk}/image/'
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def photo(self, size=(1000, 750), format='JPEG'):
+        output = BytesIO()
+        Image.new('RGB', size, (200, 120, 40)).save(output, format)
+        return SimpleUploadedFile(f'photo.{format.lower()}', output.getvalue(), f'image/{format.lower()}')
+
+    def upload(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.put(self.url, {'image': image}, format='multipart')
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media)
+            for root, _, names in os.walk(self.media) for name in names
+        )
+
+    def test_upload_makes_variants(self):
+        response = self.upload(self.photo())
+        self.assertEqual(response.status_code, 202)
+        self.recipe.refresh_from_db()
+        original = self.recipe.image.name
+        self.assertTrue(original.startswith(f'recipes/{self.recipe.pk}/'))
+        sources = self.recipe.image_variants['sources']
+        # No upscaling: the original width stands in for 1280
+        self.assertEqual(sorted(sources['image/webp'], key=int), ['320', '640', '1000'])
+        for name in sources['image/webp'].values():
+            with default_storage.open(name) as variant, Image.open(variant) as image:
+                self.assertEqual(image.format, 'WEBP')
+        image = self.client.get('/api/recipes/?page_size=5').json()['results'][0]['image']
+        self.assertEqual((image['width'], image['height']), (1000, 750))
+        self.assertIn('640w', image['srcset']['image/webp'])
+        self.assertTrue(image['src'].endswith('-320w.webp'))
+        self.assertNotIn(original, json.dumps(image))
+        self.assertNotIn(original, self.client.get(f'/api/recipes/{self.recipe.pk}/').content.decode())
+
+    def test_src_falls_back_to_the_original_without_webp(self):
+        with mock.patch.object(images, 'FORMATS', [('AVIF', 'image/avif', 'avif')]):
+            self.upload(self.photo())
+        self.recipe.refresh_from_db()
+        data = images.image_data(self.recipe.image_variants)
+        self.assertNotIn('image/webp', data['srcset'])
+        self.assertTrue(data['src'].endswith(self.recipe.image.name))
+
+    def test_failed_upload_leaves_no_files(self):
+        with mock.patch.object(images, 'submit', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            self.upload(self.photo())
+        self.assertEqual(self.stored_files(), [])
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_only_the_author_can_upload(self):
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(self.upload(self.photo()).status_code, 403)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.upload(self.photo()).status_code, 401)
+
+    def test_rejects_large_and_invalid_files(self):
+        with override_settings(RECIPE_IMAGE_MAX_BYTES=1024):
+            self.assertEqual(self.upload(self.photo((2000, 1500))).status_code, 413)
+        invalid = SimpleUploadedFile('photo.jpg', b'not an image', 'image/jpeg')
+        self.assertEqual(self.upload(invalid).status_code, 400)
+        self.assertEqual(self.stored_files(), [])
+
+    def test_replace_and_delete_remove_files(self):
+        self.upload(self.photo())
+        first = self.stored_files()
+        self.upload(self.photo((400, 300), 'PNG'))
+        second = self.stored_files()
+        self.assertFalse(set(first) & set(second))
+        self.assertEqual(len(second), 3)  # original, 320 and 400 wide
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.assertEqual(self.stored_files(), [])
+        self.upload(self.photo())
+        self.recipe.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.delete()
+        self.assertEqual(self.stored_files(), [])
+
+    def test_generate_thumbnails_fills_missing_variants(self):
+        self.recipe.image.save('photo.jpg', self.photo(), save=False)
+        self.recipe.save()
+        self.assertIsNone(self.client.get(f'/api/recipes/{self.recipe.pk}/').json()['image'])
+        output = StringIO()
+        call_command('generate_thumbnails', stdout=output)
+        self.assertIn('Made variants for 1 images', output.getvalue())
+        self.assertIsNotNone(self.client.get(f'/api/recipes/{self.recipe.pk}/').json()['image'])
+        self.assertEqual(images.variant_widths(200), [200])
+
+
+@jobs.task
+def record_call(calls, fail=False):
+    JobQueueTests.calls.append(calls)
+    if fail:
+        raise RuntimeError('boom')
+
+
+@override_settings(JOBS_INLINE=False)
+class JobQueueTests(TestCase):
+    """
+    Feed and ingredient upkeep as background jobs: enqueued on commit,
+    claimed in batches, retried with backoff.
+    """
+    calls = []
+
+    def setUp(self):
+        JobQueueTests.calls = []
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        Following.objects.create(follower=self.bob, following=self.alice)
+        Job.objects.all().delete()
+
+    def create_recipe(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Recipe.objects.create(
+                author=self.alice, title='Stew', description='d', ingredients='2 onions', instructions='s',
+            )
+
+    def run_jobs(self):
+        total = 0
+        while sum(counts := jobs.work()):
+            total += counts[0]
+        return total
+
+    def test_writes_enqueue_jobs_on_commit(self):
+        recipe = self.create_recipe()
+        self.assertEqual(
+            sorted(Job.objects.values_list('task', flat=True)),
+            ['recipes.feed.fan_out_new_recipe', 'recipes.ingredients.index_recipe'],
+        )
+        self.assertFalse(FeedEntry.objects.exists())
+        # Not fanned out yet, so the feed pulls it in at read time
+        self.assertEqual(list(feed.pulled_recipes(self.bob)), [recipe])
+        self.assertEqual(self.run_jobs(), 2)
+        self.assertEqual(list(FeedEntry.objects.values_list('owner', 'recipe')), [(self.bob.pk, recipe.pk)])
+        self.assertTrue(RecipeIngredient.objects.filter(recipe=recipe).exists())
+        self.assertFalse(Job.objects.exists())
+
+    def test_rolled_back_writes_enqueue_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                Recipe.objects.create(author=self.alice, title='t', description='d', ingredients='i', instructions='s')
+                raise RuntimeError
+        self.assertFalse(Job.objects.exists())
+
+    def test_follow_then_unfollow_ends_unfollowed(self):
+        carol = User.objects.create_user('carol')
+        self.create_recipe()
+        self.run_jobs()
+        with self.captureOnCommitCallbacks(execute=True):
+            follow = Following.objects.create(follower=carol, following=self.alice)
+        with self.captureOnCommitCallbacks(execute=True):
+            follow.delete()
+        # Run the unfollow's job first
+        Job.objects.filter(pk=Job.objects.order_by('id').first().pk).update(run_at=timezone.now() + timedelta(hours=1))
+        self.run_jobs()
+        Job.objects.update(run_at=timezone.now())
+        self.run_jobs()
+        self.assertFalse(FeedEntry.objects.filter(owner=carol).exists())
+
+    def test_claims_are_batched_and_exclusive(self):
+        Job.objects.bulk_create(Job(task=jobs.task_name(record_call), payload={'calls': i}) for i in range(5))
+        first = jobs.claim(3)
+        second = jobs.claim(3)
+        self.assertEqual([job.payload['calls'] for job in first], [0, 1, 2])
+        self.assertEqual([job.payload['calls'] for job in second], [3, 4])
+        self.assertEqual(jobs.claim(3), [])
+        # A claim held past the timeout is taken over
+        Job.objects.filter(pk=first[0].pk).update(claimed_at=timezone.now() - timedelta(hours=1))
+        retaken, = jobs.claim(3)
+        self.assertEqual((retaken.pk, retaken.attempts), (first[0].pk, 2))
+
+    @override_settings(JOBS_MAX_ATTEMPTS=2, JOBS_RETRY_SECONDS=60)
+    def test_failures_are_retried_with_backoff(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.enqueue(record_call, calls=1, fail=True)
+        with self.assertLogs('recipes.jobs', 'ERROR'):
+            self.assertEqual(jobs.work(), (0, 1))
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertIn('RuntimeError: boom', job.last_error)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=40))
+        self.assertEqual(jobs.work(), (0, 0))
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('recipes.jobs', 'ERROR'):
+            self.assertEqual(jobs.work(), (0, 1))
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+        self.assertEqual(jobs.work(), (0, 0))
+        self.assertEqual(self.calls, [1, 1])
+
+    def test_only_registered_tasks(self):
+        with self.assertRaises(ValueError):
+            jobs.enqueue(print)
+        Job.objects.create(task='recipes.tests.missing')
+        with self.assertLogs('recipes.jobs', 'ERROR') as logs:
+            self.assertEqual(jobs.work(), (0, 1))
+        self.assertIn('Unknown task recipes.tests.missing', logs.output[0])
+
+    @override_settings(JOBS_INLINE=True)
+    def test_inline_runs_right_away(self):
+        recipe = Recipe.objects.create(
+            author=self.alice, title='Stew', description='d', ingredients='2 onions', instructions='s',
+        )
+        self.assertFalse(Job.objects.exists())
+        self.assertTrue(FeedEntry.objects.filter(recipe=recipe).exists())
+
+
+@override_settings(JOBS_INLINE=False)
+class JobWorkerTests(TransactionTestCase):
+    """
+    `run_worker` and workers claiming from the same table at once.
+    """
+    def test_run_worker_drains_the_queue(self):
+        Job.objects.bulk_create(Job(task=jobs.task_name(record_call), payload={'calls': i}) for i in range(25))
+        Job.objects.create(task=jobs.task_name(record_call), payload={'calls': 0, 'fail': True})
+        output = StringIO()
+        with self.assertLogs('recipes.jobs', 'ERROR'):
+            call_command('run_worker', '--burst', '--batch-size', '10', stdout=output)
+        self.assertIn('Ran 26 jobs (1 failed)', output.getvalue())
+        self.assertEqual(list(Job.objects.values_list('status', flat=True)), [Job.PENDING])
+
+    def test_concurrent_workers_run_each_job_once(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('needs PostgreSQL or a file-backed SQLite test database')
+        JobQueueTests.calls = []
+        Job.objects.bulk_create(Job(task=jobs.task_name(record_call), payload={'calls': i}) for i in range(200))
+
+        def work(_):
+            try:
+                while sum(jobs.work(7)):
+                    pass
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(work, range(4)))
+        self.assertEqual(sorted(JobQueueTests.calls), list(range(200)))
+        self.assertFalse(Job.objects.exists())
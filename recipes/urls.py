@@ -1,17 +1,32 @@
 from django.urls import path
 from .views import (
-    RecipeListCreateView, RecipeDetailView, CategoryListView,
-    CategoryDetailView,
-    FeedView, follow_user, UserListView, check_follow_status,
+    RecipeListCreateView, RecipeDetailView, RecipeBulkView, RecipeImageView,
+    RecipeSearchView, RecipesByIngredientsView, TrendingRecipesView, save_recipe,
+    CategoryListView,
+    CategoryDetailView, CacheStatsView, MetricsView,
+    FeedView, follow_user, bulk_follow, FollowStatusView, UserListView, FollowSuggestionListView,
+    CheckFollowStatusView,
 )
 
 urlpatterns = [
     path('feed/', FeedView.as_view(), name='user-feed'),
     path('recipes/', RecipeListCreateView.as_view(), name='recipe-list-create'),
+    path('recipes/bulk/', RecipeBulkView.as_view(), name='recipe-bulk'),
+    path('recipes/search/', RecipeSearchView.as_view(), name='recipe-search'),
+    path('recipes/by-ingredients/', RecipesByIngredientsView.as_view(), name='recipes-by-ingredients'),
+    path('my_recipes/', RecipeListCreateView.as_view(), name='my-recipes'),
+    path('recipes/trending/', TrendingRecipesView.as_view(), name='recipe-trending'),
     path('recipes/<int:pk>/', RecipeDetailView.as_view(), name='recipe-detail'),
+    path('recipes/<int:pk>/image/', RecipeImageView.as_view(), name='recipe-image'),
+    path('recipes/<int:pk>/save/', save_recipe, name='recipe-save'),
     path('categories/', CategoryListView.as_view(), name='category-list'),
     path('categories/<int:pk>/', CategoryDetailView.as_view(), name='category-detail'),
     path('users/', UserListView.as_view(), name='user-list'),
+    path('users/follow/', bulk_follow, name='bulk-follow'),
+    path('users/follow-status/', FollowStatusView.as_view(), name='follow-status'),
+    path('users/suggestions/', FollowSuggestionListView.as_view(), name='follow-suggestions'),
     path('users/<int:user_id>/follow/', follow_user, name='follow-user'),
-    path('users/<int:user_id>/is-following/', check_follow_status, name='check-follow-status'),
+    path('users/<int:user_id>/is-following/', CheckFollowStatusView.as_view(), name='check-follow-status'),
+    path('cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('_metrics', MetricsView.as_view(), name='metrics'),
 ]
@@ -1,35 +1,115 @@
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Exists, F, Max, OuterRef, Prefetch, Subquery
+import logging
+import sys
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.generics import ListAPIView
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .models import Recipe, Following, Category
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+from .models import Recipe, Following, FollowSuggestion, Category, UserStats
 from .serializers import RecipeSerializer, FollowingSerializer
 from django.shortcuts import get_object_or_404
 from rest_framework import generics, status, permissions
 from .serializers import (
-    RecipeSerializer, CategorySerializer,
-    FollowingSerializer, UserSerializer,
+    RecipeSerializer, RecipeListSerializer, CategorySerializer, CategoryListSerializer,
+    FollowingSerializer, FollowSuggestionSerializer, UserSerializer, UserFollowStatusSerializer,
+    RecipeImageSerializer,
 )
 from rest_framework.permissions import (
     IsAuthenticatedOrReadOnly, IsAuthenticated, AllowAny
 )
 from .permissions import IsAuthorOrReadOnly
+from .pagination import RecipeCursorPagination, TrendingCursorPagination, UsernameCursorPagination
+from .mixins import (
+    AsyncDispatchMixin, CachedResponseMixin, ConditionalGetMixin, RecipeOwnershipMixin,
+    make_etag, set_validator_headers,
+)
+from . import bulk, cache, engagement, fastpath, feed, follows, images, ingredients, metrics
+from .search import search_recipes
+
+logger = logging.getLogger(__name__)
 
 
-class RecipeListCreateView(generics.ListCreateAPIView):
+class RecipeListCreateView(AsyncDispatchMixin, RecipeOwnershipMixin, ConditionalGetMixin, CachedResponseMixin,
+                           generics.ListCreateAPIView):
     """
     List all recipes or create a new one.
     Authenticated users can create; all users can view.
+    Lists are compact (no description, ingredients or instructions)
+    unless `?fields=` asks for them. GET is async; POST runs in a thread.
     """
-    serializer_class = RecipeSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = RecipeCursorPagination
+
+    def get_cache_scopes(self):
+        """
+        Author-filtered lists only change with that author's recipes;
+        an unknown author's (empty) list changes with any recipe.
+        """
+        if "my_recipes" in self.request.path and self.request.user.is_authenticated:
+            return ['categories', cache.author_scope(self.request.user.pk)]
+        author = self.request.query_params.get('author')
+        author_id = cache.author_id(author) if author else None
+        return ['categories', cache.author_scope(author_id) if author_id is not None else 'recipes']
+
+    async def get(self, request, *args, **kwargs):
+        return await super().get(request, *args, **kwargs)
+
+    async def aget_validators(self):
+        """
+        A cursor page is identified by its own rows: (id, updated_at,
+        category updated_at) and whether a next page exists, read with the
+        same keyset range scan as the page. The unpaginated list uses the
+        count, newest id and newest edit of the filtered recipes, since
+        every create, edit or delete changes at least one; category
+        renames show up through the newest `Category.updated_at`.
+        """
+        if self.paginator.is_requested(self.request):
+            paginator = self.pagination_class()
+            rows = await paginator.apaginate_queryset(
+                self.get_queryset().values_list('id', 'updated_at', 'category__updated_at'), self.request,
+            )
+            return (tuple(rows), paginator.has_next), None
+
+        newest_category = Category.objects.order_by('-updated_at').values('updated_at')[:1]
+        stats = await self.get_queryset().order_by().aaggregate(
+            count=Count('id'), newest=Max('id'), updated=Max('updated_at'),
+            categories=Max(Subquery(newest_category)),
+        )
+        return (stats['count'], stats['newest'], stats['updated'], stats['categories']), None
+
+    def get_serializer_class(self):
+        return RecipeListSerializer if self.request.method == 'GET' else RecipeSerializer
+
+    async def list(self, request, *args, **kwargs):
+        """
+        Build the list from values() rows (see `recipes/fastpath.py`);
+        the output is the same as the serializer's.
+        """
+        rows = fastpath.RecipeRows(self.get_serializer_class(), request)
+        queryset = rows.values(self.filter_queryset(self.get_queryset()))
+        page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        if page is not None:
+            return self.get_paginated_response(rows.serialize(page))
+        return Response(rows.serialize([row async for row in queryset]))
 
     def get_queryset(self):
         """
         Fetch either all recipes, recipes by author, or recipes filtered by category.
+        Always newest first with `id` as tie-breaker so cursor pages are stable.
         """
-        queryset = Recipe.objects.select_related('category')
+        queryset = Recipe.objects.select_related('author', 'category').order_by('-created_at', '-id')
+        if self.request.method == 'GET':
+            serializer_class = self.get_serializer_class()
+            queryset = queryset.only(*serializer_class.model_fields(serializer_class.selected_fields(self.request)))
         user = self.request.user
         author = self.request.query_params.get('author')
         category_id = self.request.query_params.get('category')
@@ -49,15 +129,161 @@ class RecipeListCreateView(generics.ListCreateAPIView):
         serializer.save(author=self.request.user)
 
 
-class RecipeDetailView(generics.RetrieveUpdateDestroyAPIView):
+class RecipeBulkView(APIView):
+    """
+    POST a JSON Lines body (one recipe object per line) to create recipes
+    as the logged-in user; rows are validated and inserted in chunks and
+    per-line errors are reported. GET streams the recipes of `?author=`
+    and/or `?category=` back as JSON Lines.
+    """
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+
+    def post(self, request):
+        report = bulk.import_recipes(request.stream or [], request.user, context={'request': request})
+        created = report['created'] or not report['failed']
+        return Response(report, status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
+    def get(self, request):
+        author = request.query_params.get('author')
+        category_id = request.query_params.get('category')
+        if not author and not category_id:
+            return Response({'error': 'author or category is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if category_id and not category_id.isdigit():
+            return Response({'error': 'category must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = Recipe.objects.all()
+        if author:
+            queryset = queryset.filter(author__username=author)
+        if category_id:
+            queryset = queryset.filter(category_id=category_id)
+        # Under ASGI a sync iterator would be read whole before the first byte
+        # is sent. Every WSGI server sets wsgi.input (PEP 3333); ASGI has no such key.
+        export = bulk.export_lines if 'wsgi.input' in request.META else bulk.aexport_lines
+        return StreamingHttpResponse(export(queryset), content_type='application/x-ndjson')
+
+
+class RecipeSearchView(APIView):
+    """
+    Ranked full-text search over recipe titles, ingredients and descriptions.
+    Each word in `?q=` is matched as a prefix; page with `?page_size=` and `?offset=`.
+    """
+    permission_classes = [permissions.AllowAny]
+    page_size = 20
+    max_page_size = 100
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        try:
+            page_size = min(max(int(request.query_params.get('page_size', self.page_size)), 1), self.max_page_size)
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+        except ValueError:
+            return Response({'error': 'page_size and offset must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        recipes = search_recipes(query, page_size + 1, offset) if query else []
+        has_next = len(recipes) > page_size
+        serializer = RecipeSerializer(recipes[:page_size], many=True, context={'request': request})
+
+        next_url = None
+        if has_next:
+            next_url = replace_query_param(request.build_absolute_uri(), 'offset', offset + page_size)
+        return Response({'next': next_url, 'results': serializer.data}, status=status.HTTP_200_OK)
+
+
+class RecipesByIngredientsView(APIView):
+    """
+    "What can I cook with": recipes using `?include=chicken,rice` and none of
+    `?exclude=nuts`, ranked by how many included ingredients they use.
+    `?match=all` only returns recipes using every included ingredient.
+    """
+    permission_classes = [permissions.AllowAny]
+    default_limit = 20
+    max_limit = 100
+
+    def get(self, request):
+        def terms(param):
+            return [term.strip() for term in request.query_params.get(param, '').split(',') if term.strip()]
+
+        include, exclude = terms('include'), terms('exclude')
+        if not include:
+            return Response({'error': 'include is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', self.default_limit)), 1), self.max_limit)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        ranked = ingredients.recipes_with(
+            include, exclude, match_all=request.query_params.get('match') == 'all', limit=limit,
+        )
+        recipes = Recipe.objects.select_related('author', 'category').in_bulk([pk for pk, _ in ranked])
+        results = []
+        for pk, matched in ranked:
+            if pk not in recipes:  # deleted since it was ranked
+                continue
+            data = RecipeSerializer(recipes[pk], context={'request': request}).data
+            data['matched_ingredients'] = matched
+            data['coverage'] = round(matched / len(include), 3)
+            results.append(data)
+        return Response(results, status=status.HTTP_200_OK)
+
+
+class RecipeDetailView(AsyncDispatchMixin, RecipeOwnershipMixin, ConditionalGetMixin, CachedResponseMixin,
+                       generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update, or delete a recipe by ID.
     Restricted to the author for edits; read-only for others.
+    PUT/PATCH honour `If-Match` with the ETag from a previous GET.
+    GET is async; writes run in a thread.
     """
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
 
+    def get_cache_scopes(self):
+        return ['categories', f"recipe:{self.kwargs['pk']}"]
+
+    async def get(self, request, *args, **kwargs):
+        response = await super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            await engagement.arecord(int(self.kwargs['pk']), views=1)
+        return response
+
+    async def retrieve(self, request, *args, **kwargs):
+        return Response(self.get_serializer(await self.aget_object()).data)
+
+    def validator_row(self):
+        return Recipe.objects.filter(pk=self.kwargs['pk']).values_list(
+            'updated_at', 'category__updated_at', 'author__username',
+        )
+
+    @staticmethod
+    def validators_from(row):
+        if row is None:
+            return None
+        return row, max(filter(None, row[:2]))
+
+    def get_validators(self):
+        return self.validators_from(self.validator_row().first())
+
+    async def aget_validators(self):
+        return self.validators_from(await self.validator_row().afirst())
+
+    def update(self, request, *args, **kwargs):
+        """
+        Optimistic concurrency: with `If-Match` (or `If-Unmodified-Since`)
+        the row is locked and the update only goes ahead if the client saw
+        the current version, 412 Precondition Failed otherwise.
+        """
+        with transaction.atomic():
+            self.get_object()
+            if 'HTTP_IF_MATCH' in request.META or 'HTTP_IF_UNMODIFIED_SINCE' in request.META:
+                list(Recipe.objects.select_for_update().filter(pk=self.kwargs['pk']).values_list('pk'))
+                response = self.check_preconditions(self.get_validators())
+                if response is not None:
+                    return response
+            response = super().update(request, *args, **kwargs)
+        state, last_modified = self.get_validators()
+        return set_validator_headers(response, self.get_etag(state), last_modified)
+
     def get_serializer_context(self):
         """
         Ensures `request` is passed into the serializer,
@@ -72,23 +298,145 @@ class RecipeDetailView(generics.RetrieveUpdateDestroyAPIView):
 
     def get_queryset(self):
         """
-        Ensure the API returns the category name instead of just ID.
+        Join author and category so the serializer needs no extra queries;
+        reads skip the columns `?fields=` / `?omit=` leave out.
         """
-        return Recipe.objects.select_related('category')
+        queryset = Recipe.objects.select_related('author', 'category')
+        if self.request.method == 'GET':
+            queryset = queryset.only(*RecipeSerializer.model_fields(RecipeSerializer.selected_fields(self.request)))
+        return queryset
+
 
+class ImageTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Image too large.'
+    default_code = 'image_too_large'
 
-class CategoryListView(generics.ListAPIView):
+
+class RecipeImageView(generics.GenericAPIView):
     """
-    List all recipe categories.
+    PUT a multipart `image` to set or replace a recipe's image, DELETE to
+    remove it (author only). The upload goes to a temporary file as it
+    arrives and from there to storage; the resized variants the API shows
+    are made after the response (see `recipes/images.py`), so `image` is
+    null until they are ready.
     """
-    serializer_class = CategorySerializer
+    queryset = Recipe.objects.all()
+    serializer_class = RecipeImageSerializer
+    permission_classes = [permissions.IsAuthenticated, IsAuthorOrReadOnly]
+    parser_classes = [MultiPartParser]
+
+    def put(self, request, pk):
+        recipe = self.get_object()
+        handler = images.ImageUploadHandler(request)
+        request.upload_handlers = [handler]
+        serializer = self.get_serializer(data=request.data)
+        if handler.too_large:
+            raise ImageTooLarge(f'Images can be at most {images.max_bytes() // (1024 * 1024)} MB.')
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data['image']
+        replaced = [recipe.image.name, *images.variant_names(recipe.image_variants)]
+        # Storage is not transactional: write the file first and delete it
+        # again if the row is not updated.
+        recipe.image.save(upload.name, upload, save=False)
+        try:
+            with transaction.atomic():
+                recipe.image_variants = {}
+                recipe.save(update_fields=['image', 'image_variants', 'updated_at'])
+                transaction.on_commit(lambda: images.delete_files(replaced))
+                images.submit(recipe.pk)
+        except Exception:
+            images.delete_files([recipe.image.name])
+            raise
+        recipe.refresh_from_db(fields=['image_variants'])
+        return Response({'image': images.image_data(recipe.image_variants)}, status=status.HTTP_202_ACCEPTED)
+
+    def delete(self, request, pk):
+        recipe = self.get_object()
+        removed = [recipe.image.name, *images.variant_names(recipe.image_variants)]
+        with transaction.atomic():
+            recipe.image = ''
+            recipe.image_variants = {}
+            recipe.save(update_fields=['image', 'image_variants', 'updated_at'])
+            transaction.on_commit(lambda: images.delete_files(removed))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class TrendingRecipesView(RecipeOwnershipMixin, CachedResponseMixin, generics.ListAPIView):
+    """
+    Recipes by `trending_score` (see `recipes/engagement.py`), optionally
+    in one `?category=<id>`; one range read over the trending indexes.
+    """
+    serializer_class = RecipeListSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = TrendingCursorPagination
+
+    def get_cache_scopes(self):
+        return ['categories', 'recipes', 'trending']
 
     def get_queryset(self):
-        return Category.objects.prefetch_related('recipes')
+        queryset = Recipe.objects.filter(trending_score__gt=0).select_related('author', 'category')
+        category_id = self.request.query_params.get('category')
+        if category_id:
+            if not category_id.isdigit():
+                raise ValidationError({'category': 'Must be a category id.'})
+            queryset = queryset.filter(category_id=category_id)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        rows = fastpath.RecipeRows(self.get_serializer_class(), request)
+        queryset = rows.values(self.get_queryset(), 'trending_score')
+        return self.get_paginated_response(rows.serialize(self.paginate_queryset(queryset)))
 
 
-class CategoryDetailView(generics.RetrieveAPIView):
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def save_recipe(request, pk):
+    """
+    Count a save of the recipe towards its trending score.
+    """
+    if not Recipe.objects.filter(pk=pk).exists():
+        raise NotFound('Recipe not found.')
+    engagement.record(pk, saves=1)
+    return Response({'detail': 'Save recorded'}, status=status.HTTP_202_ACCEPTED)
+
+
+class CategoryListView(AsyncDispatchMixin, CachedResponseMixin, generics.ListAPIView):
+    """
+    List all recipe categories with their recipe count and newest
+    `preview_size` recipes. The count is an aggregate over the
+    category index and the previews a sliced prefetch (one
+    ROW_NUMBER() window query), so memory and queries grow with the
+    number of categories, not recipes.
+    """
+    serializer_class = CategoryListSerializer
+    permission_classes = [permissions.AllowAny]
+    preview_size = 3
+
+    def get_cache_scopes(self):
+        return ['categories', 'recipes']
+
+    async def get(self, request, *args, **kwargs):
+        return await super().get(request, *args, **kwargs)
+
+    async def list(self, request, *args, **kwargs):
+        categories = [category async for category in self.filter_queryset(self.get_queryset())]
+        return Response(self.get_serializer(categories, many=True).data)
+
+    def get_queryset(self):
+        latest = (
+            Recipe.objects.select_related('author')
+            .only('id', 'title', 'created_at', 'category', 'author__username')
+            .order_by('-created_at', '-id')
+        )
+        return (
+            Category.objects.annotate(recipe_count=Count('recipes'))
+            .prefetch_related(Prefetch('recipes', queryset=latest[:self.preview_size], to_attr='latest_recipes'))
+            .order_by('id')
+        )
+
+
+class CategoryDetailView(AsyncDispatchMixin, CachedResponseMixin, generics.RetrieveAPIView):
     """
     Retrieve a single category by ID.
     """
@@ -96,77 +444,331 @@ class CategoryDetailView(generics.RetrieveAPIView):
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny]
 
+    def get_cache_scopes(self):
+        return ['categories']
+
+    async def get(self, request, *args, **kwargs):
+        return await super().get(request, *args, **kwargs)
+
+    async def retrieve(self, request, *args, **kwargs):
+        return Response(self.get_serializer(await self.aget_object()).data)
+
+
+class CacheStatsView(APIView):
+    """
+    Response cache hit/miss counters of this worker process (admin only).
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(cache.stats(), status=status.HTTP_200_OK)
+
+
+class MetricsView(APIView):
+    """
+    Request latency, SQL, serializer, response size and response cache
+    metrics of this worker process in Prometheus text format (admin only).
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 
 class UserListView(ListAPIView):
     """
-    Returns a list of all registered users.
+    Returns a list of all registered users with their counters.
+
+    `?q=` is a username prefix search (autocomplete) and always returns
+    cursor pages; `?page_size=` / `?cursor=` page the full list. The
+    prefix match is case-sensitive ("ann" does not find "Anna"), so it
+    stays a range scan of the username index.
+    `?include=is_following` adds whether the caller follows each user,
+    computed in the same query. `?fields=id,username` returns only those
+    fields, read with values() instead of building User instances.
     """
-    queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = UsernameCursorPagination
+    # Output field -> lookup for the `fields=` projection
+    projection_fields = {
+        'id': 'id',
+        'username': 'username',
+        'followers_count': 'stats__followers_count',
+        'following_count': 'stats__following_count',
+        'recipes_count': 'stats__recipes_count',
+        'is_following': 'is_following',
+    }
+
+    def get_fields(self):
+        fields = [name for name in self.request.query_params.get('fields', '').split(',') if name]
+        unknown = set(fields) - self.projection_fields.keys()
+        if unknown:
+            raise ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}"})
+        return fields
+
+    def with_follow_status(self):
+        include = self.request.query_params.get('include', '').split(',')
+        return 'is_following' in include or 'is_following' in self.get_fields()
+
+    def get_serializer_class(self):
+        return UserFollowStatusSerializer if self.with_follow_status() else UserSerializer
+
+    def get_queryset(self):
+        queryset = User.objects.select_related('stats')
+        query = self.request.query_params.get('q')
+        if query:
+            # Range on the username index, then the exact prefix test
+            # (PostgreSQL serves it from the varchar_pattern_ops index
+            # Django creates for unique usernames).
+            queryset = queryset.filter(username__gte=query, username__startswith=query)
+            if query[-1] != chr(sys.maxunicode):
+                queryset = queryset.filter(username__lt=query[:-1] + chr(ord(query[-1]) + 1))
+        if self.with_follow_status():
+            follows_user = Following.objects.filter(follower=self.request.user, following=OuterRef('pk'))
+            queryset = queryset.annotate(is_following=Exists(follows_user))
+        return queryset
 
+    def list(self, request, *args, **kwargs):
+        fields = self.get_fields()
+        if not fields:
+            return super().list(request, *args, **kwargs)
 
-@api_view(['POST'])
+        # The cursor needs the ordering columns even when they aren't requested.
+        columns = dict.fromkeys(fields + [name.lstrip('-') for name in self.paginator.ordering])
+        rows = self.get_queryset().values(
+            *[name for name in columns if self.projection_fields[name] == name],
+            **{name: F(self.projection_fields[name]) for name in columns if self.projection_fields[name] != name},
+        )
+        page = self.paginate_queryset(rows)
+        data = [{name: row[name] for name in fields} for row in (page if page is not None else rows)]
+        return self.get_paginated_response(data) if page is not None else Response(data)
+
+
+class FollowSuggestionListView(ListAPIView):
+    """
+    "People you may know" for the current user, precomputed by
+    `compute_follow_suggestions`; users followed since are left out.
+    """
+    serializer_class = FollowSuggestionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        already_followed = Following.objects.filter(follower=self.request.user, following=OuterRef('suggested'))
+        return (
+            FollowSuggestion.objects.filter(user=self.request.user)
+            .exclude(Exists(already_followed))
+            .select_related('suggested__stats')
+            .order_by('rank')
+        )
+
+
+class FollowStatusView(AsyncDispatchMixin, APIView):
+    """
+    Whether the logged-in user follows each of `?ids=1,2,3` (up to 500),
+    answered from the caller's cached set of followed ids.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    async def get(self, request):
+        try:
+            ids = [int(pk) for pk in request.query_params.get('ids', '').split(',') if pk.strip()]
+        except ValueError:
+            return Response({'error': 'ids must be a comma-separated list of integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > follows.MAX_BULK_IDS:
+            return Response({'error': f'At most {follows.MAX_BULK_IDS} ids per request'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        followed = await sync_to_async(follows.followed_ids)(request.user)
+        return Response({'following': {pk: pk in followed for pk in ids}}, status=status.HTTP_200_OK)
+
+
+def follow_counts(follower, user_id):
+    """
+    The followed user's `followers_count` and the caller's `following_count`.
+    """
+    counts = {
+        row['user_id']: row
+        for row in UserStats.objects.filter(user_id__in=[follower.pk, user_id])
+        .values('user_id', 'followers_count', 'following_count')
+    }
+    return {
+        'followers_count': counts.get(user_id, {}).get('followers_count'),
+        'following_count': counts.get(follower.pk, {}).get('following_count'),
+    }
+
+
+@api_view(['POST', 'PUT', 'DELETE'])
 @permission_classes([permissions.IsAuthenticated])
 def follow_user(request, user_id):
     """
-    Follow or unfollow a user.
+    PUT follows and DELETE unfollows a user, both idempotent; POST toggles
+    (kept for older clients). Each change is a single statement, so
+    concurrent requests can't race. Responds with the followed user's
+    `followers_count` and the caller's `following_count` after the change.
     """
-    user_to_follow = get_object_or_404(User, id=user_id)
     follower = request.user
-
-    if Following.objects.filter(follower=follower, following=user_to_follow).exists():
-        Following.objects.filter(follower=follower, following=user_to_follow).delete()
-        return Response({'message': 'Unfollowed user'}, status=status.HTTP_204_NO_CONTENT)
+    if user_id == follower.pk:
+        return Response({'error': 'You cannot follow yourself'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if request.method == 'DELETE':
+        changed = follows.unfollow(follower, user_id)
+        message, status_code = 'Unfollowed user' if changed else 'Not following', status.HTTP_200_OK
+    elif request.method == 'POST' and follows.unfollow(follower, user_id):
+        changed, message, status_code = True, 'Unfollowed user', status.HTTP_200_OK
     else:
-        Following.objects.create(follower=follower, following=user_to_follow)
-        return Response({'message': 'Followed user'}, status=status.HTTP_201_CREATED)
+        changed = follows.follow(follower, user_id)
+        message, status_code = ('Followed user', status.HTTP_201_CREATED) if changed else \
+            ('Already following', status.HTTP_200_OK)
+
+    if not changed and not User.objects.filter(pk=user_id).exists():
+        return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({'message': message, **follow_counts(follower, user_id)}, status=status_code)
 
 
-@api_view(['GET'])
+@api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
-def check_follow_status(request, user_id):
+def bulk_follow(request):
+    """
+    Follow and unfollow many users at once:
+    `{"follow": [1, 2], "unfollow": [3]}`. Unknown ids and the caller's
+    own id are ignored.
+    """
+    ids = {}
+    for key in ('follow', 'unfollow'):
+        value = request.data.get(key, [])
+        if not isinstance(value, list) or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in value):
+            return Response({'error': f'{key} must be a list of user ids'}, status=status.HTTP_400_BAD_REQUEST)
+        ids[key] = value
+    if len(ids['follow']) + len(ids['unfollow']) > follows.MAX_BULK_IDS:
+        return Response(
+            {'error': f'At most {follows.MAX_BULK_IDS} ids per request'}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    with transaction.atomic():
+        unfollowed = follows.unfollow_many(request.user, ids['unfollow'])
+        followed = follows.follow_many(request.user, ids['follow'])
+    following_count = UserStats.objects.filter(user=request.user).values_list('following_count', flat=True).first()
+    return Response({
+        'followed': followed,
+        'unfollowed': unfollowed,
+        'following_count': following_count,
+    }, status=status.HTTP_200_OK)
+
+
+class CheckFollowStatusView(AsyncDispatchMixin, APIView):
     """
     Check if the logged-in user follows another user.
     """
-    try:
-        user_to_check = User.objects.get(id=user_id)
-        is_following = Following.objects.filter(follower=request.user, following=user_to_check).exists()
+    permission_classes = [permissions.IsAuthenticated]
+
+    async def get(self, request, user_id):
+        if not await User.objects.filter(pk=user_id).aexists():
+            return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+        is_following = await Following.objects.filter(follower=request.user, following_id=user_id).aexists()
         return Response({'is_following': is_following}, status=status.HTTP_200_OK)
-    except User.DoesNotExist:
-        return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
-class FeedView(APIView):
+class FeedView(AsyncDispatchMixin, APIView):
     """
-    Get the user's feed with recipes from followed users.
+    Get the user's feed: recipes from followed users and the user's follows.
+
+    Without query parameters the newest items are returned as a plain list.
+    `?page_size=` / `?cursor=` page back through older items, and
+    `?since=<cursor>` returns only newer items (304 when nothing changed).
+    Recipes come from the materialized feed (see `recipes/feed.py`).
+    Responses carry an ETag over the page's items, so `If-None-Match`
+    gets a 304 without serializing anything. The view is async: the
+    worker serves other requests while the streams are queried (one
+    after another).
     """
     permission_classes = [permissions.IsAuthenticated]
+    page_size = 20
+    max_page_size = 100
 
-    def get(self, request):
+    def get_page_size(self, request):
         try:
-            user = request.user
-            following_users = Following.objects.filter(follower=user).values_list('following', flat=True)
-
-            if not following_users:
-                return Response([], status=status.HTTP_200_OK)
-
-            recipes = Recipe.objects.filter(author__in=following_users).order_by("-created_at")[:10]
-            follows = Following.objects.filter(follower=user).order_by("-created_at")[:10]
-
-            recipe_data = RecipeSerializer(recipes, many=True, context={'request': request}).data
-            follow_data = FollowingSerializer(follows, many=True, context={'request': request}).data
-
-            feed = []
-            feed.extend([{"type": "recipe", "data": r} for r in recipe_data])
-            feed.extend([{"type": "follow", "data": f} for f in follow_data])
+            size = int(request.query_params['page_size'])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(size, self.max_page_size) if size > 0 else self.page_size
+
+    def get_position(self, request, param):
+        token = request.query_params.get(param)
+        if not token:
+            return None
+        try:
+            return feed.decode_cursor(token)
+        except ValueError as e:
+            raise NotFound(str(e))
 
-            feed = sorted(feed, key=lambda x: x["data"].get("created_at", ""), reverse=True)[:20]
+    def serialize(self, items, request):
+        """
+        Serialize each item type in one batch, keeping the merged order.
+        """
+        serializers = {feed.RECIPE: RecipeSerializer, feed.FOLLOW: FollowingSerializer}
+        data = {}
+        for item_type, serializer_class in serializers.items():
+            objs = [item.obj for item in items if item.type == item_type]
+            data[item_type] = iter(serializer_class(objs, many=True, context={'request': request}).data)
+        return [{"type": item.type, "data": next(data[item.type])} for item in items]
+
+    def get_etag(self, request, items, has_next):
+        versions = [
+            (item.type, item.id, item.obj.updated_at, item.obj.category and item.obj.category.updated_at)
+            if item.type == feed.RECIPE else (item.type, item.id)
+            for item in items
+        ]
+        return make_etag(type(self).__name__, versions, has_next, request.user.pk, request.get_full_path())
+
+    def link(self, request, param, position):
+        url = request.build_absolute_uri()
+        for other in ('cursor', 'since'):
+            url = remove_query_param(url, other)
+        return replace_query_param(url, param, feed.encode_cursor(position))
+
+    async def get(self, request):
+        params = request.query_params
+        paginated = any(key in params for key in ('cursor', 'since', 'page_size'))
+        cursor = self.get_position(request, 'cursor')
+        since = self.get_position(request, 'since')
+        page_size = self.get_page_size(request)
 
-            return Response(feed, status=status.HTTP_200_OK)
+        try:
+            streams = feed.feed_streams(request.user)
+
+            if since is not None:
+                items = await feed.amerge_streams(streams, since, newer=True, limit=page_size)
+                if not items:
+                    return Response(status=status.HTTP_304_NOT_MODIFIED)
+                items.reverse()
+                return Response({
+                    "next": None,
+                    "poll": self.link(request, 'since', items[0].position),
+                    "results": self.serialize(items, request),
+                }, status=status.HTTP_200_OK)
+
+            items = await feed.amerge_streams(streams, cursor, limit=page_size + 1)
+            has_next = len(items) > page_size
+            items = items[:page_size]
+            etag = self.get_etag(request, items, has_next)
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return set_validator_headers(not_modified, etag)
+            results = self.serialize(items, request)
+
+            if not paginated:
+                return set_validator_headers(Response(results, status=status.HTTP_200_OK), etag)
+
+            return set_validator_headers(Response({
+                "next": self.link(request, 'cursor', items[-1].position) if has_next else None,
+                "poll": self.link(request, 'since', items[0].position) if items and cursor is None else None,
+                "results": results,
+            }, status=status.HTTP_200_OK), etag)
 
         except Exception as e:
-            print("ERROR in FeedView:", str(e))
+            logger.exception("Feed failed for user %s", request.user.pk)
             return Response(
                 {"error": "Something went wrong in the feed.", "details": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,